@@ -8,11 +8,13 @@
 # === Global parameters ===
 start_date: "2019-01-01"
 end_date: "2025-07-31"
-frequency: "W"              # D = daily, W = weekly
+frequency: "W"              # D = daily, W = weekly (model.py --freq overrides)
+frequencies: ["D", "W-SUN", "W-FRI", "M"]   # views derived from the daily base in one pass
 lookback_volume_days: 90    # Quality filter: trailing‑90d median value
 min_liquidity_usd: 10_000_000
 top_n_marketcap: 300        # Only evaluate first 300 coins each snap
 cache_dir: "cache/"
+cache_max_bytes: 5_000_000_000   # LRU‑evict cache entries above this (null = unbounded)
 results_dir: "results/"
 
 # Regression settings
@@ -23,9 +25,41 @@ independent:
   - "quality_alpha"
   - "macro_liquidity"
 lag_weeks: 1                # ETH/BTC lag for lead‑lag test
+scan_max_lag: 12            # lead‑lag scanner: test lags 1 … scan_max_lag
+scan_min_obs: 52            # skip coins with fewer usable observations
+rolling_windows: [26, 52, "expanding"]   # rolling OLS windows (rows) for --rolling
+
+# Resampling significance (--resample)
+resample_reps: 10000        # permutation and bootstrap replicates each
+resample_block: 8           # mean block length of the stationary bootstrap
+resample_workers: null      # processes (null = all cores)
+resample_alpha: 0.05        # two‑sided CI level
+resample_seed: 42
+
+# Parameter sweeps (sweep.py --grid sweep.yml)
+sweep_workers: null         # processes (null = all cores)
 
 # Coin lists (over‑ride as needed)
 stablecoin_symbols: ["USDT", "USDC", "DAI", "BUSD", "TUSD"]
+extra_coins: {}             # extra series pulled with BTC/ETH, e.g. {SOL: "solana"} → SOL_CAP
+
+# Macro liquidity proxies: column → Yahoo ticker, daily %Δ of the adjusted
+# close. All are pulled in one batched request and cached like the crypto
+# series; any column can be used in `independent`.
+macro_tickers:
+  macro_liquidity: "^SPXTR"   # S&P 500 total return (default model factor)
+  dxy: "DX-Y.NYB"             # US dollar index
+  us10y: "^TNX"               # 10Y Treasury yield
+  gold: "GC=F"                # gold front‑month future
+
+# Fetch engine (size to your CoinGecko plan)
+fetch_workers: 8                 # max concurrent requests
+coingecko_calls_per_minute: 30   # public/demo ≈ 30, Analyst ≈ 500
+fetch_max_retries: 5             # retries on 429 / 5xx / connection errors
+fetch_backoff_s: 2.0             # base of exponential backoff (seconds)
+
+# Runtime
+import_budget_s: 1.0        # python import_budget.py fails above this
 
 # Logging
 log_level: "INFO"
@@ -42,54 +76,1221 @@ statsmodels>=0.14
 yfinance>=0.2
 tqdm>=4.66
 PyYAML>=6.0
+requests>=2.31
+pyarrow>=14
+scipy>=1.11
+"""
+
+# ============================================================================
+# FILE: settings.py
+# ============================================================================
+"""
+Typed toolkit configuration, read from config.yml once – on first use, not at
+import time. Modules call `get_settings()` inside the function that needs a
+value, so importing any of them does no file I/O and no YAML parsing.
+"""
+import os, logging
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional, Union
+
+CONFIG_PATH = os.environ.get("LEADLAG_CONFIG", "config.yml")
+
+
+@dataclass(frozen=True)
+class Settings:
+    # global
+    start_date: str = "2019-01-01"
+    end_date: str = "2025-07-31"
+    frequency: str = "W"
+    frequencies: List[str] = field(default_factory=lambda: ["D", "W-SUN", "W-FRI", "M"])
+    lookback_volume_days: int = 90
+    min_liquidity_usd: float = 10_000_000
+    top_n_marketcap: int = 300
+    cache_dir: str = "cache/"
+    cache_max_bytes: Optional[int] = 5_000_000_000
+    results_dir: str = "results/"
+    # regression
+    target: str = "others_btc_ret"
+    independent: List[str] = field(default_factory=lambda: [
+        "eth_btc_ret", "btc_dom_change", "quality_alpha", "macro_liquidity"])
+    lag_weeks: int = 1
+    scan_max_lag: int = 12
+    scan_min_obs: int = 52
+    rolling_windows: List[Union[int, str]] = field(default_factory=lambda: [26, 52, "expanding"])
+    # resampling
+    resample_reps: int = 10_000
+    resample_block: float = 8
+    resample_workers: Optional[int] = None
+    resample_alpha: float = 0.05
+    resample_seed: int = 42
+    # sweeps
+    sweep_workers: Optional[int] = None
+    # coins
+    stablecoin_symbols: List[str] = field(default_factory=lambda: [
+        "USDT", "USDC", "DAI", "BUSD", "TUSD"])
+    extra_coins: Dict[str, str] = field(default_factory=dict)
+    macro_tickers: Dict[str, str] = field(default_factory=lambda: {
+        "macro_liquidity": "^SPXTR", "dxy": "DX-Y.NYB", "us10y": "^TNX", "gold": "GC=F"})
+    # fetch engine
+    fetch_workers: int = 8
+    coingecko_calls_per_minute: Optional[float] = 30
+    fetch_max_retries: int = 5
+    fetch_backoff_s: float = 2.0
+    # runtime
+    import_budget_s: float = 1.0
+    log_level: str = "INFO"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict‑style lookup, used for hashing config slices."""
+        return getattr(self, key, default)
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "Settings":
+        known = {f.name for f in fields(cls)}
+        unknown = set(raw) - known
+        if unknown:
+            logging.warning(f"Ignoring unknown config keys: {sorted(unknown)}")
+        return cls(**{k: v for k, v in raw.items() if k in known})
+
+
+_SETTINGS: Optional[Settings] = None
+
+
+def load_settings(path: str = CONFIG_PATH) -> Settings:
+    import yaml
+    with open(path) as f:
+        return Settings.from_dict(yaml.safe_load(f) or {})
+
+
+def get_settings() -> Settings:
+    """The process‑wide settings, loaded from config.yml on first call."""
+    global _SETTINGS
+    if _SETTINGS is None:
+        _SETTINGS = load_settings()
+    return _SETTINGS
+
+
+def use_settings(settings: Settings) -> Settings:
+    """Install *settings* as the process‑wide config (benchmarks, sweeps)."""
+    global _SETTINGS
+    _SETTINGS = settings
+    return settings
+
+
+def override(**changes) -> Settings:
+    """Copy of the current settings with *changes* applied (not installed)."""
+    return replace(get_settings(), **changes)
+
+
+def configure_logging() -> None:
+    """Entry points call this once; library modules never touch logging config."""
+    logging.basicConfig(
+        level=getattr(logging, get_settings().log_level),
+        format="%(asctime)s  %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+# ============================================================================
+# FILE: profiling.py
+# ============================================================================
 """
+Per‑stage instrumentation: wall time, peak traced memory, cache hits / misses,
+network calls and bytes fetched. Off by default (one flag check per call);
+`model.py --profile` turns it on and writes a JSON trace, `--cprofile` adds a
+cProfile dump.
+  with profiling.stage("compute_factors"): …     # or @profiling.profiled(name)
+  profiling.count("cache_hit")                    # charged to the open stage
+"""
+import json, time, threading, tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+_ENABLED = False
+_LOCK = threading.Lock()
+_RECORDS: List[Dict] = []
+_OPEN: List[Dict] = []                  # every open frame, all threads (memory peaks)
+_LOCAL = threading.local()              # per‑thread stack (counter attribution)
+_TOTALS: Dict[str, float] = {}
+_T0 = time.perf_counter()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def enable(trace_memory: bool = True) -> None:
+    global _ENABLED, _T0
+    reset()
+    _T0 = time.perf_counter()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _ENABLED = True
+
+
+def disable() -> None:
+    global _ENABLED
+    _ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset() -> None:
+    with _LOCK:
+        _RECORDS.clear()
+        _OPEN.clear()
+        _TOTALS.clear()
+
+
+def _stack() -> List[Dict]:
+    if not hasattr(_LOCAL, "stack"):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+def current() -> Optional[Dict]:
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def _sample_peak() -> None:
+    """Fold the traced peak since the last sample into every open frame."""
+    if not tracemalloc.is_tracing():
+        return
+    _, peak = tracemalloc.get_traced_memory()
+    for frame in _OPEN:
+        frame["_peak"] = max(frame["_peak"], peak)
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def stage(name: str, **tags):
+    if not _ENABLED:
+        yield None
+        return
+    parent = current()
+    frame = {"name": name, "parent": parent["id"] if parent else None,
+             "thread": threading.current_thread().name, "tags": tags,
+             "counters": {}, "_peak": 0}
+    with _LOCK:
+        frame["id"] = len(_RECORDS)
+        _RECORDS.append(frame)
+        _sample_peak()
+        frame["_base"] = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        _OPEN.append(frame)
+    _stack().append(frame)
+    t0 = time.perf_counter()
+    frame["start_s"] = t0 - _T0
+    try:
+        yield frame
+    finally:
+        frame["wall_s"] = time.perf_counter() - t0
+        _stack().pop()
+        with _LOCK:
+            _sample_peak()
+            _OPEN.remove(frame)
+        frame["peak_mb"] = max(frame.pop("_peak") - frame.pop("_base"), 0) / 2 ** 20
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator form of stage(); the disabled path is one flag check."""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if not _ENABLED:
+                return fn(*args, **kwargs)
+            with stage(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(event: str, n: float = 1) -> None:
+    """Add *n* to *event* on the innermost open stage of this thread (and totals)."""
+    if not _ENABLED:
+        return
+    frame = current()
+    with _LOCK:
+        _TOTALS[event] = _TOTALS.get(event, 0) + n
+        if frame is not None:
+            frame["counters"][event] = frame["counters"].get(event, 0) + n
+
+
+def inherit(fn: Callable) -> Callable:
+    """Wrap *fn* to run in a worker thread under the caller's current stage."""
+    if not _ENABLED:
+        return fn
+    parent = current()
+
+    def inner(*args, **kwargs):
+        stack = _stack()
+        if parent is not None:
+            stack.append(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if parent is not None:
+                stack.pop()
+    return inner
+
+
+def report() -> Dict:
+    """Stages (ids, parents, wall, peak, counters) plus per‑name and global totals."""
+    with _LOCK:
+        stages = [{k: v for k, v in r.items() if not k.startswith("_")}
+                  for r in _RECORDS if "wall_s" in r]
+        totals = dict(_TOTALS)
+    by_name: Dict[str, Dict] = {}
+    for s in stages:
+        agg = by_name.setdefault(s["name"], {"calls": 0, "wall_s": 0.0, "peak_mb": 0.0,
+                                             "counters": {}})
+        agg["calls"] += 1
+        agg["wall_s"] += s["wall_s"]
+        agg["peak_mb"] = max(agg["peak_mb"], s["peak_mb"])
+        for k, v in s["counters"].items():
+            agg["counters"][k] = agg["counters"].get(k, 0) + v
+    return {"stages": stages, "by_name": by_name, "totals": totals}
+
+
+def write(path: str) -> Dict:
+    rep = report()
+    with open(path, "w") as f:
+        json.dump(rep, f, indent=2, default=str)
+    return rep
+
+# ============================================================================
+# FILE: fetch_engine.py
+# ============================================================================
+"""
+Bounded worker pool + token‑bucket rate limiter for upstream API pulls.
+Independent requests run concurrently, throttled to the CoinGecko plan and
+retried with exponential backoff on 429 / 5xx / connection errors.
+"""
+import time, random, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import profiling
+from settings import get_settings
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread‑safe token bucket: refills `rate` tokens/s, holds at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_status(exc: Exception) -> Optional[int]:
+    """HTTP status behind *exc*, or None if it is not worth retrying."""
+    import requests          # already loaded by whichever client raised
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return 0
+    resp = getattr(exc, "response", None)
+    if resp is not None:
+        return resp.status_code if resp.status_code in RETRY_STATUS else None
+    # pycoingecko re-raises JSON error bodies as ValueError({"status": {...}})
+    payload = exc.args[0] if exc.args else None
+    if isinstance(payload, dict):
+        status = payload.get("status", payload)
+        code = status.get("error_code") if isinstance(status, dict) else None
+        return code if code in RETRY_STATUS else None
+    return None
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    resp = getattr(exc, "response", None)
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class FetchEngine:
+    """
+    Runs fetch jobs through a bounded thread pool.
+    `call` throttles (if `calls_per_minute` is set) and retries one request;
+    `map` runs a dict of zero‑arg jobs concurrently and returns their results.
+    """
+
+    def __init__(self, calls_per_minute: Optional[float] = None,
+                 workers: int = 8, max_retries: int = 5, backoff_s: float = 2.0):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.bucket = None
+        if calls_per_minute:
+            # capacity = one worker‑pool's worth of burst, never more than the plan allows
+            rate = calls_per_minute / 60.0
+            self.bucket = TokenBucket(rate, capacity=max(1.0, min(workers, calls_per_minute)))
+
+    @classmethod
+    def from_config(cls, calls_per_minute: Optional[float] = None) -> "FetchEngine":
+        cfg = get_settings()
+        return cls(calls_per_minute=calls_per_minute,
+                   workers=cfg.fetch_workers,
+                   max_retries=cfg.fetch_max_retries,
+                   backoff_s=cfg.fetch_backoff_s)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            profiling.count("network_calls")
+            try:
+                return fn(*args, **kwargs)
+            except Exception as exc:
+                status = _retry_status(exc)
+                if status is None or attempt == self.max_retries:
+                    raise
+                delay = _retry_after(exc) or self.backoff_s * 2 ** attempt
+                delay *= 1 + 0.25 * random.random()          # jitter
+                profiling.count("retries")
+                logging.warning(f"{getattr(fn, '__name__', 'request')} failed "
+                                f"({status or type(exc).__name__}); retry "
+                                f"{attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def map(self, jobs: Dict[Hashable, Callable[[], Any]]) -> Dict[Hashable, Any]:
+        if not jobs:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+            futures = {key: pool.submit(profiling.inherit(job)) for key, job in jobs.items()}
+            return {key: fut.result() for key, fut in futures.items()}
+
+
+_SHARED: Dict[str, FetchEngine] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_engine(name: str, calls_per_minute: Optional[float] = None) -> FetchEngine:
+    """One engine (and token bucket) per upstream API, shared across modules."""
+    with _SHARED_LOCK:
+        if name not in _SHARED:
+            _SHARED[name] = FetchEngine.from_config(calls_per_minute)
+        return _SHARED[name]
+
+
+def coingecko_engine() -> FetchEngine:
+    return shared_engine("coingecko", get_settings().coingecko_calls_per_minute)
+
+
+@lru_cache(maxsize=None)
+def coingecko_client():
+    """One CoinGecko client per process, imported only when a pull is needed."""
+    from pycoingecko import CoinGeckoAPI
+    client = CoinGeckoAPI()
+    client.session.hooks["response"].append(_count_bytes)
+    return client
+
+
+def _count_bytes(response, *args, **kwargs):
+    profiling.count("bytes_fetched", len(response.content))
+
+# ============================================================================
+# FILE: cache_backend.py
+# ============================================================================
+"""
+Columnar cache backend (Parquet via pyarrow) for series and top‑N snapshots.
+  series/{name}.parquet              – [date, value], span kept in file metadata
+  snapshots/month=YYYY-MM/*.parquet  – one row per (date, coin), hive‑partitioned
+Reads are memory‑mapped, column‑pruned and date‑filtered, so loading every
+snapshot is a single dataset scan instead of one unpickle per day.
+Every read / write is noted in an AccessLog (access.json) for LRU eviction
+by cache_manager.py.
+"""
+import os, json, time, atexit, threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SNAPSHOT_COLUMNS = ["id", "symbol", "name", "market_cap", "total_volume",
+                    "current_price", "fully_diluted_valuation", "market_cap_rank"]
+SNAPSHOT_NUMERIC = ["market_cap", "total_volume", "current_price",
+                    "fully_diluted_valuation", "market_cap_rank"]
+
+
+class AccessLog:
+    """
+    Last‑access time per cache entry (path relative to the cache root).
+    Touches are kept in memory and merged into access.json at exit or on
+    flush(), so the hot path never writes a file.
+    """
+    FN = "access.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        self.fn = os.path.join(root, self.FN)
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def touch(self, path: str) -> None:
+        key = os.path.relpath(path, self.root)
+        with self._lock:
+            self._pending[key] = time.time()
+
+    def touched(self) -> set:
+        """Entries used by this process (never evicted from under it)."""
+        with self._lock:
+            return set(self._pending)
+
+    def load(self) -> Dict[str, float]:
+        try:
+            with open(self.fn) as f:
+                stamps = json.load(f)
+        except (OSError, ValueError):
+            stamps = {}
+        with self._lock:
+            stamps.update(self._pending)
+        return stamps
+
+    def flush(self, forget: Optional[List[str]] = None) -> None:
+        if not os.path.isdir(self.root):
+            return
+        stamps = self.load()
+        for key in forget or []:
+            stamps.pop(key, None)
+        tmp = os.path.join(self.root, f".{self.FN}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(stamps, f)
+        os.replace(tmp, self.fn)
+
+
+class ParquetCache:
+    def __init__(self, root: str):
+        self.root = root
+        self.series_dir = f"{root}/series"
+        self.snap_dir = f"{root}/snapshots"
+        os.makedirs(self.series_dir, exist_ok=True)
+        os.makedirs(self.snap_dir, exist_ok=True)
+        self._lock = threading.Lock()          # guards month‑file rewrites
+        self._snap_dates: Optional[set] = None
+        self.access = AccessLog(root)
+
+    def invalidate(self) -> None:
+        """Forget in‑memory indexes after files were removed behind our back."""
+        self._snap_dates = None
+
+    # ------------------------------------------------------------------ series
+    def _series_fn(self, name: str) -> str:
+        return f"{self.series_dir}/{name}.parquet"
+
+    def has_series(self, name: str) -> bool:
+        return os.path.exists(self._series_fn(name))
+
+    def series_meta(self, name: str) -> Dict:
+        """User metadata of a series – reads the Parquet footer only."""
+        meta = pq.read_schema(self._series_fn(name)).metadata or {}
+        return json.loads(meta.get(b"cache_meta", b"{}"))
+
+    def write_series(self, name: str, series: pd.Series, meta: Dict) -> None:
+        table = pa.table({"date": pd.DatetimeIndex(series.index).values,
+                          "value": series.to_numpy(dtype="float64")})
+        table = table.replace_schema_metadata({"cache_meta": json.dumps(meta)})
+        _atomic_write(table, self._series_fn(name))
+        self.access.touch(self._series_fn(name))
+
+    def read_series(self, name: str, start: Optional[pd.Timestamp] = None,
+                    end: Optional[pd.Timestamp] = None) -> pd.Series:
+        table = pq.read_table(self._series_fn(name), memory_map=True,
+                              filters=_date_filters(start, end))
+        self.access.touch(self._series_fn(name))
+        df = table.to_pandas()
+        return pd.Series(df["value"].to_numpy(), index=pd.DatetimeIndex(df["date"]),
+                         name=name)
+
+    # --------------------------------------------------------------- snapshots
+    def _month_dir(self, date: pd.Timestamp) -> str:
+        return f"{self.snap_dir}/month={date:%Y-%m}"
+
+    def snapshot_dates(self) -> set:
+        """All cached snapshot dates (one pruned scan, then kept in memory)."""
+        if self._snap_dates is None:
+            dates = self.read_snapshots(columns=["date"])["date"]
+            self._snap_dates = set(pd.DatetimeIndex(dates.unique()))
+        return self._snap_dates
+
+    def has_snapshot(self, date: pd.Timestamp) -> bool:
+        return pd.Timestamp(date).normalize() in self.snapshot_dates()
+
+    def write_snapshot(self, date: pd.Timestamp, snap: pd.DataFrame) -> None:
+        self.write_snapshots({date: snap})
+
+    def write_snapshots(self, snaps: Dict[pd.Timestamp, pd.DataFrame]) -> None:
+        """Write many snapshots, rewriting each touched month file once."""
+        months: Dict[str, List[pd.DataFrame]] = {}
+        for date, snap in snaps.items():
+            date = pd.Timestamp(date).normalize()
+            snap = snap.reindex(columns=SNAPSHOT_COLUMNS)
+            snap[SNAPSHOT_NUMERIC] = snap[SNAPSHOT_NUMERIC].astype("float64")
+            for col in ("id", "symbol", "name"):
+                snap[col] = snap[col].astype("string")
+            snap.insert(0, "date", date)
+            months.setdefault(self._month_dir(date), []).append(snap)
+
+        with self._lock:
+            for month_dir, frames in months.items():
+                month_fn = f"{month_dir}/part-0.parquet"
+                new = pd.concat(frames, ignore_index=True)
+                if os.path.exists(month_fn):
+                    old = pq.read_table(month_fn).to_pandas()
+                    old = old[~old["date"].isin(new["date"].unique())]
+                    new = pd.concat([old, new], ignore_index=True)
+                os.makedirs(month_dir, exist_ok=True)
+                new = new.sort_values(["date", "market_cap"], ascending=[True, False])
+                _atomic_write(pa.Table.from_pandas(new, preserve_index=False), month_fn)
+                self.access.touch(month_dir)
+                if self._snap_dates is not None:
+                    self._snap_dates.update(pd.DatetimeIndex(new["date"].unique()))
+
+    def read_snapshot_table(self, start: Optional[pd.Timestamp] = None,
+                            end: Optional[pd.Timestamp] = None,
+                            columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+        """Arrow table of snapshots in [start, end]; `id` dictionary‑encoded."""
+        if not any(e.is_dir() for e in os.scandir(self.snap_dir)):
+            return None
+        if columns is not None and "date" not in columns:
+            columns = ["date"] + list(columns)
+        for fn in self._month_files(start, end):
+            self.access.touch(os.path.dirname(fn))
+        return pq.read_table(self.snap_dir, columns=columns, memory_map=True,
+                             partitioning="hive", filters=_date_filters(start, end),
+                             read_dictionary=["id"])
+
+    def _month_files(self, start: Optional[pd.Timestamp],
+                     end: Optional[pd.Timestamp]) -> List[str]:
+        lo = f"month={pd.Timestamp(start):%Y-%m}" if start is not None else ""
+        hi = f"month={pd.Timestamp(end):%Y-%m}" if end is not None else "month=~"
+        return [f"{self.snap_dir}/{d}/part-0.parquet"
+                for d in sorted(os.listdir(self.snap_dir))
+                if d.startswith("month=") and lo <= d <= hi]
+
+    def iter_snapshot_tables(self, start: Optional[pd.Timestamp] = None,
+                             end: Optional[pd.Timestamp] = None,
+                             columns: Optional[List[str]] = None):
+        """Snapshots in [start, end] one month‑file table at a time."""
+        if columns is not None and "date" not in columns:
+            columns = ["date"] + list(columns)
+        for fn in self._month_files(start, end):
+            self.access.touch(os.path.dirname(fn))
+            yield pq.read_table(fn, columns=columns, memory_map=True,
+                                filters=_date_filters(start, end), read_dictionary=["id"])
+
+    def snapshot_ids(self, start: Optional[pd.Timestamp] = None,
+                     end: Optional[pd.Timestamp] = None) -> List[str]:
+        """Sorted coin ids present in any snapshot in [start, end]."""
+        ids = set()
+        for table in self.iter_snapshot_tables(start, end, columns=["id"]):
+            ids.update(table.column("id").combine_chunks().dictionary.to_pylist())
+        return sorted(ids)
+
+    def read_snapshots(self, start: Optional[pd.Timestamp] = None,
+                       end: Optional[pd.Timestamp] = None,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """All snapshots in [start, end] as one long (date, coin) frame."""
+        table = self.read_snapshot_table(start, end, columns)
+        if table is None:
+            return pd.DataFrame(columns=["date"] + SNAPSHOT_COLUMNS)
+        df = table.to_pandas()
+        if "id" in df:
+            df["id"] = df["id"].astype("string")
+        return df.drop(columns="month", errors="ignore")
+
+
+@lru_cache(maxsize=None)
+def open_cache(root: str) -> "ParquetCache":
+    """One ParquetCache per cache_dir, shared by every module in the process."""
+    return ParquetCache(root)
+
+
+def _date_filters(start, end):
+    filters = []
+    if start is not None:
+        filters.append(("date", ">=", pd.Timestamp(start).to_pydatetime()))
+    if end is not None:
+        filters.append(("date", "<=", pd.Timestamp(end).to_pydatetime()))
+    return filters or None
+
+
+def _atomic_write(table: pa.Table, path: str) -> None:
+    # dot‑prefixed temp file: invisible to dataset discovery while being written
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+# ============================================================================
+# FILE: history_store.py
+# ============================================================================
+"""
+Per‑series history cache: one Parquet file per series + the date span it covers.
+Asking for a wider span only pulls the missing head / tail and merges it in,
+so moving `end_date` forward costs one small request per series.
+"""
+import datetime as dt, logging
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+import profiling
+from cache_backend import ParquetCache
+
+Span = Tuple[dt.date, dt.date]
+
+# CoinGecko range endpoints return daily points only for spans > 90 days
+# (hourly below that), so gap pulls are padded to keep the series daily.
+MIN_FETCH_DAYS = 91
+
+
+class HistoryStore:
+    """Span‑aware series cache on top of a ParquetCache (span lives in file metadata)."""
+
+    def __init__(self, cache: ParquetCache, min_fetch_days: int = MIN_FETCH_DAYS):
+        self.cache = cache
+        self.min_fetch_days = min_fetch_days
+
+    def span(self, name: str) -> Optional[Span]:
+        if not self.cache.has_series(name):
+            return None
+        meta = self.cache.series_meta(name)
+        if "start" not in meta:
+            return None
+        return dt.date.fromisoformat(meta["start"]), dt.date.fromisoformat(meta["end"])
+
+    def missing(self, name: str, start: dt.date, end: dt.date) -> List[Span]:
+        """Head / tail gaps between the stored span and [start, end]."""
+        span = self.span(name)
+        if span is None:
+            return [(start, end)]
+        have_start, have_end = span
+        pad = dt.timedelta(days=self.min_fetch_days)
+        gaps = []
+        if start < have_start:
+            gaps.append((start, max(have_start, start + pad)))
+        if end > have_end:
+            gaps.append((min(have_end, end - pad), end))
+        return gaps
+
+    def load(self, name: str, start: Optional[dt.date] = None,
+             end: Optional[dt.date] = None) -> pd.Series:
+        return self.cache.read_series(name, start, end)
+
+    def save(self, name: str, series: pd.Series, span: Span) -> None:
+        # data and span share one file → they can never get out of sync
+        self.cache.write_series(name, series, {"start": str(span[0]), "end": str(span[1])})
+
+    def get(self, name: str, start: dt.date, end: dt.date,
+            fetch: Callable[[dt.date, dt.date], pd.Series]) -> pd.Series:
+        """Return [start, end] of *name*, calling fetch(a, b) only for missing gaps."""
+        gaps = self.missing(name, start, end)
+        profiling.count("cache_miss" if gaps else "cache_hit")
+        if gaps:
+            span = self.span(name)
+            parts = [self.load(name)] if span is not None else []
+            for a, b in gaps:
+                logging.debug(f"{name}: fetching gap {a} → {b}")
+                parts.append(fetch(a, b))
+            merged = pd.concat(parts)
+            # later pulls win on overlap (CoinGecko's last point is intraday)
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            merged.name = name
+            new_start = min(start, span[0]) if span else start
+            new_end = max(end, span[1]) if span else end
+            # never mark today / the future as covered – it is still moving
+            new_end = min(new_end, dt.datetime.now(dt.timezone.utc).date() - dt.timedelta(days=1))
+            self.save(name, merged, (new_start, max(new_start, new_end)))
+            return merged[(merged.index >= pd.Timestamp(start)) &
+                          (merged.index <= pd.Timestamp(end))]
+
+        # cache hit: memory‑mapped read of just the requested rows
+        return self.load(name, start, end)
+
+# ============================================================================
+# FILE: coin_panel.py
+# ============================================================================
+"""
+Compact (date × coin) panel: one C‑contiguous float32 array per field with a
+shared date index and coin index – no per‑coin Series or float64 frames.
+Panels can live in memory or as raw {field}.f32 files + meta.json under a
+directory, opened with np.memmap, so a daily top‑300 history (~2,400 × 1,000+
+coins) costs a few MB per field and pages in lazily.
+"""
+import os, json, shutil
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DTYPE = np.float32
+META_FN = "meta.json"
+
+
+class CoinPanel:
+    def __init__(self, dates: pd.DatetimeIndex, coins: pd.Index,
+                 fields: Dict[str, np.ndarray]):
+        self.dates = pd.DatetimeIndex(dates)
+        self.coins = pd.Index(coins)
+        for name, arr in fields.items():
+            if arr.shape != self.shape:
+                raise ValueError(f"field {name!r} has shape {arr.shape}, expected {self.shape}")
+        self.fields = fields
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.coins)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.fields.values())
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def frame(self, field: str) -> pd.DataFrame:
+        """DataFrame view of one field (no copy)."""
+        return pd.DataFrame(self.fields[field], index=self.dates, columns=self.coins,
+                            copy=False)
+
+    def select(self, dates: pd.DatetimeIndex) -> "CoinPanel":
+        """Rows for *dates* (all must be present); self if already identical."""
+        dates = pd.DatetimeIndex(dates).normalize()
+        if dates.equals(self.dates):
+            return self
+        rows = self.dates.get_indexer(dates)
+        if (rows < 0).any():
+            raise KeyError(f"{(rows < 0).sum()} dates not in panel")
+        return CoinPanel(dates, self.coins, {f: np.ascontiguousarray(a[rows])
+                                             for f, a in self.fields.items()})
+
+    # ---------------------------------------------------------------- builders
+    @classmethod
+    def empty(cls, dates: pd.DatetimeIndex, coins: List[str], fields: List[str],
+              root: Optional[str] = None) -> "CoinPanel":
+        """All‑NaN panel; with *root*, backed by fresh memmap files there."""
+        dates = pd.DatetimeIndex(dates)
+        shape = (len(dates), len(coins))
+        if root is None:
+            return cls(dates, coins, {f: np.full(shape, np.nan, dtype=DTYPE) for f in fields})
+        if os.path.exists(root):
+            shutil.rmtree(root)
+        os.makedirs(root)
+        arrays = {}
+        for f in fields:
+            arrays[f] = np.memmap(os.path.join(root, f"{f}.f32"), dtype=DTYPE,
+                                  mode="w+", shape=shape)
+            arrays[f][:] = np.nan
+        return cls(dates, coins, arrays)
+
+    @classmethod
+    def from_series(cls, series: Dict[str, pd.Series], dates: pd.DatetimeIndex,
+                    field: str = "market_cap") -> "CoinPanel":
+        """Write each series straight into its column, aligned on *dates*."""
+        panel = cls.empty(dates, list(series), [field])
+        out = panel[field]
+        for j, s in enumerate(series.values()):
+            row = panel.dates.get_indexer(s.index)
+            keep = row >= 0
+            out[row[keep], j] = s.to_numpy()[keep]
+        return panel
+
+    def fill(self, table: Union[pa.Table, pa.RecordBatch]) -> None:
+        """
+        Scatter long (date, id, *fields) rows into the panel; rows whose date
+        or coin is not in the panel are skipped. Coin ids stay dictionary
+        codes, so no Python string per row is ever created.
+        """
+        ids = table.column("id")
+        if isinstance(ids, pa.ChunkedArray):
+            ids = ids.combine_chunks()
+        if not pa.types.is_dictionary(ids.type):
+            ids = ids.dictionary_encode()
+        lookup = self.coins.get_indexer(ids.dictionary.to_pylist())
+        col = lookup[ids.indices.to_numpy(zero_copy_only=False)]
+        row = self.dates.get_indexer(
+            pd.DatetimeIndex(table.column("date").to_numpy(zero_copy_only=False)))
+        keep = (row >= 0) & (col >= 0)
+        row, col = row[keep], col[keep]
+        for f, arr in self.fields.items():
+            arr[row, col] = table.column(f).to_numpy(zero_copy_only=False)[keep]
+
+    # ---------------------------------------------------------------- on disk
+    def save(self, root: str) -> None:
+        """Write every field to *root* as memmap‑able float32 files."""
+        if all(getattr(a, "filename", None) == os.path.abspath(os.path.join(root, f"{f}.f32"))
+               for f, a in self.fields.items()):
+            for a in self.fields.values():                # already backed by root
+                a.flush()
+        else:
+            if os.path.exists(root):
+                shutil.rmtree(root)
+            os.makedirs(root)
+            for name, arr in self.fields.items():
+                mm = np.memmap(os.path.join(root, f"{name}.f32"), dtype=DTYPE,
+                               mode="w+", shape=self.shape)
+                mm[:] = arr
+                mm.flush()
+        meta = {"shape": list(self.shape), "fields": list(self.fields),
+                "dates": [d.isoformat() for d in self.dates],
+                "coins": [str(c) for c in self.coins]}
+        with open(os.path.join(root, META_FN), "w") as f:       # written last
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, root: str, mode: str = "r") -> Optional["CoinPanel"]:
+        """Memory‑map a saved panel; None if *root* holds no complete panel."""
+        meta_fn = os.path.join(root, META_FN)
+        if not os.path.exists(meta_fn):
+            return None
+        with open(meta_fn) as f:
+            meta = json.load(f)
+        shape = tuple(meta["shape"])
+        fields = {name: np.memmap(os.path.join(root, f"{name}.f32"), dtype=DTYPE,
+                                  mode=mode, shape=shape)
+                  for name in meta["fields"]}
+        return cls(pd.DatetimeIndex(meta["dates"]), pd.Index(meta["coins"]), fields)
+
+# ============================================================================
+# FILE: cache_manager.py
+# ============================================================================
+"""
+Keeps cache_dir bounded: per‑entry sizes, LRU eviction under a byte budget
+(`cache_max_bytes`) using AccessLog times, and compaction of legacy per‑range
+pickles ({coin}_{start}_{end}.pkl, snap_{date}.pkl) into the columnar cache.
+Pipeline artifacts are never evicted; anything evicted is simply re‑fetched
+or re‑derived on next use.
+Usage:
+    python cache_manager.py stats
+    python cache_manager.py gc [--budget 2GB] [--dry-run]
+    python cache_manager.py compact
+"""
+import os, re, time, shutil, logging, argparse
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from settings import get_settings, configure_logging
+from cache_backend import AccessLog, open_cache
+from history_store import HistoryStore
+
+# artifacts the pipeline / stream own – recomputing them means a rebuild
+PROTECTED = {"pipeline.json", "master_views.json", AccessLog.FN, "stream_state.json",
+             "master_daily.parquet", "factors.parquet", "factors_tail"}
+LEGACY_RANGE = re.compile(r"^(?P<name>.+)_(?P<start>\d{4}-\d{2}-\d{2})_(?P<end>\d{4}-\d{2}-\d{2})\.pkl$")
+LEGACY_SNAP = re.compile(r"^snap_(?P<date>\d{4}-\d{2}-\d{2})\.pkl$")
+STALE_TMP_S = 3600           # dot‑temp files older than this are crash leftovers
+UNITS = {"": 1, "B": 1, "KB": 1e3, "MB": 1e6, "GB": 1e9, "TB": 1e12}
+
+
+def parse_bytes(text: str) -> int:
+    m = re.fullmatch(r"\s*([\d_.]+)\s*([KMGT]?B?)\s*", str(text).upper())
+    if not m:
+        raise ValueError(f"bad size {text!r} (e.g. 500MB, 2GB)")
+    return int(float(m.group(1).replace("_", "")) * UNITS[m.group(2)])
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f))
+               for d, _, files in os.walk(path) for f in files)
+
+
+def _kind(rel: str) -> str:
+    top = rel.split(os.sep)[0]
+    if top in PROTECTED:
+        return "artifact"
+    if top == "series":
+        return "series"
+    if top == "snapshots":
+        return "snapshots"
+    if top == "panel":
+        return "panel"
+    if top.startswith("master_") and top.endswith(".parquet"):
+        return "view"
+    if LEGACY_RANGE.match(top) or LEGACY_SNAP.match(top):
+        return "legacy"
+    if top.startswith(".") and top.endswith(".tmp"):
+        return "temp"
+    return "other"                           # not ours → never touched
+
+
+def entries(root: str) -> List[Dict]:
+    """Evictable units: each series file, each snapshot month, the panel, each view …"""
+    stamps = open_cache(root).access.load()
+    out = []
+    for top in sorted(os.listdir(root)):
+        path = os.path.join(root, top)
+        if top in ("series", "snapshots") and os.path.isdir(path):
+            children = [os.path.join(top, c) for c in sorted(os.listdir(path))
+                        if not c.startswith(".")]
+        else:
+            children = [top]
+        for rel in children:
+            full = os.path.join(root, rel)
+            out.append({"entry": rel, "kind": _kind(rel), "bytes": _size(full),
+                        "last_access": stamps.get(rel, os.path.getmtime(full))})
+    return out
+
+
+def stats(root: Optional[str] = None) -> Dict:
+    root = root or get_settings().cache_dir
+    items = entries(root)
+    kinds: Dict[str, Dict] = {}
+    for e in items:
+        k = kinds.setdefault(e["kind"], {"count": 0, "bytes": 0, "oldest_access": None})
+        k["count"] += 1
+        k["bytes"] += e["bytes"]
+        k["oldest_access"] = min(filter(None, [k["oldest_access"], e["last_access"]]))
+    return {"root": root, "total_bytes": sum(e["bytes"] for e in items),
+            "budget_bytes": get_settings().cache_max_bytes, "kinds": kinds}
+
+
+def gc(budget: Optional[int] = None, root: Optional[str] = None,
+       dry_run: bool = False) -> List[Dict]:
+    """Compact, then evict least‑recently‑used entries until under *budget*."""
+    root = root or get_settings().cache_dir
+    budget = budget if budget is not None else get_settings().cache_max_bytes
+    if not dry_run:
+        compact(root)
+    if budget is None:
+        return []
+    items = entries(root)
+    total = sum(e["bytes"] for e in items)
+    in_use = open_cache(root).access.touched()
+    candidates = sorted((e for e in items
+                         if e["kind"] not in ("artifact", "other") and e["entry"] not in in_use),
+                        key=lambda e: e["last_access"])
+    evicted = []
+    for e in candidates:
+        if total <= budget:
+            break
+        evicted.append(e)
+        total -= e["bytes"]
+        if not dry_run:
+            full = os.path.join(root, e["entry"])
+            shutil.rmtree(full) if os.path.isdir(full) else os.remove(full)
+    if evicted and not dry_run:
+        cache = open_cache(root)
+        cache.invalidate()
+        cache.access.flush(forget=[e["entry"] for e in evicted])
+    freed = sum(e["bytes"] for e in evicted)
+    logging.info(f"cache gc: {'would evict' if dry_run else 'evicted'} {len(evicted)} "
+                 f"entries ({freed / 1e6:.1f} MB); {total / 1e6:.1f} MB "
+                 f"of {budget / 1e6:.1f} MB budget")
+    return evicted
+
+
+def maybe_gc(root: Optional[str] = None) -> None:
+    """Cheap size check for entry points; gc only when over budget."""
+    root = root or get_settings().cache_dir
+    budget = get_settings().cache_max_bytes
+    if budget is not None and sum(e["bytes"] for e in entries(root)) > budget:
+        gc(budget, root)
+
+
+# --------------------------------------------------------------------------- #
+# Compaction
+# --------------------------------------------------------------------------- #
+Span = Tuple[dt.date, dt.date]
+
+
+def _merge_spans(spans: List[Span]) -> List[Span]:
+    """Union of date ranges as disjoint contiguous blocks."""
+    blocks: List[List[dt.date]] = []
+    for a, b in sorted(spans):
+        if blocks and a <= blocks[-1][1] + dt.timedelta(days=1):
+            blocks[-1][1] = max(blocks[-1][1], b)
+        else:
+            blocks.append([a, b])
+    return [(a, b) for a, b in blocks]
+
+
+def _compact_series(root: str) -> int:
+    """Fold every legacy range pickle of a series into its one Parquet file."""
+    store = HistoryStore(open_cache(root))
+    groups: Dict[str, List[Tuple[Span, str]]] = {}
+    for fn in os.listdir(root):
+        m = LEGACY_RANGE.match(fn)
+        if m:
+            span = (dt.date.fromisoformat(m["start"]), dt.date.fromisoformat(m["end"]))
+            groups.setdefault(m["name"], []).append((span, os.path.join(root, fn)))
+
+    folded = 0
+    for name, files in groups.items():
+        files.sort()
+        spans = [span for span, _ in files]
+        have = store.span(name)
+        blocks = _merge_spans(spans + ([have] if have is not None else []))
+        # HistoryStore keeps one contiguous span: the block holding the Parquet
+        # copy if there is one, else the block reaching furthest
+        if have is not None:
+            start, end = next(blk for blk in blocks if blk[0] <= have[0] and have[1] <= blk[1])
+        else:
+            start, end = max(blocks, key=lambda s: (s[1], s[1] - s[0]))
+        near = lambda span: (span[0] <= end + dt.timedelta(days=1)
+                             and span[1] >= start - dt.timedelta(days=1))
+        kept = [(span, path) for span, path in files if near(span)]
+        skipped = [(span, path) for span, path in files if not near(span)]
+
+        parts = [pd.read_pickle(path) for _, path in kept]
+        if have is not None:                 # Parquet copy is newer → wins on overlap
+            parts.append(store.load(name))
+        merged = pd.concat(parts)
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        merged = merged[(merged.index >= pd.Timestamp(start)) &
+                        (merged.index < pd.Timestamp(end) + pd.Timedelta(days=1))]
+        merged.name = name
+        store.save(name, merged, (start, end))
+        for _, path in kept:
+            os.remove(path)
+        folded += len(kept)
+        logging.info(f"compacted {len(kept)} legacy range files → series/{name} "
+                     f"({start} → {end})")
+        if skipped:
+            logging.warning(f"kept {len(skipped)} legacy range files of {name} outside "
+                            f"{start} → {end} in place: "
+                            + ", ".join(f"{a} → {b}" for (a, b), _ in skipped))
+    return folded
+
+
+def _compact_snapshots(root: str) -> int:
+    """Move legacy snap_{date}.pkl files into the month‑partitioned dataset."""
+    cache = open_cache(root)
+    legacy = sorted((m["date"], os.path.join(root, fn)) for fn in os.listdir(root)
+                    for m in [LEGACY_SNAP.match(fn)] if m)
+    for i in range(0, len(legacy), 64):
+        chunk = legacy[i:i + 64]
+        snaps = {pd.Timestamp(d): pd.read_pickle(path) for d, path in chunk
+                 if not cache.has_snapshot(pd.Timestamp(d))}
+        cache.write_snapshots(snaps)
+        for _, path in chunk:
+            os.remove(path)
+    if legacy:
+        logging.info(f"compacted {len(legacy)} legacy snapshot files into snapshots/")
+    return len(legacy)
+
+
+def _remove_stale_temps(root: str) -> int:
+    cutoff = time.time() - STALE_TMP_S
+    stale = [os.path.join(d, f) for d, _, files in os.walk(root) for f in files
+             if f.startswith(".") and f.endswith(".tmp")
+             and os.path.getmtime(os.path.join(d, f)) < cutoff]
+    for path in stale:
+        os.remove(path)
+    return len(stale)
+
+
+def compact(root: Optional[str] = None) -> Dict[str, int]:
+    root = root or get_settings().cache_dir
+    return {"series_files": _compact_series(root),
+            "snapshot_files": _compact_snapshots(root),
+            "stale_temps": _remove_stale_temps(root)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    p_gc = sub.add_parser("gc")
+    p_gc.add_argument("--budget", type=parse_bytes, help="e.g. 2GB (default cache_max_bytes)")
+    p_gc.add_argument("--dry-run", action="store_true")
+    sub.add_parser("compact")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.cmd == "stats":
+        s = stats()
+        budget = s["budget_bytes"]
+        print(f"{s['root']}: {s['total_bytes'] / 1e6:,.1f} MB"
+              + (f" of {budget / 1e6:,.1f} MB budget" if budget else " (no budget)"))
+        for kind, k in sorted(s["kinds"].items()):
+            age = (time.time() - k["oldest_access"]) / 86400 if k["oldest_access"] else 0
+            print(f"  {kind:<10} {k['count']:>6} entries {k['bytes'] / 1e6:>10,.1f} MB"
+                  f"   oldest access {age:,.0f}d ago")
+    elif args.cmd == "gc":
+        gc(args.budget, dry_run=args.dry_run)
+    else:
+        print(compact())
 
 # ============================================================================
 # FILE: data_prep.py
 # ============================================================================
 """
 Fetch & cache market‑cap / price data from CoinGecko + macro data.
-Outputs a single harmonised DataFrame saved under cache_dir/master.parquet
+Outputs one harmonised daily DataFrame (cache_dir/master_daily.parquet) and
+the resampled views cache_dir/master_<freq>.parquet derived from it.
 © 2025 Ferdinand C.  MIT Licence
 """
-import os, json, datetime as dt, logging, pickle
-from typing import List, Dict
+import os, re, json, datetime as dt, logging
+from typing import List, Dict, Optional
 
 import pandas as pd
 import numpy as np
-import yaml
-from pycoingecko import CoinGeckoAPI
-import yfinance as yf
-from tqdm import tqdm
 
-# --------------------------------------------------------------------------- #
-# Config & Logging
-# --------------------------------------------------------------------------- #
-with open("config.yml") as f:
-    CFG = yaml.safe_load(f)
+from settings import get_settings, configure_logging
+from fetch_engine import shared_engine, coingecko_engine, coingecko_client
+from profiling import profiled
+from cache_backend import open_cache
+from coin_panel import CoinPanel
+from history_store import HistoryStore
 
-os.makedirs(CFG["cache_dir"], exist_ok=True)
-logging.basicConfig(
-    level=getattr(logging, CFG["log_level"]),
-    format="%(asctime)s  %(levelname)s | %(message)s",
-    datefmt="%H:%M:%S",
-)
+# Network clients (pycoingecko, yfinance) are imported only on a cache miss.
 
-CG = CoinGeckoAPI()
+BASE_FN = "master_daily.parquet"
+VIEWS_FN = "master_views.json"        # {freq: digest of the base it came from}
+CORE = ["BTC_CAP", "ETH_CAP", "TOTAL_CAP"]
+FREQ_ALIASES = {"M": "ME"}            # pandas ≥ 2.2 spells month‑end "ME"
+
+
+def _store() -> HistoryStore:
+    return HistoryStore(open_cache(get_settings().cache_dir))
 
 # --------------------------------------------------------------------------- #
 # Helper – fetch coin **market cap** history (USD)
 # --------------------------------------------------------------------------- #
+@profiled()
 def get_coin_marketcap(coin_id: str, start: dt.date, end: dt.date) -> pd.Series:
     """Returns a daily Series of market‑cap (USD)."""
-    cache_fn = f"{CFG['cache_dir']}/{coin_id}_{start}_{end}.pkl"
-    if os.path.exists(cache_fn):
-        return pd.read_pickle(cache_fn)
+    mkt_cap = _store().get(coin_id, start, end,
+                           lambda a, b: _pull_coin_marketcap(coin_id, a, b))
+    mkt_cap.name = coin_id
+    return mkt_cap
+
 
-    logging.info(f"Pulling {coin_id} history from CoinGecko…")
+def _pull_coin_marketcap(coin_id: str, start: dt.date, end: dt.date) -> pd.Series:
+    logging.info(f"Pulling {coin_id} history {start} → {end} from CoinGecko…")
     unixts_from = int(dt.datetime.combine(start, dt.time()).timestamp())
     unixts_to   = int(dt.datetime.combine(end,   dt.time()).timestamp())
-    data = CG.get_coin_market_chart_range_by_id(
+    data = coingecko_engine().call(
+        coingecko_client().get_coin_market_chart_range_by_id,
         coin_id,      vs_currency="usd",
         from_timestamp=unixts_from,
         to_timestamp=unixts_to,
@@ -99,20 +1300,23 @@ def get_coin_marketcap(coin_id: str, start: dt.date, end: dt.date) -> pd.Series:
         {dt.datetime.utcfromtimestamp(p[0] / 1e3): p[1] for p in data["market_caps"]}
     )
     mkt_cap.name = coin_id
-    mkt_cap.to_pickle(cache_fn)
     return mkt_cap
 
 
+@profiled()
 def get_total_marketcap(start: dt.date, end: dt.date) -> pd.Series:
     """Fetch global crypto mkt‑cap."""
-    cache_fn = f"{CFG['cache_dir']}/GLOBAL_{start}_{end}.pkl"
-    if os.path.exists(cache_fn):
-        return pd.read_pickle(cache_fn)
+    glob = _store().get("GLOBAL", start, end, _pull_total_marketcap)
+    glob.name = "TOTAL"
+    return glob
+
 
-    logging.info("Pulling GLOBAL mkt‑cap from CoinGecko…")
+def _pull_total_marketcap(start: dt.date, end: dt.date) -> pd.Series:
+    logging.info(f"Pulling GLOBAL mkt‑cap {start} → {end} from CoinGecko…")
     unixts_from = int(dt.datetime.combine(start, dt.time()).timestamp())
     unixts_to   = int(dt.datetime.combine(end,   dt.time()).timestamp())
-    data = CG.get_global_market_chart_range(
+    data = coingecko_engine().call(
+        coingecko_client().get_global_market_chart_range,
         vs_currency="usd",
         from_timestamp=unixts_from,
         to_timestamp=unixts_to,
@@ -121,37 +1325,102 @@ def get_total_marketcap(start: dt.date, end: dt.date) -> pd.Series:
         {dt.datetime.utcfromtimestamp(p[0] / 1e3): p[1] for p in data["market_cap"]}
     )
     glob.name = "TOTAL"
-    glob.to_pickle(cache_fn)
     return glob
 
 
+def macro_key(ticker: str) -> str:
+    """Series name of a Yahoo ticker in the cache ('^SPXTR' → 'macro__SPXTR')."""
+    return "macro_" + re.sub(r"[^\w.-]", "_", ticker)
+
+
+def _pull_macro(tickers: List[str], start: dt.date, end: dt.date) -> pd.DataFrame:
+    """One batched Yahoo request → adjusted close per ticker (columns = tickers)."""
+    import yfinance as yf
+    logging.info(f"Pulling {len(tickers)} macro tickers {start} → {end} from Yahoo…")
+    raw = shared_engine("yahoo").call(yf.download, tickers, start=start,
+                                      end=end + dt.timedelta(days=1),   # end is exclusive
+                                      auto_adjust=False, group_by="column",
+                                      progress=False)
+    close = raw["Adj Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    return close.reindex(columns=tickers)
+
+
+@profiled()
+def get_macro_frame(start: dt.date, end: dt.date) -> pd.DataFrame:
+    """
+    Daily %Δ of every `macro_tickers` proxy (one column each). Levels are
+    cached per ticker; all tickers with a gap share one Yahoo request.
+    """
+    store = _store()
+    tickers = get_settings().macro_tickers
+    gaps = {t: store.missing(macro_key(t), start, end) for t in tickers.values()}
+    stale = [t for t, g in gaps.items() if g]
+    if stale:
+        window = [span for t in stale for span in gaps[t]]
+        pulled = _pull_macro(stale, min(a for a, _ in window), max(b for _, b in window))
+
+    def take(ticker):
+        def fetch(a: dt.date, b: dt.date) -> pd.Series:
+            level = pulled[ticker].loc[pd.Timestamp(a):pd.Timestamp(b)].dropna()
+            if level.empty:          # delisted / short history: cover the span, leave it NaN
+                logging.warning(f"Yahoo returned no data for {ticker} {a} → {b}; "
+                                f"recording the span as covered with no values")
+            return level
+        return fetch
+
+    returns = {}
+    for col, ticker in tickers.items():
+        store.get(macro_key(ticker), start, end, take(ticker))
+        # %Δ over the whole cached history → the first requested day keeps its return
+        level = store.load(macro_key(ticker), None, end)
+        ret = level.pct_change().fillna(0)
+        returns[col] = ret[ret.index >= pd.Timestamp(start)]
+    return pd.DataFrame(returns)
+
+
 def get_macro_liquidity(start: dt.date, end: dt.date) -> pd.Series:
     """
     Simple macro proxy = S&P 500 total‑return index %Δ
-    You can swap for Fed Funds, M2, or custom liquidity index.
+    Swap the `macro_liquidity` ticker in config for Fed Funds, M2, or a custom index.
     """
-    spx = yf.download("^SPXTR", start=start, end=end, progress=False)["Adj Close"]
-    sret = spx.pct_change().fillna(0)
-    sret.name = "macro_liquidity"
-    return sret
+    return get_macro_frame(start, end)["macro_liquidity"]
 
 
 # --------------------------------------------------------------------------- #
 # Build master DataFrame
 # --------------------------------------------------------------------------- #
+@profiled()
 def build_master():
-    start = dt.datetime.fromisoformat(CFG["start_date"]).date()
-    end   = dt.datetime.fromisoformat(CFG["end_date"]).date()
-
-    logging.info("Fetching BTC & ETH cores …")
-    btc_cap = get_coin_marketcap("bitcoin", start, end)
-    eth_cap = get_coin_marketcap("ethereum", start, end)
-    total   = get_total_marketcap(start, end)
-
-    # Intersect indices, convert to pandas DataFrame
-    df = pd.concat([btc_cap, eth_cap, total], axis=1).dropna()
-    df.rename(columns={"bitcoin": "BTC_CAP", "ethereum": "ETH_CAP", "TOTAL": "TOTAL_CAP"},
-              inplace=True)
+    cfg = get_settings()
+    os.makedirs(cfg.cache_dir, exist_ok=True)
+    start = dt.datetime.fromisoformat(cfg.start_date).date()
+    end   = dt.datetime.fromisoformat(cfg.end_date).date()
+
+    extra = cfg.extra_coins or {}
+
+    # All series are independent → fetch concurrently; wall time ≈ slowest request
+    logging.info(f"Fetching BTC, ETH, TOTAL, {len(cfg.macro_tickers)} macro "
+                 f"(+{len(extra)} extra) concurrently …")
+    jobs = {
+        "BTC_CAP":   lambda: get_coin_marketcap("bitcoin", start, end),
+        "ETH_CAP":   lambda: get_coin_marketcap("ethereum", start, end),
+        "TOTAL_CAP": lambda: get_total_marketcap(start, end),
+        "macro":     lambda: get_macro_frame(start, end),
+    }
+    for sym, coin_id in extra.items():
+        jobs[f"{sym}_CAP"] = lambda coin_id=coin_id: get_coin_marketcap(coin_id, start, end)
+    series = coingecko_engine().map(jobs)
+    macro = series.pop("macro")
+
+    # Intersect core indices, convert to pandas DataFrame
+    core = CORE
+    df = pd.concat([series.pop(c).rename(c) for c in core], axis=1).dropna()
+    if series:
+        # extra coins go straight into float32 columns – no per‑coin joins
+        coins = CoinPanel.from_series(series, df.index)
+        df[list(coins.coins)] = coins["market_cap"]
 
     # Others cap = TOTAL – BTC – ETH
     df["OTHERS_CAP"] = df["TOTAL_CAP"] - df["BTC_CAP"] - df["ETH_CAP"]
@@ -161,88 +1430,235 @@ def build_master():
     df["ETH_DOM"] = df["ETH_CAP"] / df["TOTAL_CAP"]
 
     # Macro
-    logging.info("Fetching macro liquidity proxy …")
-    macro = get_macro_liquidity(start, end)
     df = df.join(macro, how="left")
 
-    # Resample to desired frequency
-    freq = CFG["frequency"]
-    df = df.resample(freq).last().dropna()
+    # Daily base (macro is NaN on non‑trading days until a view resamples it)
+    df = df.resample("D").last().dropna(subset=core)
+    df.to_parquet(f"{cfg.cache_dir}/{BASE_FN}")
+    logging.info(f"Daily master saved: {df.shape[0]} rows × {df.shape[1]} cols")
+
+    write_views(df, list(cfg.frequencies) + [cfg.frequency])
+
 
-    df.to_parquet(f"{CFG['cache_dir']}/master.parquet")
-    logging.info(f"Master DF saved: {df.shape[0]} rows × {df.shape[1]} cols")
+# --------------------------------------------------------------------------- #
+# Frequency views of the daily base
+# --------------------------------------------------------------------------- #
+def canonical_freq(freq: str) -> str:
+    """'W' → 'W-SUN', 'M' → 'ME' … – one cache file per distinct rule."""
+    from pandas.tseries.frequencies import to_offset
+    return to_offset(FREQ_ALIASES.get(freq, freq)).freqstr
+
+
+def view_path(freq: str) -> str:
+    return f"{get_settings().cache_dir}/master_{canonical_freq(freq)}.parquet"
+
+
+def resample_view(base: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """
+    Period‑end view (extra coins may start later → keep NaN head). Rows are
+    dropped only where a core column or a macro proxy the model uses is NaN.
+    """
+    cfg = get_settings()
+    macro = [c for c in cfg.macro_tickers if c in cfg.independent and c in base.columns]
+    return base.resample(canonical_freq(freq)).last().dropna(subset=CORE + macro)
+
+
+def _base_digest() -> str:
+    from pipeline import file_digest
+    return file_digest(f"{get_settings().cache_dir}/{BASE_FN}")
+
+
+def _read_views() -> Dict[str, str]:
+    fn = f"{get_settings().cache_dir}/{VIEWS_FN}"
+    if not os.path.exists(fn):
+        return {}
+    with open(fn) as f:
+        return json.load(f)
+
+
+def write_views(base: pd.DataFrame, freqs: List[str]) -> None:
+    """Derive every requested frequency from the in‑memory base in one pass."""
+    digest = _base_digest()
+    views = _read_views()
+    for freq in dict.fromkeys(canonical_freq(f) for f in freqs):
+        df = resample_view(base, freq)
+        df.to_parquet(view_path(freq))
+        views[freq] = digest
+        logging.info(f"Master view {freq}: {df.shape[0]} rows")
+    fn = f"{get_settings().cache_dir}/{VIEWS_FN}"
+    with open(fn + ".tmp", "w") as f:
+        json.dump(views, f, indent=2)
+    os.replace(fn + ".tmp", fn)
+
+
+def load_master(freq: Optional[str] = None) -> pd.DataFrame:
+    """
+    Master at *freq* (default: config frequency). Served from its cached view;
+    re‑derived from the daily base only if the view is missing or was built
+    from a different base. Never fetches.
+    """
+    freq = canonical_freq(freq or get_settings().frequency)
+    if _read_views().get(freq) != _base_digest() or not os.path.exists(view_path(freq)):
+        logging.info(f"Master view {freq} stale – resampling daily base …")
+        write_views(pd.read_parquet(f"{get_settings().cache_dir}/{BASE_FN}"), [freq])
+    open_cache(get_settings().cache_dir).access.touch(view_path(freq))
+    return pd.read_parquet(view_path(freq))
 
 
 if __name__ == "__main__":
+    configure_logging()
     build_master()
 
 # ============================================================================
 # FILE: factor_library.py
 # ============================================================================
 """
-Generate derived factors / indices, incl. quality‑filtered TOTAL3.
+Generate derived factors / indices, incl. the quality ratio of TOTAL3
+(the constituent‑level TOTAL3 index is built in index_builder).
 Every function accepts a DataFrame from data_prep.master and returns Series.
 """
 import pandas as pd
 import numpy as np
-import yaml, datetime as dt, logging, os
-from typing import List
+import datetime as dt, logging, os
+from typing import List, Optional
 
-with open("config.yml") as f:
-    CFG = yaml.safe_load(f)
+from settings import get_settings, configure_logging
+from cache_backend import ParquetCache, open_cache
+from coin_panel import CoinPanel
+from fetch_engine import coingecko_engine, coingecko_client
+import profiling
+from profiling import profiled
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+PREFETCH_CHUNK = 64      # snapshots fetched concurrently per batch write
+ROW_CHUNK = 256          # panel rows per vectorised block (bounds temporaries)
+
+
+def snapshot_cache() -> ParquetCache:
+    return open_cache(get_settings().cache_dir)
 
 # --------------------------------------------------------------------------- #
 # Quality filter utilities
 # --------------------------------------------------------------------------- #
+def _pull_snapshot(date: pd.Timestamp) -> pd.DataFrame:
+    """CoinGecko 'coins/markets' top‑250 as of *date*."""
+    return pd.DataFrame(
+        coingecko_engine().call(
+            coingecko_client().get_coins_markets,
+            vs_currency="usd", order="market_cap_desc",
+            per_page=250, page=1, price_change_percentage=None,
+            date=date.strftime("%d-%m-%Y")
+        )
+    )
+
+
+def ensure_snapshots(dates: pd.DatetimeIndex) -> None:
+    """
+    Phase 1: fetch every snapshot in *dates* not yet cached, concurrently
+    through the shared rate‑limited engine, writing each batch in one go.
+    """
+    cache = snapshot_cache()
+    wanted = {ts.normalize() for ts in pd.DatetimeIndex(dates)}
+    missing = sorted(ts for ts in wanted if not cache.has_snapshot(ts))
+    profiling.count("snapshot_hit", len(wanted) - len(missing))
+    profiling.count("snapshot_miss", len(missing))
+    if not missing:
+        return
+    logging.info(f"Prefetching {len(missing)} missing snapshots …")
+    engine = coingecko_engine()
+    for i in range(0, len(missing), PREFETCH_CHUNK):
+        chunk = missing[i:i + PREFETCH_CHUNK]
+        snaps = engine.map({ts: (lambda ts=ts: _pull_snapshot(ts)) for ts in chunk})
+        cache.write_snapshots(snaps)
+
+
+@profiled()
 def load_top_market_caps(date: pd.Timestamp, n: int) -> pd.Series:
     """
     Pull top‑N market‑cap snapshot as of *date* (daily).
-    Uses CoinGecko 'coins/markets' endpoint; caches JSON per day.
+    Uses CoinGecko 'coins/markets' endpoint; cached in the snapshot dataset.
     """
-    from pycoingecko import CoinGeckoAPI
-    cg = CoinGeckoAPI()
-
-    cache_fn = f"{CFG['cache_dir']}/snap_{date.date()}.pkl"
-    if os.path.exists(cache_fn):
-        snap = pd.read_pickle(cache_fn)
-    else:
-        snap = pd.DataFrame(
-            cg.get_coins_markets(
-                vs_currency="usd", order="market_cap_desc",
-                per_page=250, page=1, price_change_percentage=None,
-                date=date.strftime("%d-%m-%Y")
-            )
-        )
-        snap.to_pickle(cache_fn)
+    ensure_snapshots(pd.DatetimeIndex([date]))
+    day = pd.Timestamp(date).normalize()
+    snap = snapshot_cache().read_snapshots(day, day, columns=["symbol", "market_cap"])
+    return snap.set_index("symbol")["market_cap"].astype(float).nlargest(n)
 
-    snap = snap.set_index("symbol")["market_cap"].astype(float).nlargest(n)
-    return snap
 
-
-def make_quality_mask(master: pd.DataFrame) -> pd.Series:
+def snapshot_panel(dates: pd.DatetimeIndex, fields: List[str] = ("market_cap",),
+                   root: Optional[str] = None) -> CoinPanel:
+    """
+    float32 (date × coin) panel of snapshot *fields* for *dates*, built from one
+    streamed month by month. With *root*, the panel is kept there as memmap files and reused
+    while it covers *dates* and *fields*.
+    """
+    dates = pd.DatetimeIndex(dates).normalize()
+    if root is not None:
+        snapshot_cache().access.touch(root)
+        panel = CoinPanel.load(root)
+        if (panel is not None and set(fields) <= set(panel.fields)
+                and dates.isin(panel.dates).all()):
+            profiling.count("panel_hit")
+            return panel.select(dates)
+        profiling.count("panel_miss")
+
+    ensure_snapshots(dates)
+    cache = snapshot_cache()
+    coins = cache.snapshot_ids(dates.min(), dates.max())
+    panel = CoinPanel.empty(dates, coins, list(fields), root=root)
+    for table in cache.iter_snapshot_tables(dates.min(), dates.max(),
+                                            columns=["id", *fields]):
+        panel.fill(table)                       # one month file at a time
+    if root is not None:
+        panel.save(root)
+    return panel
+
+
+def top_n_threshold(caps: np.ndarray, n: int) -> np.ndarray:
+    """n‑th largest value per row (NaN sorts last; −inf if fewer than n coins)."""
+    nth = np.full(len(caps), -np.inf, dtype=caps.dtype)
+    if caps.shape[1] <= n:
+        return nth
+    for i in range(0, len(caps), ROW_CHUNK):
+        block = np.nan_to_num(caps[i:i + ROW_CHUNK], nan=-np.inf)
+        nth[i:i + ROW_CHUNK] = -np.partition(-block, n - 1, axis=1)[:, n - 1]
+    return nth
+
+
+@profiled()
+def make_quality_mask(master: pd.DataFrame,
+                      panel: Optional[CoinPanel] = None) -> pd.Series:
     """
     Binary mask per date: 1 if 'OTHERS' is majority high‑liquidity tokens.
     Approach: compute aggregated market‑cap of tokens that pass liquidity rule.
+    *panel* is the float32 (date × coin) market‑cap panel; prefetched and read
+    in one scan if not given. Phase 2 is vectorised over row blocks of the
+    panel – no per‑date Python loop, no full‑size float64 temporaries.
     """
-    mask = []
-    n = CFG["top_n_marketcap"]
-    min_liquidity = CFG["min_liquidity_usd"]
+    cfg = get_settings()
+    n = cfg.top_n_marketcap
+    min_liquidity = cfg.min_liquidity_usd
 
-    for ts in master.index:
-        snap = load_top_market_caps(ts, n)
-        qualified = snap[snap > min_liquidity]
-        qual_cap = qualified.sum()
-        raw_others = master.loc[ts, "OTHERS_CAP"]
-        mask.append(qual_cap / raw_others if raw_others else 0.0)
+    if panel is None:
+        panel = snapshot_panel(master.index)
+    caps = panel.select(master.index)["market_cap"]
 
-    return pd.Series(mask, index=master.index, name="quality_ratio")
+    # top‑N per date: n‑th largest cap is the row threshold
+    nth = top_n_threshold(caps, n)
+    qual_cap = np.zeros(len(caps))
+    for i in range(0, len(caps), ROW_CHUNK):
+        block = caps[i:i + ROW_CHUNK]
+        qualified = (block >= nth[i:i + ROW_CHUNK, None]) & (block > min_liquidity)
+        qual_cap[i:i + ROW_CHUNK] = np.where(qualified, block, 0).sum(axis=1, dtype=np.float64)
+
+    raw_others = master["OTHERS_CAP"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(raw_others != 0, qual_cap / raw_others, 0.0)
+    return pd.Series(ratio, index=master.index, name="quality_ratio")
 
 
 # --------------------------------------------------------------------------- #
 # Factor generators
 # --------------------------------------------------------------------------- #
+@profiled()
 def compute_factors(master: pd.DataFrame) -> pd.DataFrame:
     df = master.copy()
 
@@ -262,8 +1678,9 @@ def compute_factors(master: pd.DataFrame) -> pd.DataFrame:
     df["macro_liquidity"] = df["macro_liquidity"].rolling(window=4).mean()
 
     # Quality alpha
-    logging.info("Computing quality ratio & alpha … (slow first time)")
-    qrat = make_quality_mask(df)
+    logging.info("Computing quality ratio & alpha …")
+    panel = snapshot_panel(df.index, root=os.path.join(get_settings().cache_dir, "panel"))
+    qrat = make_quality_mask(df, panel)
     df = df.join(qrat, how="left")
     df["quality_alpha"] = (df["quality_ratio"] - df["quality_ratio"].shift()).fillna(0)
 
@@ -272,64 +1689,1585 @@ def compute_factors(master: pd.DataFrame) -> pd.DataFrame:
 
 
 if __name__ == "__main__":
-    master = pd.read_parquet(f"{CFG['cache_dir']}/master.parquet")
-    factors = compute_factors(master)
-    factors.to_parquet(f"{CFG['cache_dir']}/factors.parquet")
+    configure_logging()
+    from data_prep import load_master
+    cache_dir = get_settings().cache_dir
+    factors = compute_factors(load_master())
+    factors.to_parquet(f"{cache_dir}/factors.parquet")
     print(f"Built factors DF: {factors.shape}")
 
+# ============================================================================
+# FILE: index_builder.py
+# ============================================================================
+"""
+Quality‑filtered TOTAL3 from constituent coins.
+A coin is a constituent on a date when it is not BTC / ETH / a stablecoin,
+ranks inside top_n_marketcap and its trailing lookback_volume_days median
+volume exceeds min_liquidity_usd. All rules are boolean masks over the
+(date × coin) snapshot panel; cap‑ and equal‑weighted indices are chain‑
+linked from constituent price returns (weights fixed at the previous date).
+Usage:
+    python index_builder.py [--freq D]
+"""
+import os, logging, argparse
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from settings import get_settings, configure_logging
+from coin_panel import CoinPanel
+from factor_library import snapshot_cache, snapshot_panel, top_n_threshold
+from profiling import profiled
+
+FIELDS = ("market_cap", "total_volume", "current_price")
+MAJORS = ("bitcoin", "ethereum")         # TOTAL3 = TOTAL − BTC − ETH
+BASE_LEVEL = 100.0
+
+
+def excluded_coins(panel: CoinPanel) -> np.ndarray:
+    """Bool per panel coin: BTC / ETH or a configured stablecoin symbol."""
+    stables = pa.array(sorted({s.upper() for s in get_settings().stablecoin_symbols}))
+    stable_ids = set(MAJORS)
+    for table in snapshot_cache().iter_snapshot_tables(panel.dates.min(), panel.dates.max(),
+                                                       columns=["id", "symbol"]):
+        hit = pc.is_in(pc.utf8_upper(table["symbol"]), value_set=stables)
+        stable_ids.update(table["id"].filter(hit).unique().to_pylist())
+    return np.asarray(panel.coins.isin(stable_ids))
+
+
+def rolling_median_volume(panel: CoinPanel, days: int) -> np.ndarray:
+    """Trailing *days*‑calendar‑day median of total_volume (works on any date grid)."""
+    volume = panel.frame("total_volume")
+    return volume.rolling(f"{days}D").median().to_numpy(dtype=np.float32)
+
+
+def median_above(panel: CoinPanel, days: int, threshold: float) -> np.ndarray:
+    """
+    rolling_median_volume(panel, days) > threshold, without sorting windows:
+    with c valid and g above‑threshold values in a window, the median is above
+    iff g > c/2 – or, when g == c/2, iff the mean of the two middle values
+    (largest at/below, smallest above) is. Four O(n) rolling reductions.
+    """
+    volume = panel.frame("total_volume")
+    window = f"{days}D"
+    above = volume > threshold
+    c = volume.notna().astype(np.float32).rolling(window).sum().to_numpy()
+    g = above.astype(np.float32).rolling(window).sum().to_numpy()
+    tie = (2 * g == c) & (c > 0)
+    if tie.any():
+        lo = volume.where(~above).rolling(window).max().to_numpy()
+        hi = volume.where(above).rolling(window).min().to_numpy()
+        tie &= (lo + hi) / 2 > threshold
+    return (2 * g > c) | tie
+
+
+def constituent_mask(caps: np.ndarray, liquid: np.ndarray, excluded: np.ndarray,
+                     n: int) -> np.ndarray:
+    """(date × coin) bool: not excluded, liquid, top‑n by cap among those."""
+    eligible = ~excluded[None, :] & liquid
+    ranked = np.where(eligible, caps, np.nan)
+    return eligible & (ranked >= top_n_threshold(ranked, n)[:, None])
+
+
+@profiled()
+def build_index(dates: Optional[pd.DatetimeIndex] = None,
+                panel: Optional[CoinPanel] = None) -> pd.DataFrame:
+    """
+    TOTAL3_QCAP (sum of constituent caps), TOTAL3_CW / TOTAL3_EW index levels
+    and n_constituents per date of *dates* (default: the daily master).
+    """
+    cfg = get_settings()
+    if dates is None:
+        from data_prep import load_master
+        dates = load_master("D").index
+    if panel is None:
+        panel = snapshot_panel(dates, FIELDS, root=os.path.join(cfg.cache_dir, "panel"))
+    panel = panel.select(pd.DatetimeIndex(dates).normalize())
+
+    caps, price = panel["market_cap"], panel["current_price"]
+    liquid = median_above(panel, cfg.lookback_volume_days, cfg.min_liquidity_usd)
+    mask = constituent_mask(caps, liquid, excluded_coins(panel), cfg.top_n_marketcap)
+
+    # returns from t‑1 → t of the coins that were constituents at t‑1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = price[1:] / price[:-1] - 1.0
+    held = mask[:-1] & np.isfinite(ret)
+    ret = np.where(held, ret, 0.0)
+    weight = np.where(held, caps[:-1], 0.0).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cw = (weight * ret).sum(axis=1) / weight.sum(axis=1)
+        ew = ret.sum(axis=1, dtype=np.float64) / held.sum(axis=1)
+    cw, ew = (np.concatenate([[0.0], np.nan_to_num(r)]) for r in (cw, ew))
+
+    return pd.DataFrame({
+        "TOTAL3_QCAP": np.where(mask, caps, 0).sum(axis=1, dtype=np.float64),
+        "TOTAL3_CW": BASE_LEVEL * np.cumprod(1 + cw),
+        "TOTAL3_EW": BASE_LEVEL * np.cumprod(1 + ew),
+        "n_constituents": mask.sum(axis=1),
+    }, index=panel.dates.rename("date"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--freq", default="D", help="master view to index (default D)")
+    args = parser.parse_args()
+    configure_logging()
+    from data_prep import load_master
+    cfg = get_settings()
+    index = build_index(load_master(args.freq).index)
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    out = os.path.join(cfg.results_dir, "total3_index.csv")
+    index.to_csv(out)
+    logging.info(f"TOTAL3 index ({len(index)} dates, median "
+                 f"{index['n_constituents'].median():.0f} constituents) saved to {out}")
+
+# ============================================================================
+# FILE: lead_lag_scan.py
+# ============================================================================
+"""
+Cross‑sectional Granger scan: every top‑N coin × every lag ≤ scan_max_lag
+against ETH/BTC and BTC‑dominance changes.
+Lag matrices are built once; all restricted / unrestricted regressions for a
+lag are solved as one batched least‑squares problem (coins on the batch axis).
+Missing observations are zeroed out of the design, so each coin keeps its
+own sample without a Python loop over coins.
+"""
+import os, logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from settings import get_settings
+from factor_library import ROW_CHUNK, snapshot_panel, top_n_threshold
+
+DRIVERS = ["eth_btc_ret", "btc_dom_change"]
+
+
+def lag_stack(a: np.ndarray, max_lag: int) -> np.ndarray:
+    """(max_lag, T, …) stack with out[k‑1, t] = a[t‑k]; NaN where undefined."""
+    out = np.full((max_lag,) + a.shape, np.nan)
+    for k in range(1, max_lag + 1):
+        out[k - 1, k:] = a[:-k]
+    return out
+
+
+def batched_ols(X: np.ndarray, y: np.ndarray):
+    """(beta, rss) of y ~ X per batch (B, N, k); all‑zero rows drop out of the fit."""
+    Xt = X.transpose(0, 2, 1)
+    beta = _solve(Xt @ X, (Xt @ y[..., None])[..., 0])      # batched BLAS
+    resid = y - (X @ beta[..., None])[..., 0]
+    return beta, np.einsum("bn,bn->b", resid, resid)
+
+
+def _solve(A: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Batched solve. If any system is singular (e.g. a coin with fewer valid
+    rows than regressors) only those coins go through pinv; the rest keep
+    the exact batched solve.
+    """
+    try:
+        return np.linalg.solve(A, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        pass
+    bad = np.linalg.matrix_rank(A) < A.shape[-1]
+    out = np.empty(b.shape)
+    try:
+        out[~bad] = np.linalg.solve(A[~bad], b[~bad][..., None])[..., 0]
+    except np.linalg.LinAlgError:              # numerically singular despite full rank
+        bad[:] = True
+    out[bad] = np.einsum("bkj,bj->bk", np.linalg.pinv(A[bad]), b[bad])
+    return out
+
+
+def granger_batch(Y: np.ndarray, x: np.ndarray, max_lag: int,
+                  min_obs: int = 30) -> Dict[str, np.ndarray]:
+    """
+    Granger F‑test (statsmodels 'ssr_ftest') of x → each column of Y.
+    Y: (T, B) targets, x: (T,) or (T, B) driver. Returns (B, max_lag) arrays
+    `f_stat`, `p_value`, `n_obs`.
+    """
+    T, B = Y.shape
+    X = np.broadcast_to(x.reshape(T, -1), (T, B))
+    Y_lags = lag_stack(Y, max_lag)             # built once, sliced per lag
+    X_lags = lag_stack(np.ascontiguousarray(X), max_lag)
+
+    f_stat = np.full((B, max_lag), np.nan)
+    p_value = np.full((B, max_lag), np.nan)
+    n_obs = np.zeros((B, max_lag), dtype=int)
+
+    for p in range(1, max_lag + 1):
+        # statsmodels trims the first p rows for a lag‑p test
+        y = Y[p:].T                                            # (B, N)
+        yl = Y_lags[:p, p:].transpose(2, 1, 0)                 # (B, N, p)
+        xl = X_lags[:p, p:].transpose(2, 1, 0)
+        const = np.ones(y.shape + (1,))
+        Xr = np.concatenate([const, yl], axis=2)
+        Xu = np.concatenate([Xr, xl], axis=2)
+
+        ok = np.isfinite(y) & np.isfinite(Xu).all(axis=2)
+        y = np.where(ok, y, 0.0)
+        Xr = np.where(ok[..., None], Xr, 0.0)
+        Xu = np.where(ok[..., None], Xu, 0.0)
+
+        n = ok.sum(axis=1)
+        df_resid = n - 2 * p - 1
+        rss_r = batched_ols(Xr, y)[1]
+        rss_u = batched_ols(Xu, y)[1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            F = (rss_r - rss_u) / p / (rss_u / df_resid)
+        valid = (n >= max(min_obs, 2 * p + 2)) & np.isfinite(F)
+        f_stat[valid, p - 1] = F[valid]
+        p_value[valid, p - 1] = stats.f.sf(F[valid], p, df_resid[valid])
+        n_obs[:, p - 1] = n
+    return {"f_stat": f_stat, "p_value": p_value, "n_obs": n_obs}
+
+
+def coin_returns(factors: pd.DataFrame, n: int) -> pd.DataFrame:
+    """
+    (date × coin) coin/BTC return panel for every coin that ranked inside the
+    top‑N on at least one date of *factors*.
+    """
+    panel = snapshot_panel(factors.index,
+                           root=os.path.join(get_settings().cache_dir, "panel"))
+    caps, coins = panel["market_cap"], panel.coins
+
+    nth = top_n_threshold(caps, n)
+    in_universe = np.zeros(caps.shape[1], dtype=bool)
+    for i in range(0, len(caps), ROW_CHUNK):
+        in_universe |= (caps[i:i + ROW_CHUNK] >= nth[i:i + ROW_CHUNK, None]).any(axis=0)
+
+    ratio = caps[:, in_universe] / factors["BTC_CAP"].to_numpy(dtype=float)[:, None]
+    ret = np.full_like(ratio, np.nan)
+    ret[1:] = ratio[1:] / ratio[:-1] - 1
+    return pd.DataFrame(ret, index=factors.index, columns=coins[in_universe])
+
+
+def lead_lag_scan(factors: pd.DataFrame, max_lag: int = None) -> pd.DataFrame:
+    """Ranked (coin, driver, lag) table of Granger F‑statistics and p‑values."""
+    cfg = get_settings()
+    max_lag = max_lag or cfg.scan_max_lag
+    min_obs = cfg.scan_min_obs
+    rets = coin_returns(factors, cfg.top_n_marketcap)
+    Y = rets.to_numpy()
+    logging.info(f"Scanning {Y.shape[1]} coins × {max_lag} lags × {len(DRIVERS)} drivers …")
+
+    tables: List[pd.DataFrame] = []
+    for driver in DRIVERS:
+        res = granger_batch(Y, factors[driver].to_numpy(dtype=float), max_lag, min_obs)
+        tables.append(pd.DataFrame({
+            "coin": np.repeat(rets.columns.to_numpy(), max_lag),
+            "driver": driver,
+            "lag": np.tile(np.arange(1, max_lag + 1), Y.shape[1]),
+            "f_stat": res["f_stat"].ravel(),
+            "p_value": res["p_value"].ravel(),
+            "n_obs": res["n_obs"].ravel(),
+        }))
+    table = (pd.concat(tables, ignore_index=True)
+             .dropna(subset=["p_value"])
+             .sort_values(["p_value", "f_stat"], ascending=[True, False],
+                          ignore_index=True))
+
+    out_path = f"{cfg.results_dir}/lead_lag_scan.csv"
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    table.to_csv(out_path, index=False)
+    logging.info(f"Lead‑lag scan: {len(table)} tests, saved to {out_path}")
+    return table
+
+# ============================================================================
+# FILE: rolling_ols.py
+# ============================================================================
+"""
+Rolling / expanding OLS from running sufficient statistics.
+X'X, X'y and y'y are accumulated once; a window step adds the newest row and
+subtracts the row falling out (cumulative‑sum differences), so each step is
+O(k²) and all steps are solved together as one batched k×k system.
+"""
+import os, logging
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from settings import get_settings
+
+Window = Union[int, str]        # number of rows, or "expanding"
+
+
+def _window_sums(a: np.ndarray, window: Optional[int]) -> np.ndarray:
+    """Running sums along axis 0: expanding if window is None, else length‑window."""
+    c = np.cumsum(a, axis=0)
+    if window is None:
+        return c
+    out = c.copy()
+    out[window:] -= c[:-window]                  # downdate the row leaving the window
+    return out
+
+
+def ols_from_stats(XtX: np.ndarray, Xty: np.ndarray, yty: np.ndarray,
+                   n: np.ndarray, min_obs: int):
+    """Batched (beta, t, R²) from sufficient statistics; NaN where n < min_obs."""
+    T, k = Xty.shape
+    fit = n >= min_obs
+    beta = np.full((T, k), np.nan)
+    tval = np.full((T, k), np.nan)
+    r2 = np.full(T, np.nan)
+    if fit.any():
+        A, b = XtX[fit], Xty[fit]
+        inv = np.linalg.pinv(A)                                      # batched
+        bf = np.einsum("tij,tj->ti", inv, b)
+        rss = np.maximum(yty[fit] - np.einsum("ti,ti->t", bf, b), 0.0)
+        sigma2 = rss / (n[fit] - k)
+        se = np.sqrt(sigma2[:, None] * np.einsum("tii->ti", inv))
+        tss = yty[fit] - b[:, 0] ** 2 / n[fit]                       # b[:,0] = Σy
+        beta[fit], tval[fit] = bf, bf / se
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r2[fit] = 1 - rss / tss
+    return beta, tval, r2
+
+
+def resolve_min_obs(k: int, min_obs: Optional[int] = None) -> int:
+    """Usable rows before a k‑regressor fit is reported: default k + 2, never below k + 1."""
+    return max(min_obs or k + 2, k + 1)
+
+
+def rolling_ols(y: pd.Series, X: pd.DataFrame, window: Optional[int] = None,
+                min_obs: Optional[int] = None) -> pd.DataFrame:
+    """
+    OLS of y on [const, X] over a trailing *window* (rows) or expanding if None.
+    Rows with any NaN are skipped. Returns one row per date with `coef_*`,
+    `t_*`, `r2` and `n_obs`; NaN until `min_obs` usable rows are in the window.
+    """
+    names = ["const"] + list(X.columns)
+    Z = np.column_stack([np.ones(len(X)), X.to_numpy(dtype=float)])
+    yv = y.to_numpy(dtype=float)
+    ok = np.isfinite(yv) & np.isfinite(Z).all(axis=1)
+    Z = np.where(ok[:, None], Z, 0.0)
+    yv = np.where(ok, yv, 0.0)
+    k = Z.shape[1]
+    min_obs = resolve_min_obs(k, min_obs)
+
+    XtX = _window_sums(Z[:, :, None] * Z[:, None, :], window)      # (T, k, k)
+    Xty = _window_sums(Z * yv[:, None], window)                      # (T, k)
+    yty = _window_sums(yv * yv, window)
+    n = _window_sums(ok.astype(float), window)
+
+    beta, tval, r2 = ols_from_stats(XtX, Xty, yty, n, min_obs)
+
+    out = pd.DataFrame(beta, index=y.index, columns=[f"coef_{c}" for c in names])
+    out[[f"t_{c}" for c in names]] = tval
+    out["r2"] = r2
+    out["n_obs"] = n.astype(int)
+    return out
+
+
+class RunningOLS:
+    """
+    Online twin of rolling_ols: one row in, O(k²) update (and downdate once
+    the window is full). State is a few k×k arrays plus the window's rows.
+    """
+
+    def __init__(self, k: int, window: Optional[int] = None):
+        self.k = k
+        self.window = window
+        self.XtX = np.zeros((k, k))
+        self.Xty = np.zeros(k)
+        self.yty = 0.0
+        self.n = 0
+        self.rows: deque = deque()         # (z, y) or None for skipped rows
+
+    def update(self, x: np.ndarray, y: float) -> None:
+        z = np.r_[1.0, np.asarray(x, dtype=float)]
+        row = (z, float(y)) if np.isfinite(y) and np.isfinite(z).all() else None
+        if row is not None:
+            self._add(*row, sign=1.0)
+        if self.window is not None:
+            self.rows.append(row)
+            if len(self.rows) > self.window:
+                old = self.rows.popleft()
+                if old is not None:
+                    self._add(*old, sign=-1.0)
+
+    def _add(self, z: np.ndarray, y: float, sign: float) -> None:
+        self.XtX += sign * np.outer(z, z)
+        self.Xty += sign * z * y
+        self.yty += sign * y * y
+        self.n += int(sign)
+
+    def result(self, names: List[str], min_obs: Optional[int] = None) -> pd.Series:
+        beta, tval, r2 = ols_from_stats(self.XtX[None], self.Xty[None],
+                                        np.array([self.yty]), np.array([self.n]),
+                                        resolve_min_obs(self.k, min_obs))
+        out = {f"coef_{c}": b for c, b in zip(names, beta[0])}
+        out.update({f"t_{c}": t for c, t in zip(names, tval[0])})
+        out.update(r2=r2[0], n_obs=self.n)
+        return pd.Series(out)
+
+    def to_dict(self) -> Dict:
+        return {"k": self.k, "window": self.window, "XtX": self.XtX.tolist(),
+                "Xty": self.Xty.tolist(), "yty": self.yty, "n": self.n,
+                "rows": [None if r is None else [r[0].tolist(), r[1]] for r in self.rows]}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "RunningOLS":
+        obj = cls(d["k"], d["window"])
+        obj.XtX, obj.Xty = np.array(d["XtX"]), np.array(d["Xty"])
+        obj.yty, obj.n = d["yty"], d["n"]
+        obj.rows = deque(None if r is None else (np.array(r[0]), r[1]) for r in d["rows"])
+        return obj
+
+
+def run_rolling_regression(df: pd.DataFrame,
+                           windows: Optional[List[Window]] = None) -> pd.DataFrame:
+    """Rolling fits for every configured window, stacked with a `window` column."""
+    cfg = get_settings()
+    windows = windows or cfg.rolling_windows
+    y = df[cfg.target]
+    X = df[cfg.independent]
+
+    frames = []
+    for w in windows:
+        res = rolling_ols(y, X, window=None if w == "expanding" else int(w))
+        res.insert(0, "window", str(w))
+        frames.append(res)
+    out = pd.concat(frames)
+    out.index.name = "date"
+
+    out_path = f"{cfg.results_dir}/rolling_coefficients.csv"
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    out.to_csv(out_path)
+    logging.info(f"Rolling coefficients ({', '.join(map(str, windows))}) saved to {out_path}")
+    return out
+
+# ============================================================================
+# FILE: xcorr.py
+# ============================================================================
+"""
+Lagged cross‑correlation for many (leader → follower) pairs at once.
+lag k is corr(leader[t‑k], follower[t]); k > 0 means the leader leads.
+Full‑sample CCFs over every lag come from FFT cross‑correlations of the
+NaN‑masked series; rolling CCFs for every lag × window come from one
+cumulative sum per lag of the six Pearson sufficient statistics, differenced
+per window – no Python loop over pairs or dates.
+Usage:
+    python xcorr.py [--universe] [--step 7]
+"""
+import os, logging, argparse
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import fft
+
+from settings import get_settings, configure_logging
+from rolling_ols import Window
+from lead_lag_scan import DRIVERS, coin_returns
+
+Pair = Tuple[str, str]          # (leader, follower) column names
+COL_CHUNK = 32                  # pairs per block – keeps the six running sums in cache
+
+
+def _pearson(n, sa, sb, saa, sbb, sab, min_obs) -> np.ndarray:
+    """Correlation from sums: (n·Σab − ΣaΣb) / √((n·Σa² − (Σa)²)(n·Σb² − (Σb)²))."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = n * sab
+        r -= sa * sb
+        va = n * saa
+        va -= sa * sa
+        vb = n * sbb
+        vb -= sb * sb
+        va *= vb
+        r /= np.sqrt(va, out=va)
+    np.clip(r, -1, 1, out=r)
+    r[n < min_obs] = np.nan
+    return r
+
+
+def _col_mean(a: np.ndarray) -> np.ndarray:
+    """Per‑column mean of the finite values; 0 for all‑NaN columns (no nanmean warnings)."""
+    ok = np.isfinite(a)
+    n = ok.sum(axis=0)
+    return np.where(ok, a, 0.0).sum(axis=0) / np.maximum(n, 1)
+
+
+def _demeaned(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(values with NaN → 0, validity mask); demeaning keeps the sums well conditioned."""
+    ok = np.isfinite(a)
+    return np.where(ok, a - _col_mean(a), 0.0), ok.astype(np.float64)
+
+
+def ccf(x: np.ndarray, y: np.ndarray, max_lag: int,
+        min_obs: int = 30) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Full‑sample CCF of x → y (both (T, P)) for lags −max_lag … max_lag.
+    Each lag uses only the overlapping non‑NaN observations. Returns (corr, n),
+    each (2·max_lag + 1, P).
+    """
+    T = len(x)
+    a, ma = _demeaned(x)
+    b, mb = _demeaned(y)
+    nfft = fft.next_fast_len(2 * T - 1)
+
+    def spectrum(z):        # pairs × time rows → contiguous transforms
+        return fft.rfft(np.ascontiguousarray(z.T), nfft, axis=1, workers=-1)
+
+    U = [spectrum(u) for u in (ma, a, a * a)]
+    V = [spectrum(v) for v in (mb, b, b * b)]
+    lags = np.arange(-max_lag, max_lag + 1) % nfft
+
+    def xc(u, v):           # Σ_t u[t‑k] v[t] for every lag k
+        return fft.irfft(np.conj(u) * v, nfft, axis=1, workers=-1)[:, lags].T
+
+    n = np.rint(xc(U[0], V[0]))
+    r = _pearson(n, xc(U[1], V[0]), xc(U[0], V[1]), xc(U[2], V[0]), xc(U[0], V[2]),
+                 xc(U[1], V[1]), min_obs)
+    return r, n.astype(int)
+
+
+def _blocks(P: int):
+    for c in range(0, P, COL_CHUNK):
+        yield slice(c, c + COL_CHUNK)
+
+
+def _shift(a: np.ndarray, k: int) -> np.ndarray:
+    """out[t] = a[t‑k]; NaN where undefined (k may be negative)."""
+    out = np.full_like(a, np.nan)
+    if k == 0:
+        out[:] = a
+    elif k > 0:
+        out[k:] = a[:-k]
+    else:
+        out[:k] = a[-k:]
+    return out
+
+
+def rolling_xcorr(x: np.ndarray, y: np.ndarray, lags: Sequence[int],
+                  windows: Sequence[Window], min_obs: Optional[int] = None) -> np.ndarray:
+    """
+    (len(windows), len(lags), T, P) float32 rolling correlations of x → y.
+    Window: rows or "expanding"; *min_obs* defaults to half a window
+    (scan_min_obs for expanding).
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    out = np.full((len(windows), len(lags)) + y.shape, np.nan, dtype=np.float32)
+    y0 = y - _col_mean(y)
+    x0 = x - _col_mean(x)
+    need = [min_obs if min_obs is not None else
+            get_settings().scan_min_obs if w == "expanding" else max(3, int(w) // 2)
+            for w in windows]
+    for cols in _blocks(y.shape[1]):
+        for j, k in enumerate(lags):
+            xs = _shift(x0[:, cols], k)
+            ok = np.isfinite(xs) & np.isfinite(y0[:, cols])
+            a, b = np.where(ok, xs, 0.0), np.where(ok, y0[:, cols], 0.0)
+            c = np.cumsum(np.stack([ok, a, b, a * a, b * b, a * b]), axis=1)
+            buf = np.empty_like(c)
+            for i, w in enumerate(windows):
+                s = c if w == "expanding" else buf
+                if s is buf:                    # sums over the last w rows
+                    buf[:, :w] = c[:, :w]
+                    np.subtract(c[:, w:], c[:, :-w], out=buf[:, w:])
+                out[i, j, :, cols] = _pearson(*s, need[i])
+    return out
+
+
+def pair_arrays(data: pd.DataFrame, pairs: List[Pair]) -> Tuple[np.ndarray, np.ndarray]:
+    x = data[[p[0] for p in pairs]].to_numpy(dtype=float)
+    y = data[[p[1] for p in pairs]].to_numpy(dtype=float)
+    return x, y
+
+
+def _labels(pairs: List[Pair]) -> pd.Categorical:
+    return pd.Categorical([f"{lead}→{follow}" for lead, follow in pairs])
+
+
+def ccf_table(data: pd.DataFrame, pairs: List[Pair], max_lag: Optional[int] = None) -> pd.DataFrame:
+    """Tidy full‑sample CCF: pair, lag, corr, n_obs."""
+    max_lag = max_lag or get_settings().scan_max_lag
+    r, n = ccf(*pair_arrays(data, pairs), max_lag, get_settings().scan_min_obs)
+    L, P = r.shape
+    return pd.DataFrame({
+        "pair": np.tile(_labels(pairs), L),
+        "lag": np.repeat(np.arange(-max_lag, max_lag + 1), P),
+        "corr": r.ravel(),
+        "n_obs": n.ravel(),
+    }).dropna(subset=["corr"]).reset_index(drop=True)
+
+
+def xcorr(data: pd.DataFrame, pairs: List[Pair], lags: Optional[Sequence[int]] = None,
+          windows: Optional[Sequence[Window]] = None, step: int = 1) -> pd.DataFrame:
+    """
+    Tidy rolling CCF: date, pair, lag, window, corr (every *step*‑th date,
+    undefined correlations dropped). Defaults: lags 0 … scan_max_lag and
+    the rolling_windows of rolling_ols.
+    """
+    cfg = get_settings()
+    lags = list(lags if lags is not None else range(cfg.scan_max_lag + 1))
+    windows = list(windows or cfg.rolling_windows)
+    cube = rolling_xcorr(*pair_arrays(data, pairs), lags, windows)[:, :, ::step]
+    W, L, T, P = cube.shape
+
+    # Output columns sized from the finite count, then filled one (window, lag)
+    # block at a time – peak memory is the cube plus the table, no 4‑D index grid.
+    n = int(np.isfinite(cube).sum())
+    dates = np.asarray(data.index[::step])
+    labels, names = _labels(pairs), pd.Categorical([str(w) for w in windows])
+    out = {"date": np.empty(n, dates.dtype), "pair": np.empty(n, np.int32),
+           "lag": np.empty(n, np.int16), "window": np.empty(n, np.int8),
+           "corr": np.empty(n, cube.dtype)}
+    pos = 0
+    for w in range(W):
+        for l, lag in enumerate(lags):
+            block = cube[w, l]
+            t, p = np.nonzero(np.isfinite(block))
+            end = pos + len(t)
+            out["date"][pos:end] = dates[t]
+            out["pair"][pos:end] = labels.codes[p]
+            out["lag"][pos:end] = lag
+            out["window"][pos:end] = names.codes[w]
+            out["corr"][pos:end] = block[t, p]
+            pos = end
+    out["pair"] = pd.Categorical.from_codes(out["pair"], labels.categories)
+    out["window"] = pd.Categorical.from_codes(out["window"], names.categories)
+    return pd.DataFrame(out, copy=False)
+
+
+def universe_pairs(factors: pd.DataFrame) -> Tuple[pd.DataFrame, List[Pair]]:
+    """Drivers → target and → every top‑N coin's BTC‑relative return."""
+    cfg = get_settings()
+    rets = coin_returns(factors, cfg.top_n_marketcap)
+    data = pd.concat([factors[DRIVERS + [cfg.target]], rets], axis=1)
+    followers = [cfg.target] + list(rets.columns)
+    return data, [(d, f) for d in DRIVERS for f in followers]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--universe", action="store_true",
+                        help="every top‑N coin, not just the target")
+    parser.add_argument("--step", type=int, default=1, help="keep every n‑th date")
+    args = parser.parse_args()
+    configure_logging()
+    from model import load_or_build
+    cfg = get_settings()
+    factors = load_or_build()
+    if args.universe:
+        data, pairs = universe_pairs(factors)
+    else:
+        data, pairs = factors, [(d, cfg.target) for d in DRIVERS]
+
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    table = ccf_table(data, pairs)
+    table.to_csv(f"{cfg.results_dir}/xcorr_ccf.csv", index=False)
+    rolling = xcorr(data, pairs, step=args.step)
+    rolling.to_parquet(f"{cfg.results_dir}/xcorr_rolling.parquet", index=False)
+    logging.info(f"Cross‑correlations: {len(pairs)} pairs, {len(table)} CCF rows, "
+                 f"{len(rolling):,} rolling rows saved to {cfg.results_dir}")
+
+# ============================================================================
+# FILE: shared_frame.py
+# ============================================================================
+"""
+Share a numeric DataFrame with worker processes through POSIX shared memory.
+The parent copies the values in once; workers attach by name in their pool
+initializer, so tasks carry only small arguments instead of the whole frame.
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SharedFrame:
+    """Owner side: `with SharedFrame(df) as sf: pool(initargs=(sf.spec,))`."""
+
+    def __init__(self, df: pd.DataFrame):
+        values = np.ascontiguousarray(df.to_numpy(dtype="float64"))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype="float64", buffer=self._shm.buf)[:] = values
+        self.spec: Dict = {
+            "name": self._shm.name,
+            "shape": values.shape,
+            "columns": list(df.columns),
+            "index": df.index.to_numpy(),
+        }
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach(spec: Dict) -> Tuple[pd.DataFrame, shared_memory.SharedMemory]:
+    """Worker side: zero‑copy DataFrame view on the shared block (keep the handle alive)."""
+    # pool workers share the owner's resource tracker, so attaching here does
+    # not schedule a second unlink – the owner's close() stays authoritative
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    values = np.ndarray(spec["shape"], dtype="float64", buffer=shm.buf)
+    values.flags.writeable = False
+    df = pd.DataFrame(values, index=spec["index"], columns=spec["columns"], copy=False)
+    return df, shm
+
+# ============================================================================
+# FILE: resampling.py
+# ============================================================================
+"""
+Resampling significance for the ETH→alts Granger lead.
+  permutation – circularly shift ETH/BTC against OTHERS/BTC (keeps each
+                series' autocorrelation, destroys the lead) → null F‑distribution
+  bootstrap   – stationary block bootstrap (Politis & Romano) of the aligned
+                regression rows → CI for the lead coefficient and F‑statistic
+Replicates run in a process pool; the factor matrix sits in shared memory and
+each task evaluates a whole chunk of replicates as one batched regression.
+"""
+import os, logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from settings import get_settings
+from lead_lag_scan import batched_ols
+from shared_frame import SharedFrame, attach
+
+Y_COL, X_COL = "others_btc_ret", "eth_btc_ret"
+_WORKER: Dict = {}
+
+
+def _init_worker(spec: Dict) -> None:
+    _WORKER["frame"], _WORKER["shm"] = attach(spec)
+
+
+def _series(frame: pd.DataFrame):
+    d = frame[[Y_COL, X_COL]].dropna()
+    return d[Y_COL].to_numpy(), d[X_COL].to_numpy()
+
+
+def _design(y: np.ndarray, x_lags: np.ndarray, lag: int):
+    """Restricted / unrestricted Granger designs for lag p (rows t = p … T‑1)."""
+    T = len(y)
+    rows = np.arange(lag, T)
+    yl = np.stack([y[rows - j] for j in range(1, lag + 1)], axis=-1)
+    const = np.ones((len(rows), 1))
+    Xr = np.concatenate([const, yl], axis=1)
+    Xu = np.concatenate([np.broadcast_to(Xr, x_lags.shape[:-1] + Xr.shape[-1:]),
+                         x_lags], axis=-1)
+    return y[rows], Xr, Xu
+
+
+def _f_and_beta(yt: np.ndarray, Xr: np.ndarray, Xu: np.ndarray, lag: int):
+    """Batched Granger F and summed lead coefficient; inputs carry a batch axis."""
+    rss_r = batched_ols(Xr, yt)[1]
+    beta_u, rss_u = batched_ols(Xu, yt)
+    df_resid = yt.shape[-1] - 2 * lag - 1
+    f_stat = (rss_r - rss_u) / lag / (rss_u / df_resid)
+    return f_stat, beta_u[:, -lag:].sum(axis=1)
+
+
+def _x_lags(x: np.ndarray, lag: int, shifts: np.ndarray) -> np.ndarray:
+    """(R, T‑p, p) lags of x circularly shifted by `shifts` (0 = original)."""
+    T = len(x)
+    rows = np.arange(lag, T)
+    j = np.arange(1, lag + 1)
+    pos = (rows[None, :, None] - j[None, None, :] - shifts[:, None, None]) % T
+    return x[pos]
+
+
+def observed(frame: pd.DataFrame, lag: int) -> Dict[str, float]:
+    y, x = _series(frame)
+    yt, Xr, Xu = _design(y, _x_lags(x, lag, np.zeros(1, dtype=int)), lag)
+    f_stat, beta = _f_and_beta(yt[None], Xr[None], Xu, lag)
+    df_resid = len(yt) - 2 * lag - 1
+    return {"f_stat": float(f_stat[0]), "lead_beta": float(beta[0]),
+            "asymptotic_p": float(stats.f.sf(f_stat[0], lag, df_resid)),
+            "n_obs": len(yt)}
+
+
+def _permutation_chunk(seed: np.random.SeedSequence, n_reps: int, lag: int) -> np.ndarray:
+    y, x = _series(_WORKER["frame"])
+    rng = np.random.default_rng(seed)
+    T = len(x)
+    min_shift = max(lag + 1, T // 10)          # keep shifted x far from its true lag
+    shifts = rng.integers(min_shift, T - min_shift + 1, size=n_reps)
+    yt, Xr, Xu = _design(y, _x_lags(x, lag, shifts), lag)
+    R = n_reps
+    f_stat, _ = _f_and_beta(np.broadcast_to(yt, (R, len(yt))),
+                            np.broadcast_to(Xr, (R,) + Xr.shape), Xu, lag)
+    return f_stat
+
+
+def stationary_bootstrap_indices(rng: np.random.Generator, n: int, n_reps: int,
+                                 mean_block: float) -> np.ndarray:
+    """(n_reps, n) row indices; blocks have geometric length with mean `mean_block`."""
+    t = np.arange(n)
+    new_block = rng.random((n_reps, n)) < 1.0 / mean_block
+    new_block[:, 0] = True
+    block_start = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+    starts = rng.integers(0, n, size=(n_reps, n))
+    origin = np.take_along_axis(starts, block_start, axis=1)
+    return (origin + t - block_start) % n                   # circular wrap
+
+
+def _bootstrap_chunk(seed: np.random.SeedSequence, n_reps: int, lag: int,
+                     mean_block: float) -> np.ndarray:
+    y, x = _series(_WORKER["frame"])
+    rng = np.random.default_rng(seed)
+    yt, Xr, Xu = _design(y, _x_lags(x, lag, np.zeros(1, dtype=int)), lag)
+    idx = stationary_bootstrap_indices(rng, len(yt), n_reps, mean_block)
+    f_stat, beta = _f_and_beta(yt[idx], Xr[idx], Xu[0][idx], lag)
+    return np.column_stack([f_stat, beta])
+
+
+def _chunks(n_reps: int, n_tasks: int):
+    sizes = np.full(n_tasks, n_reps // n_tasks)
+    sizes[: n_reps % n_tasks] += 1
+    return [int(k) for k in sizes if k]
+
+
+def resampled_lead_lag(df: pd.DataFrame, n_reps: Optional[int] = None,
+                       workers: Optional[int] = None) -> pd.Series:
+    """Empirical permutation p‑value and bootstrap CIs for the ETH→alts lead."""
+    cfg = get_settings()
+    lag = cfg.lag_weeks
+    n_reps = n_reps or cfg.resample_reps
+    workers = workers or cfg.resample_workers or os.cpu_count() or 1
+    mean_block = cfg.resample_block
+    alpha = cfg.resample_alpha
+
+    obs = observed(df, lag)
+    sizes = _chunks(n_reps, workers * 4)        # several chunks/worker → even load
+    root = np.random.SeedSequence(cfg.resample_seed)
+    perm_seeds = root.spawn(len(sizes))
+    boot_seeds = root.spawn(len(sizes))
+
+    numeric = df.select_dtypes("number")
+    logging.info(f"Resampling {n_reps:,} permutation + {n_reps:,} bootstrap "
+                 f"replicates on {workers} processes …")
+    with SharedFrame(numeric) as shared, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(shared.spec,)) as pool:
+        perm = [pool.submit(_permutation_chunk, s, k, lag)
+                for s, k in zip(perm_seeds, sizes)]
+        boot = [pool.submit(_bootstrap_chunk, s, k, lag, mean_block)
+                for s, k in zip(boot_seeds, sizes)]
+        f_null = np.concatenate([p.result() for p in perm])
+        boot_stats = np.concatenate([b.result() for b in boot])
+
+    lo, hi = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    res = pd.Series({
+        **obs,
+        "permutation_p": (1 + np.sum(f_null >= obs["f_stat"])) / (1 + len(f_null)),
+        "f_ci_low": np.percentile(boot_stats[:, 0], lo),
+        "f_ci_high": np.percentile(boot_stats[:, 0], hi),
+        "lead_beta_ci_low": np.percentile(boot_stats[:, 1], lo),
+        "lead_beta_ci_high": np.percentile(boot_stats[:, 1], hi),
+        "n_reps": n_reps,
+    }, name=f"lag_{lag}")
+
+    out_path = f"{cfg.results_dir}/lead_lag_resampling.csv"
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    res.to_csv(out_path, header=["value"])
+    logging.info(f"Permutation p = {res['permutation_p']:.4f} (asymptotic "
+                 f"{obs['asymptotic_p']:.4f}); lead β {1 - alpha:.0%} CI "
+                 f"[{res['lead_beta_ci_low']:.3f}, {res['lead_beta_ci_high']:.3f}]")
+    return res
+
+# ============================================================================
+# FILE: pipeline.py
+# ============================================================================
+"""
+Content‑hashed stage runner for data_prep → factor_library → model.
+Each stage's key hashes its config slice, the source of its modules and the
+digests of its upstream artifacts; a stage re‑runs only when that key (or one
+of its own outputs) changed. Keys live in cache_dir/pipeline.json.
+"""
+import os, json, hashlib, logging, time
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import profiling
+
+MANIFEST = "pipeline.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], None]
+    config_keys: List[str]
+    outputs: List[str]                                   # artifact paths
+    deps: List[str] = field(default_factory=list)        # upstream stage names
+    modules: List[str] = field(default_factory=list)     # code that defines it
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _module_digest(name: str) -> str:
+    """Hash a module's source without importing it."""
+    spec = importlib.util.find_spec(name)
+    origin = getattr(spec, "origin", None)
+    return file_digest(origin) if origin and os.path.exists(origin) else "missing"
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], cfg: Dict, cache_dir: str):
+        self.stages = {s.name: s for s in stages}
+        self.cfg = cfg
+        self.manifest_fn = f"{cache_dir}/{MANIFEST}"
+        self.manifest: Dict = {}
+        if os.path.exists(self.manifest_fn):
+            with open(self.manifest_fn) as f:
+                self.manifest = json.load(f)
+
+    def _order(self) -> List[Stage]:
+        done, order = set(), []
+
+        def visit(name: str):
+            if name in done:
+                return
+            for dep in self.stages[name].deps:
+                visit(dep)
+            done.add(name)
+            order.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def stage_key(self, stage: Stage) -> str:
+        payload = {
+            "config": {k: self.cfg.get(k) for k in stage.config_keys},
+            "code": {m: _module_digest(m) for m in stage.modules},
+            "upstream": {d: self.manifest.get(d, {}).get("outputs", {})
+                         for d in stage.deps},
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def _fresh(self, stage: Stage, key: str) -> bool:
+        entry = self.manifest.get(stage.name)
+        if not entry or entry.get("key") != key:
+            return False
+        recorded = entry.get("outputs", {})
+        return all(os.path.exists(p) and recorded.get(p) == file_digest(p)
+                   for p in stage.outputs)
+
+    def run(self, force: bool = False) -> List[str]:
+        """Run stale stages in dependency order; returns the names that ran."""
+        ran = []
+        for stage in self._order():
+            key = self.stage_key(stage)
+            if not force and self._fresh(stage, key):
+                logging.info(f"[pipeline] {stage.name}: up to date")
+                profiling.count("stage_cached")
+                continue
+            t0 = time.perf_counter()
+            with profiling.stage(f"pipeline.{stage.name}"):
+                stage.run()
+            self.manifest[stage.name] = {
+                "key": key,
+                "outputs": {p: file_digest(p) for p in stage.outputs},
+            }
+            self._save()
+            ran.append(stage.name)
+            logging.info(f"[pipeline] {stage.name}: rebuilt in {time.perf_counter() - t0:.2f}s")
+        return ran
+
+    def _save(self) -> None:
+        tmp = self.manifest_fn + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_fn)
+
+# ============================================================================
+# FILE: import_budget.py
+# ============================================================================
+"""
+Import‑time budget check for the toolkit entry point.
+    python import_budget.py            # time `import model`, list heavy deps
+    python import_budget.py --cached   # also run load_or_build() on cached data
+Exits 1 if `import model` exceeds `import_budget_s`, pulls in a heavy
+dependency, or if a cached run loads a network client.
+"""
+import argparse, json, subprocess, sys
+from typing import Dict, List
+
+from settings import get_settings
+
+HEAVY = ["pycoingecko", "yfinance", "statsmodels", "scipy", "tqdm", "requests"]
+NETWORK_CLIENTS = ["pycoingecko", "yfinance"]
+
+_PROBE = """
+import json, sys
+import model
+{extra}
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def probe(cached_run: bool = False) -> Dict:
+    """Run `import model` in a fresh interpreter under -X importtime."""
+    extra = "model.load_or_build()" if cached_run else ""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                           _PROBE.format(extra=extra)],
+                          capture_output=True, text=True, check=True)
+    import_us = 0
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].rstrip() == " model":
+            import_us = int(parts[1])
+    loaded = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {"import_s": import_us / 1e6,
+            "heavy_loaded": [m for m in HEAVY if m in loaded]}
+
+
+def check(cached_run: bool = False) -> List[str]:
+    budget = get_settings().import_budget_s
+    problems = []
+    res = probe()
+    print(f"import model: {res['import_s']:.3f}s (budget {budget:.2f}s)")
+    if res["import_s"] > budget:
+        problems.append(f"import model took {res['import_s']:.3f}s > {budget:.2f}s")
+    if res["heavy_loaded"]:
+        problems.append(f"import model loaded {res['heavy_loaded']}")
+    if cached_run:
+        clients = [m for m in probe(cached_run=True)["heavy_loaded"]
+                   if m in NETWORK_CLIENTS]
+        if clients:
+            problems.append(f"cached load_or_build() loaded network clients {clients}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cached", action="store_true",
+                        help="also check a cached load_or_build() run")
+    problems = check(parser.parse_args().cached)
+    for p in problems:
+        print("FAIL:", p)
+    sys.exit(1 if problems else 0)
+
+# ============================================================================
+# FILE: streaming.py
+# ============================================================================
+"""
+Incremental factor updates: append one bar without recomputing history.
+FactorStream keeps only what the next row needs – last ETH/BTC, OTHERS/BTC,
+BTC‑dominance and quality‑ratio levels, the macro rolling buffer and running
+OLS statistics per rolling window – in cache_dir/stream_state.json. Each new
+row is written as a small part file under cache_dir/factors_tail/; use
+load_factors() to read factors.parquet + tail.
+Usage:
+    python streaming.py --date 2025-08-03   # fetch and append that bar
+    python streaming.py --compact           # fold tail parts into one file
+"""
+import os, json, glob, logging, argparse
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from settings import get_settings, configure_logging
+from rolling_ols import RunningOLS
+
+STATE_FN = "stream_state.json"
+TAIL_DIR = "factors_tail"
+MACRO_WINDOW = 4                  # matches compute_factors' rolling(4) mean
+
+
+def _path(name: str) -> str:
+    return os.path.join(get_settings().cache_dir, name)
+
+
+def _base_digest() -> Optional[str]:
+    from pipeline import file_digest
+    fn = _path("factors.parquet")
+    return file_digest(fn) if os.path.exists(fn) else None
+
+
+def _read_tail() -> pd.DataFrame:
+    parts = sorted(glob.glob(os.path.join(_path(TAIL_DIR), "*.parquet")))
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(p) for p in parts]).sort_index()
+
+
+def load_factors() -> pd.DataFrame:
+    """factors.parquet plus streamed rows after its last date."""
+    base = pd.read_parquet(_path("factors.parquet"))
+    tail = _read_tail()
+    if tail.empty:
+        return base
+    tail = tail[tail.index > base.index.max()].drop(columns="macro_raw")
+    return pd.concat([base, tail]) if len(tail) else base
+
+
+def compact() -> int:
+    """Rewrite all tail parts as a single part file; returns rows kept."""
+    tail = _read_tail()
+    if tail.empty:
+        return 0
+    tail_dir = _path(TAIL_DIR)
+    old = glob.glob(os.path.join(tail_dir, "*.parquet"))
+    tmp = os.path.join(tail_dir, ".compact.tmp")
+    tail[~tail.index.duplicated(keep="last")].to_parquet(tmp)
+    for fn in old:
+        os.remove(fn)
+    os.replace(tmp, os.path.join(tail_dir, "part-compacted.parquet"))
+    logging.info(f"Compacted {len(old)} tail parts → {len(tail)} rows")
+    return len(tail)
+
+
+# --------------------------------------------------------------------------- #
+# Rolling state
+# --------------------------------------------------------------------------- #
+class FactorStream:
+    def __init__(self, columns: list, last: Dict[str, float], macro: list,
+                 models: Dict[str, RunningOLS], last_ts: Optional[str] = None,
+                 base_digest: Optional[str] = None):
+        self.columns = columns
+        self.last = last
+        self.macro = deque(macro, maxlen=MACRO_WINDOW)
+        self.models = models
+        self.last_ts = last_ts
+        self.base_digest = base_digest
+
+    # -- bootstrap ------------------------------------------------------- #
+    @classmethod
+    def from_history(cls, master: pd.DataFrame, factors: pd.DataFrame) -> "FactorStream":
+        """One O(n) pass over the batch artifacts; every update after is O(1)."""
+        cfg = get_settings()
+        X = factors[cfg.independent].to_numpy(dtype=float)
+        y = factors[cfg.target].to_numpy(dtype=float)
+        models = {}
+        for w in cfg.rolling_windows:
+            m = RunningOLS(len(cfg.independent) + 1,          # + constant
+                           None if w == "expanding" else int(w))
+            for xi, yi in zip(X, y):
+                m.update(xi, yi)
+            models[str(w)] = m
+        tip = factors.iloc[-1]
+        last = {c: float(tip[c]) for c in ("ETH_BTC", "OTHERS_BTC", "BTC_DOM", "quality_ratio")}
+        raw = master["macro_liquidity"].loc[:factors.index[-1]]
+        return cls(list(factors.columns), last, raw.iloc[-MACRO_WINDOW:].tolist(),
+                   models, factors.index[-1].isoformat(), _base_digest())
+
+    @classmethod
+    def open(cls) -> "FactorStream":
+        """Load saved state; rebuild it if factors.parquet was recomputed since."""
+        fn = _path(STATE_FN)
+        digest = _base_digest()
+        if os.path.exists(fn):
+            with open(fn) as f:
+                d = json.load(f)
+            if d["base_digest"] == digest:
+                return cls(d["columns"], d["last"], d["macro"],
+                           {w: RunningOLS.from_dict(m) for w, m in d["models"].items()},
+                           d["last_ts"], d["base_digest"])
+            logging.info("factors.parquet changed – rebuilding stream state …")
+        from data_prep import load_master
+        master = load_master()
+        base = pd.read_parquet(_path("factors.parquet"))
+        stream = cls.from_history(master, base)
+        # replay streamed rows the new base does not cover yet
+        tail = _read_tail()
+        for ts, row in (tail[tail.index > base.index.max()] if len(tail) else tail).iterrows():
+            bar = row.drop("macro_raw").copy()
+            bar["macro_liquidity"] = row["macro_raw"]
+            stream.step(ts, bar, float(row["quality_ratio"]))
+        stream.save()
+        return stream
+
+    def save(self) -> None:
+        fn = _path(STATE_FN)
+        tmp = os.path.join(os.path.dirname(fn), "." + STATE_FN + ".tmp")
+        state = {"columns": self.columns, "last": self.last, "macro": list(self.macro),
+                 "models": {w: m.to_dict() for w, m in self.models.items()},
+                 "last_ts": self.last_ts, "base_digest": self.base_digest}
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, fn)
+
+    # -- one bar --------------------------------------------------------- #
+    def step(self, ts: pd.Timestamp, bar: pd.Series, quality_ratio: float) -> pd.Series:
+        """
+        Factor row for *bar* (one master row, raw macro return) – same
+        formulas as compute_factors, fed from the saved levels.
+        """
+        cfg = get_settings()
+        ts = pd.Timestamp(ts)
+        if self.last_ts is not None and ts <= pd.Timestamp(self.last_ts):
+            raise ValueError(f"bar {ts.date()} is not after last streamed bar {self.last_ts}")
+
+        row = bar.copy()
+        row["ETH_BTC"] = bar["ETH_CAP"] / bar["BTC_CAP"]
+        row["OTHERS_BTC"] = bar["OTHERS_CAP"] / bar["BTC_CAP"]
+        row["OTHERS_ETH"] = bar["OTHERS_CAP"] / bar["ETH_CAP"]
+        row["eth_btc_ret"] = row["ETH_BTC"] / self.last["ETH_BTC"] - 1
+        row["others_btc_ret"] = row["OTHERS_BTC"] / self.last["OTHERS_BTC"] - 1
+        row["btc_dom_change"] = bar["BTC_DOM"] - self.last["BTC_DOM"]
+
+        self.macro.append(float(bar["macro_liquidity"]))
+        row["macro_liquidity"] = (np.mean(self.macro) if len(self.macro) == MACRO_WINDOW
+                                  else np.nan)
+        row["quality_ratio"] = quality_ratio
+        row["quality_alpha"] = quality_ratio - self.last["quality_ratio"]
+        row = row.reindex(self.columns)
+
+        x = row[cfg.independent].to_numpy(dtype=float)
+        for m in self.models.values():
+            m.update(x, float(row[cfg.target]))
+
+        self.last = {c: float(row[c]) for c in self.last}
+        self.last_ts = ts.isoformat()
+        return row
+
+    def append(self, ts: pd.Timestamp, bar: pd.Series, quality_ratio: float) -> pd.Series:
+        """step() + persist: one tail part file and the updated state."""
+        row = self.step(ts, bar, quality_ratio)
+        frame = row.to_frame(pd.Timestamp(ts)).T.astype(float)
+        frame["macro_raw"] = float(bar["macro_liquidity"])
+        tail_dir = _path(TAIL_DIR)
+        os.makedirs(tail_dir, exist_ok=True)
+        frame.to_parquet(os.path.join(tail_dir, f"part-{pd.Timestamp(ts):%Y%m%d}.parquet"))
+        self.save()
+        return row
+
+    def coefficients(self) -> pd.DataFrame:
+        """Current fit per rolling window (same columns as rolling_ols)."""
+        names = ["const"] + get_settings().independent
+        return pd.DataFrame({w: m.result(names) for w, m in self.models.items()}).T
+
+
+# --------------------------------------------------------------------------- #
+# Fetch one bar
+# --------------------------------------------------------------------------- #
+def fetch_bar(ts: pd.Timestamp) -> pd.Series:
+    """One master row at *ts*: last available caps/macro within the bar."""
+    import datetime as dt
+    from data_prep import get_coin_marketcap, get_total_marketcap, get_macro_frame
+    cfg = get_settings()
+    end = pd.Timestamp(ts).date()
+    start = end - dt.timedelta(days=14)          # > one weekly bar; macro needs a prior close
+    caps = {"BTC_CAP": get_coin_marketcap("bitcoin", start, end),
+            "ETH_CAP": get_coin_marketcap("ethereum", start, end),
+            "TOTAL_CAP": get_total_marketcap(start, end)}
+    for sym, coin_id in (cfg.extra_coins or {}).items():
+        caps[f"{sym}_CAP"] = get_coin_marketcap(coin_id, start, end)
+    bar = pd.Series({k: s.loc[:pd.Timestamp(ts)].iloc[-1] for k, s in caps.items()})
+    bar["OTHERS_CAP"] = bar["TOTAL_CAP"] - bar["BTC_CAP"] - bar["ETH_CAP"]
+    bar["BTC_DOM"] = bar["BTC_CAP"] / bar["TOTAL_CAP"]
+    bar["ETH_DOM"] = bar["ETH_CAP"] / bar["TOTAL_CAP"]
+    macro = get_macro_frame(start, end + dt.timedelta(days=1)).loc[:pd.Timestamp(ts)]
+    for col in macro.columns:
+        bar[col] = float(macro[col].dropna().iloc[-1])
+    return bar
+
+
+def update(ts: pd.Timestamp, bar: Optional[pd.Series] = None) -> pd.Series:
+    """Append the bar at *ts* (fetched unless given) to factors + regression state."""
+    from factor_library import make_quality_mask
+    ts = pd.Timestamp(ts)
+    bar = fetch_bar(ts) if bar is None else bar
+    qrat = make_quality_mask(bar.to_frame(ts).T).iloc[0]
+    stream = FactorStream.open()
+    row = stream.append(ts, bar, float(qrat))
+    logging.info(f"Streamed {ts.date()}: others_btc_ret={row['others_btc_ret']:.4f}, "
+                 f"quality_ratio={qrat:.3f}")
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", help="bar timestamp to append (YYYY-MM-DD)")
+    parser.add_argument("--compact", action="store_true")
+    args = parser.parse_args()
+    configure_logging()
+    if args.date:
+        update(pd.Timestamp(args.date))
+        print(FactorStream.open().coefficients().to_string())
+    if args.compact:
+        compact()
+
+# ============================================================================
+# FILE: sweep.py
+# ============================================================================
+"""
+Parameter sweep: run_regression + lead_lag_test over a grid of config
+overrides on a process pool, collected into one tidy Parquet table.
+Factors are computed once per distinct (frequency, top_n_marketcap,
+min_liquidity_usd) and placed in shared memory; tasks carry only their
+overrides, and start_date / end_date slice rows inside the worker.
+Usage:
+    python sweep.py --grid sweep.yml [--workers 8] [--out results/sweep.parquet]
+sweep.yml:
+    grid:                        # full cartesian product …
+      frequency: ["W-SUN", "W-FRI"]
+      lag_weeks: [1, 2, 3, 4]
+      independent: [["eth_btc_ret", "btc_dom_change"],
+                    ["eth_btc_ret", "btc_dom_change", "quality_alpha", "macro_liquidity"]]
+    points:                      # … × each explicit override set (optional)
+      - {start_date: "2019-01-01", end_date: "2022-12-31"}
+      - {start_date: "2023-01-01"}
+"""
+import os, itertools, logging, argparse, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from settings import get_settings, use_settings, override, configure_logging
+from shared_frame import SharedFrame, attach
+
+FACTOR_KEYS = ("frequency", "top_n_marketcap", "min_liquidity_usd")   # change the data
+MODEL_KEYS = ("target", "independent", "lag_weeks", "start_date", "end_date")
+_WORKER: Dict = {}
+
+
+def expand(grid: Optional[Dict] = None, points: Optional[List[Dict]] = None) -> List[Dict]:
+    """Cartesian product of *grid* × every override set in *points*."""
+    grid = grid or {}
+    combos = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    combos = [{**c, **p} for c in combos for p in (points or [{}])]
+    unknown = {k for c in combos for k in c} - set(FACTOR_KEYS) - set(MODEL_KEYS)
+    if unknown:
+        raise ValueError(f"cannot sweep {sorted(unknown)}; supported: "
+                         f"{list(FACTOR_KEYS) + list(MODEL_KEYS)}")
+    return combos
+
+
+def _factor_key(point: Dict) -> Tuple:
+    cfg = get_settings()
+    return tuple(point.get(k, cfg.get(k)) for k in FACTOR_KEYS)
+
+
+def _build_factors(key: Tuple) -> pd.DataFrame:
+    from data_prep import load_master
+    from factor_library import compute_factors
+    base = get_settings()
+    use_settings(override(**dict(zip(FACTOR_KEYS, key))))
+    try:
+        return compute_factors(load_master()).select_dtypes("number")
+    finally:
+        use_settings(base)
+
+
+def _init_worker(specs: Dict[int, Dict]) -> None:
+    _WORKER["frames"] = {g: attach(spec) for g, spec in specs.items()}
+
+
+def _evaluate(point_id: int, group: int, point: Dict) -> List[Dict]:
+    """Fit one grid point; tidy rows, one per regression term."""
+    from model import fit_regression, lead_lag_test
+    cfg = get_settings()
+    df = _WORKER["frames"][group][0]
+    start, end = point.get("start_date", cfg.start_date), point.get("end_date", cfg.end_date)
+    df = df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+    target = point.get("target", cfg.target)
+    independent = list(point.get("independent", cfg.independent))
+    lag = point.get("lag_weeks", cfg.lag_weeks)
+
+    labels = {k: point.get(k, cfg.get(k)) for k in FACTOR_KEYS + MODEL_KEYS}
+    labels["independent"] = "+".join(independent)
+    try:
+        fit = fit_regression(df, target, independent)
+        pval = lead_lag_test(df, lag)
+    except Exception as e:                      # too few rows for this slice, …
+        return [{"point": point_id, **labels, "term": None, "error": str(e)}]
+    return [{"point": point_id, **labels, "term": term,
+             "coef": fit.params[term], "std_err": fit.bse[term],
+             "t": fit.tvalues[term], "p_value": fit.pvalues[term],
+             "r2": fit.rsquared, "adj_r2": fit.rsquared_adj, "n_obs": int(fit.nobs),
+             "granger_p": pval, "error": None}
+            for term in fit.params.index]
+
+
+def run_sweep(points: List[Dict], workers: Optional[int] = None,
+              out_path: Optional[str] = None) -> pd.DataFrame:
+    cfg = get_settings()
+    workers = workers or cfg.sweep_workers or os.cpu_count() or 1
+    out_path = out_path or f"{cfg.results_dir}/sweep.parquet"
+
+    keys = list(dict.fromkeys(_factor_key(p) for p in points))
+    group_of = {k: g for g, k in enumerate(keys)}
+    logging.info(f"Sweep: {len(points)} points over {len(keys)} factor set(s) "
+                 f"on {workers} processes …")
+    t0 = time.perf_counter()
+    shared: Dict[int, SharedFrame] = {}
+    try:
+        for g, k in enumerate(keys):
+            shared[g] = SharedFrame(_build_factors(k))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=({g: s.spec for g, s in shared.items()},)) as pool:
+            futures = [pool.submit(_evaluate, i, group_of[_factor_key(p)], p)
+                       for i, p in enumerate(points)]
+            rows = [row for f in futures for row in f.result()]
+    finally:
+        for s in shared.values():
+            s.close()
+
+    out = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    out.to_parquet(out_path, index=False)
+    failed = out.loc[out["error"].notna(), "point"].nunique()
+    logging.info(f"Sweep done in {time.perf_counter() - t0:.1f}s → {out_path}"
+                 + (f" ({failed} points failed)" if failed else ""))
+    return out
+
+
+if __name__ == "__main__":
+    import yaml
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grid", required=True, help="YAML with `grid:` and/or `points:`")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    configure_logging()
+    with open(args.grid) as f:
+        spec = yaml.safe_load(f) or {}
+    run_sweep(expand(spec.get("grid"), spec.get("points")), args.workers, args.out)
+
 # ============================================================================
 # FILE: model.py
 # ============================================================================
 """
 Run OLS regression + optional lag test.
 Usage:
-    python model.py --rebuild      # rebuild data + run model
-    python model.py                # assume cached parquet files
+    python model.py --rebuild      # force every stage to re‑run
+    python model.py                # re‑run only stale stages (see pipeline.py)
+    python model.py --scan         # + Granger scan over the top‑N universe
+    python model.py --rolling      # + rolling / expanding betas
+    python model.py --resample     # + permutation / bootstrap p‑values
+    python model.py --freq W-FRI   # any cached view (D, W-SUN, W-FRI, M) – no refetch
+    python model.py --profile      # + per‑stage JSON trace (results/profile.json)
 """
-import argparse, logging, yaml, os
+import argparse, logging, os
+from typing import List, Optional
+
 import pandas as pd
-import statsmodels.api as sm
-from statsmodels.tsa.stattools import grangercausalitytests
 
-# ----------------------------------------------------------------------------
-with open("config.yml") as f:
-    CFG = yaml.safe_load(f)
+import profiling
+from profiling import profiled
+from settings import get_settings, use_settings, override, configure_logging
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+# statsmodels, data_prep and factor_library are imported only by the stages
+# that need them – a fully cached run never loads the network clients.
 
 
-def load_or_build():
-    from data_prep import build_master
-    from factor_library import compute_factors
+def _artifact(name: str) -> str:
+    return os.path.join(get_settings().cache_dir, name)
 
-    if os.path.exists(f"{CFG['cache_dir']}/factors.parquet"):
-        return pd.read_parquet(f"{CFG['cache_dir']}/factors.parquet")
-    else:
-        build_master()
-        master = pd.read_parquet(f"{CFG['cache_dir']}/master.parquet")
-        factors = compute_factors(master)
-        factors.to_parquet(f"{CFG['cache_dir']}/factors.parquet")
-        return factors
+
+def _result(name: str) -> str:
+    return os.path.join(get_settings().results_dir, name)
 
 
+def _build_master_stage():
+    from data_prep import build_master
+    build_master()
+
+
+def _factors_stage():
+    from data_prep import load_master
+    from factor_library import compute_factors
+    compute_factors(load_master()).to_parquet(_artifact("factors.parquet"))
+
+
+def _model_stage():
+    df = pd.read_parquet(_artifact("factors.parquet"))
+    model = run_regression(df)
+    pval = lead_lag_test(df)
+    with open(_result("model_summary.txt"), "w") as f:
+        f.write(model.summary().as_text())
+        f.write(f"\n\nGranger causality p‑value (ETH→Alt, lag={get_settings().lag_weeks}): {pval:.4f}\n")
+
+
+def make_pipeline():
+    from pipeline import Pipeline, Stage
+    cfg = get_settings()
+    return Pipeline([
+        Stage("build_master", _build_master_stage,
+              config_keys=["start_date", "end_date", "frequencies", "extra_coins",
+                           "macro_tickers"],
+              outputs=[_artifact("master_daily.parquet")],
+              modules=["data_prep", "history_store", "cache_backend", "coin_panel"]),
+        Stage("compute_factors", _factors_stage,                # reads a cached view
+              config_keys=["frequency", "top_n_marketcap", "min_liquidity_usd"],
+              outputs=[_artifact("factors.parquet")], deps=["build_master"],
+              modules=["factor_library", "coin_panel"]),
+        Stage("model", _model_stage,
+              config_keys=["target", "independent", "lag_weeks"],
+              outputs=[_result("coefficients.csv"), _result("model_summary.txt")],
+              deps=["compute_factors"], modules=["model"]),
+    ], cfg, cfg.cache_dir)
+
+
+def load_or_build(force: bool = False) -> pd.DataFrame:
+    """Bring every stale pipeline stage up to date and return the factors."""
+    cfg = get_settings()
+    os.makedirs(cfg.cache_dir, exist_ok=True)
+    os.makedirs(cfg.results_dir, exist_ok=True)
+    ran = make_pipeline().run(force=force)
+    from cache_manager import maybe_gc
+    maybe_gc()
+    if "model" not in ran:
+        with open(_result("model_summary.txt")) as f:
+            logging.info("Model stage cached:\n" + f.read())
+    from streaming import load_factors               # + bars appended by streaming.py
+    return load_factors()
+
+
+def fit_regression(df: pd.DataFrame, target: Optional[str] = None,
+                   independent: Optional[List[str]] = None):
+    """OLS of target on independent (+ const) – no logging, no files (sweeps)."""
+    import statsmodels.api as sm
+    cfg = get_settings()
+    y = df[target or cfg.target]
+    X = sm.add_constant(df[independent or cfg.independent])
+    return sm.OLS(y, X, missing="drop").fit()       # macro warm‑up rows are NaN
+
+
+@profiled()
 def run_regression(df: pd.DataFrame):
-    y = df[CFG["target"]]
-    X = df[CFG["independent"]]
-    X = sm.add_constant(X)
-    model = sm.OLS(y, X).fit()
+    cfg = get_settings()
+    model = fit_regression(df)
     logging.info("\n" + model.summary().as_text())
 
     # Save coeffs
-    coef_path = f"{CFG['results_dir']}/coefficients.csv"
-    os.makedirs(CFG["results_dir"], exist_ok=True)
+    coef_path = f"{cfg.results_dir}/coefficients.csv"
+    os.makedirs(cfg.results_dir, exist_ok=True)
     model.params.to_csv(coef_path, header=["coef"])
     logging.info(f"Coefficients saved to {coef_path}")
 
     return model
 
 
-def lead_lag_test(df: pd.DataFrame):
-    lag = CFG["lag_weeks"]
+@profiled()
+def lead_lag_test(df: pd.DataFrame, lag: Optional[int] = None):
+    from statsmodels.tsa.stattools import grangercausalitytests
+    lag = lag or get_settings().lag_weeks
     df_lag = df.copy()
     df_lag["eth_btc_ret_lag"] = df_lag["eth_btc_ret"].shift(lag)
     df_lag = df_lag.dropna()
@@ -339,20 +3277,356 @@ def lead_lag_test(df: pd.DataFrame):
     )
     pval = test[lag][0]["ssr_ftest"][1]
     logging.info(f"Granger causality p‑value (ETH→Alt, lag={lag}): {pval:.4f}")
+    return pval
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--scan", action="store_true",
+                        help="Granger‑scan every top‑N coin × lag (lead_lag_scan.py)")
+    parser.add_argument("--rolling", action="store_true",
+                        help="rolling / expanding OLS over rolling_windows (rolling_ols.py)")
+    parser.add_argument("--resample", action="store_true",
+                        help="permutation / block‑bootstrap Granger significance (resampling.py)")
+    parser.add_argument("--freq", help="master view to model (overrides config frequency)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="PATH",
+                        help="per‑stage JSON trace (default results/profile.json)")
+    parser.add_argument("--cprofile", metavar="PATH", help="also dump cProfile stats to PATH")
     args = parser.parse_args()
+    if args.freq:
+        use_settings(override(frequency=args.freq))
+    configure_logging()
+
+    if args.profile is not None:
+        profiling.enable()
+    prof = None
+    if args.cprofile:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+    try:
+        # stages re‑run only when their config slice, code or inputs changed
+        data = load_or_build(force=args.rebuild)
+
+        if args.scan:
+            from lead_lag_scan import lead_lag_scan
+            with profiling.stage("lead_lag_scan"):
+                lead_lag_scan(data)
+
+        if args.rolling:
+            from rolling_ols import run_rolling_regression
+            with profiling.stage("rolling_ols"):
+                run_rolling_regression(data)
+
+        if args.resample:
+            from resampling import resampled_lead_lag
+            with profiling.stage("resampling"):
+                resampled_lead_lag(data)
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(args.cprofile)
+            logging.info(f"cProfile stats saved to {args.cprofile}")
+        if args.profile is not None:
+            path = args.profile or _result("profile.json")
+            trace = profiling.write(path)
+            for name, agg in trace["by_name"].items():
+                logging.info(f"[profile] {name:<22} ×{agg['calls']:<4} {agg['wall_s']:8.3f}s "
+                             f"peak {agg['peak_mb']:7.1f} MB  {agg['counters']}")
+            logging.info(f"[profile] totals {trace['totals']} → {path}")
+
+# ============================================================================
+# FILE: benchmarks/synthetic.py
+# ============================================================================
+"""
+Seeded synthetic market for offline benchmarks.
+Generates daily BTC / ETH / TOTAL caps, top‑N `coins/markets` snapshots and
+business‑day macro proxy closes with realistic shapes – fat‑tailed log returns, ETH and
+alt betas to BTC, a log‑normal cap cross‑section, listings and delistings –
+and writes them where the toolkit's caches look, so every stage runs with
+zero requests.
+"""
+import datetime as dt
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator
+
+import numpy as np
+import pandas as pd
 
-    if args.rebuild:
-        if os.path.exists(f"{CFG['cache_dir']}/factors.parquet"):
-            os.remove(f"{CFG['cache_dir']}/factors.parquet")
 
-    data = load_or_build()
-    model = run_regression(data)
-    lead_lag_test(data)
+@dataclass(frozen=True)
+class MarketSpec:
+    start: str = "2019-01-01"
+    days: int = 2400
+    n_coins: int = 400            # alt universe (listed at some point)
+    snapshot_size: int = 250      # coins per daily snapshot (one CoinGecko page)
+    seed: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+PRESETS = {
+    "weekly": MarketSpec(days=52 * 7 * 2, n_coins=400, snapshot_size=250),
+    "daily": MarketSpec(days=2400, n_coins=1000, snapshot_size=1000),
+}
+
+
+def _t_returns(rng: np.random.Generator, shape, vol: float, df: float = 4.0) -> np.ndarray:
+    """Student‑t log returns scaled to daily volatility *vol*."""
+    return rng.standard_t(df, size=shape) * vol * np.sqrt((df - 2) / df)
+
+
+class SyntheticMarket:
+    def __init__(self, spec: MarketSpec):
+        self.spec = spec
+        rng = np.random.default_rng(spec.seed)
+        T, N = spec.days, spec.n_coins
+        self.dates = pd.date_range(spec.start, periods=T, freq="D")
+
+        mkt = _t_returns(rng, T, 0.035)                              # BTC log returns
+        btc = 1.5e11 * np.exp(np.cumsum(mkt))
+        eth = 3.0e10 * np.exp(np.cumsum(1.2 * mkt + _t_returns(rng, T, 0.025)))
+        beta = rng.uniform(0.8, 1.6, N)
+        log_caps = (rng.normal(18.5, 1.8, N)
+                    + np.cumsum(beta * mkt[:, None] + _t_returns(rng, (T, N), 0.05), axis=0))
+        listed = rng.integers(-T // 2, T // 2, N)          # < 0 → listed before start
+        delisted = np.where(rng.random(N) < 0.15, rng.integers(T // 4, T, N), T)
+        alive = ((np.arange(T)[:, None] >= listed) & (np.arange(T)[:, None] < delisted))
+        self.caps = np.where(alive, np.exp(log_caps), np.nan)        # (T × N) alt caps
+        self.ids = [f"synth-{i:04d}" for i in range(N)]
+        self.turnover = np.exp(rng.normal(-3.0, 1.0, N))             # volume / cap
+        self.supply = np.exp(rng.normal(20.0, 2.0, N))
+
+        others = np.nansum(self.caps, axis=1) * 1.25                 # long tail beyond N
+        self.series = {"bitcoin": pd.Series(btc, self.dates),
+                       "ethereum": pd.Series(eth, self.dates),
+                       "GLOBAL": pd.Series(btc + eth + others, self.dates)}
+        self.bdays = self.dates[self.dates.dayofweek < 5]
+
+    @property
+    def end(self) -> dt.date:
+        return self.dates[-1].date()
+
+    def snapshot(self, t: int) -> pd.DataFrame:
+        """`coins/markets`‑shaped top‑snapshot_size frame for day *t*."""
+        row = self.caps[t]
+        live = np.flatnonzero(~np.isnan(row))
+        top = live[np.argsort(-row[live])[:self.spec.snapshot_size]]
+        cap = row[top]
+        return pd.DataFrame({
+            "id": [self.ids[i] for i in top],
+            "symbol": [self.ids[i][-4:] for i in top],
+            "name": [self.ids[i] for i in top],
+            "market_cap": cap,
+            "total_volume": cap * self.turnover[top],
+            "current_price": cap / self.supply[top],
+            "fully_diluted_valuation": cap * 1.2,
+            "market_cap_rank": np.arange(1, len(top) + 1, dtype=float),
+        })
+
+    def iter_snapshots(self, chunk: int = 31) -> Iterator[Dict[pd.Timestamp, pd.DataFrame]]:
+        """
+        Daily snapshots, continued past the final close to the last week /
+        month‑end label – resampled views stamp the last period there, and the
+        quality mask asks for that date.
+        """
+        days = pd.date_range(self.dates[0],
+                             self.dates[-1] + pd.Timedelta(days=6) + pd.offsets.MonthEnd(0))
+        last = len(self.dates) - 1
+        for i in range(0, len(days), chunk):
+            yield {days[t]: self.snapshot(min(t, last))
+                   for t in range(i, min(i + chunk, len(days)))}
+
+    def macro_level(self, i: int) -> pd.Series:
+        """Business‑day close of the *i*‑th macro proxy (independent of the crypto draws)."""
+        rng = np.random.default_rng([self.spec.seed, i])
+        return pd.Series(100 * np.exp(np.cumsum(_t_returns(rng, len(self.bdays), 0.011))),
+                         self.bdays)
+
+
+def seed_cache(market: SyntheticMarket, cache_dir: str) -> None:
+    """Write series and macro levels (with their spans) and every snapshot into *cache_dir*."""
+    from cache_backend import open_cache
+    from history_store import HistoryStore
+    from data_prep import macro_key
+    from settings import get_settings
+    cache = open_cache(cache_dir)
+    store = HistoryStore(cache)
+    span = (market.dates[0].date(), market.end)
+    for name, s in market.series.items():
+        store.save(name, s, span)
+    for i, ticker in enumerate(get_settings().macro_tickers.values()):
+        store.save(macro_key(ticker), market.macro_level(i), span)
+    for batch in market.iter_snapshots():
+        cache.write_snapshots(batch)
+
+
+def _no_network(*_, **__):
+    raise RuntimeError("benchmark cache miss – stage tried to reach the network")
+
+
+@contextmanager
+def offline(market: SyntheticMarket):
+    """Fail on any CoinGecko or Yahoo call – every stage must run from the seeded cache."""
+    import data_prep, factor_library
+    saved = (data_prep.coingecko_client, factor_library.coingecko_client,
+             data_prep._pull_macro)
+    data_prep.coingecko_client = factor_library.coingecko_client = _no_network
+    data_prep._pull_macro = _no_network
+    try:
+        yield
+    finally:
+        (data_prep.coingecko_client, factor_library.coingecko_client,
+         data_prep._pull_macro) = saved
+
+# ============================================================================
+# FILE: benchmarks/run_benchmarks.py
+# ============================================================================
+"""
+Offline benchmark suite: seed a scratch cache with a synthetic market, run
+each toolkit stage under wall‑clock timing and tracemalloc, write JSON.
+Usage:
+    python benchmarks/run_benchmarks.py                        # weekly preset
+    python benchmarks/run_benchmarks.py --size daily --repeat 3
+    python benchmarks/run_benchmarks.py --days 700 --coins 300 --out results/bench.json
+"""
+import os, sys, json, time, shutil, logging, argparse, platform, tempfile, tracemalloc
+from dataclasses import replace
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from settings import get_settings, use_settings, override, configure_logging
+from synthetic import PRESETS, MarketSpec, SyntheticMarket, seed_cache, offline
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict:
+    """Best / median wall time over *repeat* runs, then one traced run for peak memory."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_s": times, "best_s": min(times), "median_s": float(np.median(times)),
+            "peak_alloc_mb": peak / 2 ** 20}
+
+
+def stages(frequency: str) -> List:
+    """(name, fn) in pipeline order; later stages reuse earlier outputs."""
+    from data_prep import build_master, load_master
+    from factor_library import make_quality_mask, compute_factors, snapshot_panel
+    from index_builder import build_index
+    from xcorr import ccf_table, rolling_xcorr, universe_pairs, pair_arrays
+    from model import run_regression, lead_lag_test
+    from lead_lag_scan import lead_lag_scan
+    from rolling_ols import run_rolling_regression
+
+    state = {}
+
+    def master():
+        build_master()
+        state["master"] = load_master(frequency)
+
+    def quality():
+        make_quality_mask(state["master"], snapshot_panel(state["master"].index))
+
+    def factors():
+        state["factors"] = compute_factors(state["master"])
+
+    def cross_correlations():
+        cfg = get_settings()
+        data, pairs = universe_pairs(state["factors"])
+        ccf_table(data, pairs)
+        rolling_xcorr(*pair_arrays(data, pairs), range(cfg.scan_max_lag + 1), cfg.rolling_windows)
+
+    return [
+        ("build_master", master),
+        ("make_quality_mask", quality),
+        ("compute_factors", factors),
+        ("index_builder", lambda: build_index(state["master"].index)),
+        ("run_regression", lambda: run_regression(state["factors"])),
+        ("lead_lag_test", lambda: lead_lag_test(state["factors"])),
+        ("lead_lag_scan", lambda: lead_lag_scan(state["factors"])),
+        ("rolling_ols", lambda: run_rolling_regression(state["factors"])),
+        ("xcorr", cross_correlations),
+    ]
+
+
+def run(spec: MarketSpec, frequency: str, repeat: int, workdir: str) -> Dict:
+    t0 = time.perf_counter()
+    market = SyntheticMarket(spec)
+    cache_dir = os.path.join(workdir, "cache")
+    seed_cache(market, cache_dir)
+    seed_s = time.perf_counter() - t0
+
+    use_settings(override(
+        start_date=str(market.dates[0].date()), end_date=str(market.end),
+        frequency=frequency, cache_dir=cache_dir,
+        results_dir=os.path.join(workdir, "results"), extra_coins={}))
+
+    results = {}
+    with offline(market):
+        for name, fn in stages(frequency):
+            logging.info(f"[bench] {name} …")
+            results[name] = measure(fn, repeat)
+            logging.info(f"[bench] {name}: best {results[name]['best_s']:.3f}s, "
+                         f"peak {results[name]['peak_alloc_mb']:.1f} MB")
+    return {
+        "spec": spec.to_dict(), "frequency": frequency, "repeat": repeat,
+        "seed_cache_s": seed_s,
+        "env": {"python": platform.python_version(), "numpy": np.__version__,
+                "pandas": pd.__version__, "machine": platform.machine(),
+                "cpus": os.cpu_count()},
+        "timestamp": pd.Timestamp.now("UTC").isoformat(),
+        "stages": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(PRESETS), default="weekly")
+    parser.add_argument("--days", type=int, help="override preset length")
+    parser.add_argument("--coins", type=int, help="override preset universe size")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--freq", help="master view to run on (default: W for weekly, D for daily)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="JSON path (default: results/benchmarks/<size>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch cache")
+    args = parser.parse_args()
+    configure_logging()
+
+    spec = PRESETS[args.size]
+    changes = {k: v for k, v in {"days": args.days, "n_coins": args.coins,
+                                 "seed": args.seed}.items() if v is not None}
+    if "n_coins" in changes:
+        changes["snapshot_size"] = min(spec.snapshot_size, changes["n_coins"])
+    spec = replace(spec, **changes)
+    freq = args.freq or ("D" if args.size == "daily" else "W")
+    out = args.out or os.path.join(get_settings().results_dir, "benchmarks", f"{args.size}.json")
+
+    workdir = tempfile.mkdtemp(prefix="leadlag-bench-")
+    try:
+        report = run(spec, freq, args.repeat, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results → {out}")
+    for name, r in report["stages"].items():
+        print(f"  {name:<18} best {r['best_s']:8.3f}s   peak {r['peak_alloc_mb']:8.1f} MB")
 
 # ============================================================================
 # FILE: notebooks/lead_lag_tests.ipynb (Python code for Jupyter)
@@ -410,6 +3684,22 @@ plt.axhline(y=0, color='r', linestyle='--', alpha=0.5)
 plt.title("26-Week Rolling Correlation: ETH/BTC vs OTHERS/BTC")
 plt.ylabel("Correlation")
 plt.show()
+
+# Cross-correlation across lags: is the ETH/BTC lead really one week?
+from xcorr import ccf_table, xcorr
+pairs = [("eth_btc_ret", "others_btc_ret")]
+ccf = ccf_table(df, pairs)
+plt.figure(figsize=(12, 4))
+plt.bar(ccf["lag"], ccf["corr"])
+plt.axhline(y=0, color='k', alpha=0.3)
+plt.title("Cross-Correlation by Lag (lag > 0: ETH/BTC leads)")
+plt.xlabel("Lag (periods)")
+plt.show()
+
+rolling_ccf = xcorr(df, pairs, lags=range(5), windows=[26])
+rolling_ccf.pivot(index="date", columns="lag", values="corr").plot(
+    figsize=(12, 5), title="26-Week Rolling Correlation by Lag")
+plt.show()
 """
 
 # ============================================================================
@@ -425,10 +3715,28 @@ SETUP INSTRUCTIONS:
 2. Save each file section to its respective filename:
    - config.yml
    - requirements.txt  
+   - settings.py
+   - profiling.py
+   - fetch_engine.py
+   - cache_backend.py
+   - history_store.py
+   - coin_panel.py
+   - cache_manager.py
    - data_prep.py
    - factor_library.py
+   - index_builder.py
+   - pipeline.py
+   - lead_lag_scan.py
+   - rolling_ols.py
+   - xcorr.py
+   - shared_frame.py
+   - resampling.py
+   - import_budget.py
+   - streaming.py
+   - sweep.py
    - model.py
    - notebooks/lead_lag_tests.ipynb (create notebooks folder first)
+   - benchmarks/synthetic.py, benchmarks/run_benchmarks.py (create benchmarks folder)
 
 3. Create virtual environment:
    python -m venv venv
@@ -450,4 +3758,13 @@ This will:
 
 Note: First run will be slow as it fetches and caches all historical data.
 Subsequent runs will use cached data unless --rebuild flag is used.
+The cache is kept under cache_max_bytes (least-recently-used entries are
+evicted after each run); inspect or trim it by hand with
+   python cache_manager.py stats
+   python cache_manager.py gc --budget 2GB
+and fold old {coin}_{start}_{end}.pkl caches into the new layout with
+   python cache_manager.py compact
+
+6. Benchmark offline (synthetic market, no network):
+   python benchmarks/run_benchmarks.py --size daily
 """
\ No newline at end of file
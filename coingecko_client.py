@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Shared CoinGecko Pro API client
+Pooled keep-alive session with rate-limited retry/backoff, a short-TTL on-disk response
+cache with ETag revalidation, a record/replay transport for offline runs and
+a paginated, rate-limited concurrent fetcher for whole /coins/markets universes
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PRO_BASE_URL = "https://pro-api.coingecko.com/api/v3"
+
+# Transport modes: live = network + cache, record = live and save every
+# response as a cassette, replay = cassettes only (no network at all)
+MODES = ("live", "record", "replay")
+MAX_PER_PAGE = 250  # /coins/markets page size ceiling, also used as ids per request
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """Replay mode was asked for a request that was never recorded"""
+
+
+class MissingAPIKey(ValueError):
+    """Live or record mode without api_key or COINGECKO_PRO_API_KEY"""
+
+
+def request_key(endpoint: str, params: Optional[Dict] = None) -> str:
+    """Stable key for endpoint + params (the API key is never part of it)"""
+    canonical = json.dumps(
+        {"endpoint": endpoint.lstrip("/"),
+         "params": {k: str(v) for k, v in sorted((params or {}).items())}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class Universe(NamedTuple):
+    """Merged /coins/markets rows plus whatever was asked for but not returned"""
+    rows: List[Dict]
+    missing: List[str]      # requested ids the API did not return
+    pages: int              # requests made (cached or not)
+
+
+class RateLimiter:
+    """Spaces network calls evenly so all threads together stay under calls_per_minute"""
+
+    def __init__(self, calls_per_minute: Optional[float]):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ResponseStore:
+    """One JSON file per request key: body, ETag and fetch time"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, entry: Dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._path(key))
+
+
+class CoinGeckoClient:
+    def __init__(self, api_key: Optional[str] = None, base_url: str = PRO_BASE_URL,
+                 ttl: Optional[float] = None, timeout: float = 15.0,
+                 max_retries: int = 4, backoff: float = 0.5, pool_size: int = 10,
+                 mode: Optional[str] = None, cache_dir: Optional[str] = None,
+                 cassette_dir: Optional[str] = None, calls_per_minute: Optional[float] = None):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = float(ttl if ttl is not None else os.environ.get("COINGECKO_CACHE_TTL", 120))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.mode = mode or os.environ.get("COINGECKO_TRANSPORT", "live")
+        if self.mode not in MODES:
+            raise ValueError(f"unknown transport mode {self.mode!r}; expected one of {MODES}")
+
+        self.cache = ResponseStore(cache_dir or os.environ.get("COINGECKO_CACHE_DIR", ".cache/coingecko"))
+        self.cassettes = ResponseStore(cassette_dir or os.environ.get("COINGECKO_CASSETTES", "cassettes/coingecko"))
+        self.stats = {"network": 0, "cache_hits": 0, "not_modified": 0, "replayed": 0}
+        self._stats_lock = threading.Lock()
+        self.workers = pool_size
+        self.limiter = RateLimiter(float(calls_per_minute if calls_per_minute is not None
+                                         else os.environ.get("COINGECKO_CALLS_PER_MINUTE", 500)))
+
+        api_key = api_key or os.environ.get("COINGECKO_PRO_API_KEY")
+        if not api_key and self.mode != "replay":
+            raise MissingAPIKey("no CoinGecko Pro API key: pass api_key or set COINGECKO_PRO_API_KEY "
+                             "(only COINGECKO_TRANSPORT=replay runs without one)")
+
+        self.session = requests.Session()
+        self.session.headers.update({"accept": "application/json"})
+        if api_key:
+            self.session.headers["x-cg-pro-api-key"] = api_key
+        # retries live in get() rather than the adapter so every attempt goes through the limiter
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, endpoint: str, params: Optional[Dict] = None):
+        """GET an API path (e.g. "/coins/markets") and return the decoded JSON"""
+        key = request_key(endpoint, params)
+
+        if self.mode == "replay":
+            entry = self.cassettes.load(key)
+            if entry is None:
+                raise CassetteMiss(f"no recorded response for {endpoint} {params}")
+            self._count("replayed")
+            return entry["body"]
+
+        cached = self.cache.load(key)
+        if cached is not None and time.time() - cached["fetched_at"] < self.ttl:
+            self._count("cache_hits")
+            return cached["body"]
+
+        headers = {}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+
+        response = self._send(f"{self.base_url}/{endpoint.lstrip('/')}", params, headers)
+        if response.status_code == 304 and cached is not None:
+            self._count("not_modified")
+            entry = dict(cached, fetched_at=time.time())
+        else:
+            response.raise_for_status()
+            entry = {
+                "endpoint": endpoint,
+                "params": params or {},
+                "etag": response.headers.get("ETag"),
+                "fetched_at": time.time(),
+                "body": response.json(),
+            }
+        self.cache.save(key, entry)
+        if self.mode == "record":
+            self.cassettes.save(key, entry)
+        return entry["body"]
+
+    def _send(self, url: str, params: Optional[Dict], headers: Dict) -> requests.Response:
+        """GET with retry on connection errors and RETRY_STATUSES, each attempt rate-limited"""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            self._count("network")
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            time.sleep(self._retry_delay(response, attempt))
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Retry-After (seconds or HTTP date) when the server sends one, else exponential backoff"""
+        after = response.headers.get("Retry-After")
+        if after:
+            try:
+                return max(0.0, float(after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return self.backoff * 2 ** attempt
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def coins_markets(self, ids, vs_currency: str = "usd", **params):
+        """/coins/markets for a list of CoinGecko ids (one request, see markets_universe)"""
+        query = {"vs_currency": vs_currency, "ids": ",".join(ids)}
+        query.update(params)
+        return self.get("/coins/markets", query)
+
+    def _pages(self, queries: List[Dict], workers: int) -> Iterable[List[Dict]]:
+        """Run /coins/markets queries concurrently, yielding each page as it lands"""
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries)))) as pool:
+            futures = [pool.submit(self.get, "/coins/markets", q) for q in queries]
+            for future in as_completed(futures):
+                yield future.result() or []
+
+    def _pages_until_short(self, base: Dict, first: int, workers: int,
+                           merge: Callable[[List[Dict]], None]) -> int:
+        """
+        Pages first, first + 1, ... with no new page requested once one comes
+        back short. The window opens one page per full page received (up to
+        `workers`), so a short listing costs few requests past its end.
+        Returns the number of requests
+        """
+        next_page, done, full = first, False, 1
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            pending = set()
+            while True:
+                while not done and len(pending) < min(workers, full):
+                    pending.add(pool.submit(self.get, "/coins/markets", dict(base, page=next_page)))
+                    next_page += 1
+                if not pending:
+                    return next_page - first
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rows = future.result() or []
+                    merge(rows)
+                    full += len(rows) == MAX_PER_PAGE
+                    done |= len(rows) < MAX_PER_PAGE
+
+    def markets_universe(self, ids: Optional[Iterable[str]] = None,
+                         category: Optional[str] = None, top_n: Optional[int] = None,
+                         vs_currency: str = "usd", workers: Optional[int] = None,
+                         **params) -> Universe:
+        """
+        /coins/markets for any number of ids (chunks of MAX_PER_PAGE ids) or for
+        the top-N of a category / the whole market (pages of MAX_PER_PAGE),
+        fetched concurrently under the rate limit and merged into one table
+        de-duplicated by id. Without ids or top_n, pages are pulled until a
+        short page ends the listing
+        """
+        workers = workers or self.workers
+        base = {"vs_currency": vs_currency, "per_page": MAX_PER_PAGE,
+                "order": "market_cap_desc", **params}
+        if category:
+            base["category"] = category
+        merged: Dict[str, Dict] = {}
+        pages = received = 0
+
+        def merge(rows: List[Dict]) -> None:
+            nonlocal received
+            received += len(rows)
+            for row in rows:
+                merged.setdefault(row["id"], row)
+
+        if ids is not None:
+            wanted = list(dict.fromkeys(ids))
+            queries = [dict(base, ids=",".join(wanted[i:i + MAX_PER_PAGE]), page=1)
+                       for i in range(0, len(wanted), MAX_PER_PAGE)]
+            for rows in self._pages(queries, workers):
+                merge(rows)
+            pages = len(queries)
+            return Universe([merged[i] for i in wanted if i in merged],
+                            [i for i in wanted if i not in merged], pages)
+
+        if top_n is not None:
+            queries = [dict(base, page=p) for p in range(1, math.ceil(top_n / MAX_PER_PAGE) + 1)]
+            for rows in self._pages(queries, workers):
+                merge(rows)
+            pages = len(queries)
+        else:
+            # unknown length: page 1 alone (most categories fit on it), then a
+            # sliding window of pages that stops growing at the first short one
+            first = self.get("/coins/markets", dict(base, page=1)) or []
+            merge(first)
+            pages = 1
+            if len(first) == MAX_PER_PAGE:
+                pages += self._pages_until_short(base, 2, workers, merge)
+
+        if received > len(merged):
+            logger.warning(f"{received - len(merged)} coins appeared on two pages (ranks moved "
+                           f"while paging); the listing may be short by as many rows")
+        rows = sorted(merged.values(), key=lambda r: r.get("market_cap_rank") or math.inf)
+        return Universe(rows[:top_n] if top_n is not None else rows, [], pages)
+
+
+_client: Optional[CoinGeckoClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> CoinGeckoClient:
+    """Process-wide client, so every caller shares one connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CoinGeckoClient()
+        return _client
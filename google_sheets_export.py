@@ -8,15 +8,10 @@ import csv
 import requests
 from typing import Dict, List
 
+from coingecko_client import MissingAPIKey, get_client
+
 class GoogleSheetsExporter:
     def __init__(self):
-        self.api_key = "CG-MVg68aVqeVyu8fzagC9E1hPj"
-        self.base_url = "https://pro-api.coingecko.com/api/v3"
-        self.headers = {
-            "accept": "application/json",
-            "x-cg-pro-api-key": self.api_key
-        }
-        
         # Token mapping with correct CoinGecko IDs
         self.tokens = {
             'LDO': 'lido-dao',
@@ -69,28 +64,26 @@ class GoogleSheetsExporter:
             'CPOOL': 'Clearpool is a decentralized marketplace for uncollateralized institutional loans.'
         }
 
+    @property
+    def client(self):
+        """Shared pooled session + response cache, opened on first use"""
+        return get_client()
+
     def fetch_token_data(self) -> List[Dict]:
         """Fetch token data from CoinGecko Pro API"""
-        token_ids = ','.join(self.tokens.values())
-        url = f"{self.base_url}/coins/markets"
-        params = {
-            'vs_currency': 'usd',
-            'ids': token_ids,
-            'order': 'market_cap_desc',
-            'per_page': 100,
-            'page': 1,
-            'sparkline': False,
-            'price_change_percentage': '24h,7d',
-            'precision': 'full'
-        }
-        
         try:
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            universe = self.client.markets_universe(
+                ids=self.tokens.values(),
+                sparkline=False,
+                price_change_percentage='24h,7d',
+                precision='full'
+            )
+        except (requests.exceptions.RequestException, MissingAPIKey) as e:
             print(f"Error fetching data: {e}")
             return []
+        if universe.missing:
+            print(f"Warning: no market data for {', '.join(universe.missing)}")
+        return universe.rows
 
     def format_for_sheets(self, data: List[Dict]) -> List[List]:
         """Format data for Google Sheets"""
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Historical S-Tier backtest
+Replays S-tier scoring over stored /coins/markets snapshots (the toolkit's
+cache/snapshots Parquet dataset) and measures forward returns by tier
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from s_tier_evaluator import TIER_BANDS, STierEvaluator
+
+SNAPSHOT_DIR = 'cache/snapshots'
+SCORE_FIELDS = ['market_cap', 'total_volume', 'fully_diluted_valuation']
+FIELDS = SCORE_FIELDS + ['current_price']
+HORIZONS = (7, 30, 90)  # forward return windows in days
+TIERS = TIER_BANDS[1][::-1]  # best first
+DATES_PER_TASK = 16
+
+# Per-process state set once by _init_worker (rebalance rows are shipped to each worker once)
+_WORKER: Dict = {}
+
+
+def load_panel(snapshot_dir: str = SNAPSHOT_DIR, start: Optional[str] = None,
+               end: Optional[str] = None) -> Dict:
+    """Snapshot dataset -> dense (date x coin) float arrays, one per field"""
+    filters = []
+    if start:
+        filters.append(('date', '>=', pd.Timestamp(start)))
+    if end:
+        filters.append(('date', '<=', pd.Timestamp(end)))
+    table = pq.read_table(snapshot_dir, columns=['date', 'id'] + FIELDS,
+                          partitioning='hive', filters=filters or None)
+    if table.num_rows == 0:
+        raise ValueError(f'no snapshots found in {snapshot_dir}')
+    frame = table.to_pandas()
+    date_codes, dates = pd.factorize(frame['date'], sort=True)
+    coin_codes, coins = pd.factorize(frame['id'].astype(str), sort=True)
+    panel = {'dates': pd.DatetimeIndex(dates), 'coins': np.asarray(coins, dtype=object)}
+    for field in FIELDS:
+        values = np.full((len(dates), len(coins)), np.nan)
+        values[date_codes, coin_codes] = frame[field].to_numpy(dtype=float)
+        panel[field] = values
+    return panel
+
+
+def rebalance_dates(dates: pd.DatetimeIndex, freq: str = 'W') -> np.ndarray:
+    """Row index of the first snapshot in each freq period (e.g. weekly)"""
+    periods = dates.to_period(freq)
+    return np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+
+
+def load_prices(path: str, coins: np.ndarray) -> Dict:
+    """
+    Membership-independent (date x coin) price panel from a wide Parquet/CSV
+    file (a date column or index, one column per CoinGecko id), aligned to coins
+    """
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    if 'date' in frame.columns:
+        frame = frame.set_index('date')
+    frame.index = pd.to_datetime(frame.index)
+    frame = frame.sort_index().reindex(columns=list(coins))
+    return {'dates': pd.DatetimeIndex(frame.index), 'current_price': frame.to_numpy(dtype=float)}
+
+
+def _first_on_or_after(dates: pd.DatetimeIndex, targets: pd.DatetimeIndex, tolerance: int):
+    """Row of the first date >= each target and whether it lands within tolerance days"""
+    idx = dates.searchsorted(targets)
+    ok = idx < len(dates)
+    idx = np.minimum(idx, len(dates) - 1)
+    ok &= (dates[idx] - targets) <= pd.Timedelta(days=tolerance)
+    return idx, ok
+
+
+def forward_returns(prices: Dict, starts: pd.DatetimeIndex, horizon: int, tolerance: int):
+    """
+    (rebalances x coins) return from each rebalance date to the first price
+    row at least `horizon` days later, plus a per-rebalance flag for whether
+    that horizon is covered by the price history at all. Inside covered
+    rebalances a NaN means the coin has no price on one side
+    """
+    dates = prices['dates']
+    entry, entry_ok = _first_on_or_after(dates, starts, tolerance)
+    exit_, exit_ok = _first_on_or_after(dates, starts + pd.Timedelta(days=horizon), tolerance)
+    covered = entry_ok & exit_ok
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = prices['current_price'][exit_] / prices['current_price'][entry] - 1
+    returns[~covered] = np.nan
+    returns[~np.isfinite(returns)] = np.nan
+    return returns, covered
+
+
+def _init_worker(rebalances: Dict, top_n: Optional[int]) -> None:
+    _WORKER['rebalances'] = rebalances
+    _WORKER['top_n'] = top_n
+    _WORKER['evaluator'] = STierEvaluator()
+
+
+def _score_rows(rows: List[int]):
+    """Score every coin in each rebalance row; tier code -1 = not in the universe that day"""
+    data, top_n, evaluator = _WORKER['rebalances'], _WORKER['top_n'], _WORKER['evaluator']
+    codes = {tier: i for i, tier in enumerate(TIERS)}
+    tier_codes = np.full((len(rows), len(data['coins'])), -1, dtype=np.int8)
+    for k, row in enumerate(rows):
+        mcap = data['market_cap'][row]
+        present = np.flatnonzero(mcap > 0)
+        if top_n is not None:
+            present = present[np.argsort(-mcap[present], kind='stable')[:top_n]]
+        if not len(present):
+            continue
+        table = {'id': data['coins'][present]}
+        for field in SCORE_FIELDS:
+            table[field] = np.nan_to_num(data[field][row, present])
+        batch = evaluator.score_batch(table)
+        tier_codes[k, present] = [codes[tier] for tier in batch['tier']]
+    return tier_codes
+
+
+def score_history(panel: Dict, rows: np.ndarray, top_n: Optional[int] = None,
+                  workers: Optional[int] = None) -> np.ndarray:
+    """(rebalances x coins) tier codes, rebalance dates scored across a process pool"""
+    # workers only get the rebalance rows of the scored fields, not the whole history
+    rebalances = {field: panel[field][rows] for field in SCORE_FIELDS}
+    rebalances['coins'] = panel['coins']
+    positions = np.arange(len(rows))
+    chunks = [positions[i:i + DATES_PER_TASK].tolist()
+              for i in range(0, len(rows), DATES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(rebalances, top_n)) as pool:
+        return np.vstack(list(pool.map(_score_rows, chunks)))
+
+
+def tier_performance(tier_codes: np.ndarray, returns: Dict[int, tuple]) -> pd.DataFrame:
+    """
+    Per tier and horizon: observations, mean / median forward return, hit
+    rate and mean excess over the same-date equal-weighted universe. missing
+    counts in-universe coins with no forward price on a covered horizon
+    (delisted or dropped from the price source) - the stats are conditioned on
+    their absence, so a high share there means survivorship bias
+    """
+    in_universe = tier_codes >= 0
+    table = {}
+    for horizon, (ret, covered) in returns.items():
+        ret = np.where(in_universe, ret, np.nan)
+        lost = in_universe & covered[:, None] & np.isnan(ret)
+        counts = (~np.isnan(ret)).sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            excess = ret - np.nansum(ret, axis=1, keepdims=True) / counts
+        for code, tier in enumerate(TIERS):
+            mask = (tier_codes == code) & ~np.isnan(ret)
+            values = ret[mask]
+            row = table.setdefault(tier, {})
+            row[f'n_{horizon}d'] = int(mask.sum())
+            row[f'missing_{horizon}d'] = int((lost & (tier_codes == code)).sum())
+            row[f'mean_{horizon}d'] = values.mean() if len(values) else np.nan
+            row[f'median_{horizon}d'] = np.median(values) if len(values) else np.nan
+            row[f'hit_{horizon}d'] = (values > 0).mean() if len(values) else np.nan
+            row[f'excess_{horizon}d'] = excess[mask].mean() if len(values) else np.nan
+    frame = pd.DataFrame.from_dict(table, orient='index')
+    frame.index.name = 'tier'
+    return frame[frame.filter(regex='^(n|missing)_').sum(axis=1) > 0]
+
+
+def run_backtest(snapshot_dir: str = SNAPSHOT_DIR, start: Optional[str] = None,
+                 end: Optional[str] = None, freq: str = 'W', top_n: Optional[int] = None,
+                 tolerance: int = 7, workers: Optional[int] = None,
+                 prices_path: Optional[str] = None):
+    """
+    Load snapshots, re-score each rebalance date and tabulate forward returns
+    by tier. Forward prices come from prices_path when given, otherwise from
+    the snapshots themselves (only coins still in the stored top-N have one)
+    """
+    panel = load_panel(snapshot_dir, start, end)
+    rows = rebalance_dates(panel['dates'], freq)
+    tier_codes = score_history(panel, rows, top_n, workers)
+    prices = load_prices(prices_path, panel['coins']) if prices_path else panel
+    starts = panel['dates'][rows]
+    returns = {h: forward_returns(prices, starts, h, tolerance) for h in HORIZONS}
+    return tier_performance(tier_codes, returns), starts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--snapshots', default=SNAPSHOT_DIR, help='snapshot dataset directory')
+    parser.add_argument('--start', help='first snapshot date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='last snapshot date (YYYY-MM-DD)')
+    parser.add_argument('--freq', default='W', help='rebalance period (pandas alias, default W)')
+    parser.add_argument('--top', type=int, help='only score the top N by market cap each date')
+    parser.add_argument('--prices', help='wide date x coin-id price file (Parquet/CSV) for forward '
+                                          'returns, independent of top-N membership')
+    parser.add_argument('--tolerance', type=int, default=7,
+                        help='max days a forward price may land after the horizon')
+    parser.add_argument('--workers', type=int, help='scoring processes (default: all cores)')
+    parser.add_argument('--out', default='s_tier_backtest', help='output path without extension')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.snapshots):
+        print(f"Error: snapshot directory {args.snapshots} not found "
+              f"(build it with the altcoin lead-lag toolkit first)")
+        return
+
+    table, dates = run_backtest(args.snapshots, args.start, args.end, args.freq,
+                                args.top, args.tolerance, args.workers, args.prices)
+    print(f"S-TIER BACKTEST - {len(dates)} rebalances, "
+          f"{dates[0]:%Y-%m-%d} to {dates[-1]:%Y-%m-%d}")
+    print(table.round(4).to_string())
+    for horizon in HORIZONS:
+        missing, n = table[f'missing_{horizon}d'].sum(), table[f'n_{horizon}d'].sum()
+        if missing:
+            print(f"Warning: {missing}/{missing + n} scored coins had no {horizon}d forward price "
+                  f"(returns are conditioned on survival; see missing_* columns)")
+
+    table.to_csv(f'{args.out}.csv')
+    with open(f'{args.out}.json', 'w', encoding='utf-8') as f:
+        json.dump({'rebalances': [f'{d:%Y-%m-%d}' for d in dates],
+                   'tiers': json.loads(table.to_json(orient='index'))}, f, indent=2)
+    print(f"\nTier performance saved to: {args.out}.csv, {args.out}.json")
+
+if __name__ == "__main__":
+    main()
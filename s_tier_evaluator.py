@@ -4,20 +4,68 @@ S-Tier Rating System for Ethereum Beta Plays
 Comprehensive evaluation with logos and detailed scoring methodology
 """
 
-import requests
+import argparse
 import json
-from typing import Dict, List, Optional
+import os
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Union
 from datetime import datetime
 
+import numpy as np
+
+from coingecko_client import get_client
+
+# Threshold bands shared by the per-token and batch scorers: (edges, scores).
+# "at least" bands: score = scores[number of edges <= value]
+MCAP_BANDS = ([50e6, 100e6, 500e6, 1e9, 5e9], [10, 30, 50, 70, 85, 100])
+VOLUME_RATIO_BANDS = ([0.01, 0.05, 0.15, 0.3], [20, 40, 60, 80, 100])
+MATURITY_BANDS = ([1, 2, 4, 6], [30, 50, 70, 85, 100])  # years active
+# "at most" band: score = scores[number of edges < value] (lower premium is better)
+FDV_PREMIUM_BANDS = ([1.2, 2.0, 3.0, 5.0], [100, 75, 50, 25, 0])
+TIER_BANDS = ([40, 45, 50, 55, 60, 65, 70, 75, 80, 85],
+              ['D', 'C', 'B-', 'B', 'B+', 'A-', 'A', 'A+', 'S-', 'S', 'S+'])
+REFERENCE_YEAR = 2024
+DEFAULT_SCORE = 50  # qualitative score for tokens without a hand-written rating
+CATEGORY_NAMES = {'market_metrics': 'market', 'fundamentals': 'fundamentals',
+                  'adoption_growth': 'adoption', 'risk_assessment': 'risk'}
+# Categories rated with one hand-written score rather than per factor
+CATEGORY_RATINGS = {'adoption_growth': 'adoption', 'risk_assessment': 'risk'}
+SENSITIVITY_CHUNK = 4_000_000  # scores (draws x distinct tokens) held per sensitivity chunk
+# Inputs watch mode compares against epsilon; tier order for upgrade / downgrade events
+WATCH_FIELDS = ('market_cap', 'total_volume', 'fully_diluted_valuation')
+TIER_RANK = {tier: rank for rank, tier in enumerate(['F'] + TIER_BANDS[1])}
+MARKET_PARAMS = {'sparkline': False, 'price_change_percentage': '1h,24h,7d,30d',
+                 'precision': 'full'}
+
+
+def band_score(value: float, bands, at_most: bool = False):
+    """Score of one value from a threshold band table"""
+    edges, scores = bands
+    return scores[(bisect_left if at_most else bisect_right)(edges, value)]
+
+
+def band_scores(values: np.ndarray, bands, at_most: bool = False) -> np.ndarray:
+    """Vectorised band_score: one searchsorted over the whole column"""
+    edges, scores = bands
+    idx = np.searchsorted(edges, values, side='left' if at_most else 'right')
+    return np.asarray(scores)[idx]
+
+
+def market_columns(market_data: List[Dict]) -> Dict[str, np.ndarray]:
+    """/coins/markets rows -> columnar arrays (missing or null numbers -> 0)"""
+    def column(key):
+        return np.array([row.get(key) or 0 for row in market_data], dtype=float)
+    return {
+        'id': np.array([row['id'] for row in market_data], dtype=object),
+        'market_cap': column('market_cap'),
+        'total_volume': column('total_volume'),
+        'fully_diluted_valuation': column('fully_diluted_valuation'),
+    }
+
+
 class STierEvaluator:
     def __init__(self):
-        self.api_key = "CG-MVg68aVqeVyu8fzagC9E1hPj"
-        self.base_url = "https://pro-api.coingecko.com/api/v3"
-        self.headers = {
-            "accept": "application/json",
-            "x-cg-pro-api-key": self.api_key
-        }
-        
         # Token data with enhanced information
         self.tokens = {
             'LDO': {
@@ -126,6 +174,58 @@ class STierEvaluator:
             }
         }
         
+        # Hand-rated qualitative scores (0-100); unlisted tokens get DEFAULT_SCORE
+        self.qualitative_scores = {
+            # Team quality (subjective but based on track record)
+            'team_quality': {
+                'LDO': 90, 'AAVE': 95, 'SKY': 90, 'ARB': 90, 'EIGEN': 85,
+                'PENDLE': 80, 'ETHFI': 75, 'ENA': 70, 'MNT': 75, 'RPL': 80,
+                'COOK': 60, 'CPOOL': 70, 'PEPE': 20
+            },
+            'backing_quality': {
+                'LDO': 95, 'AAVE': 90, 'SKY': 85, 'ARB': 95, 'EIGEN': 90,
+                'PENDLE': 75, 'ETHFI': 70, 'ENA': 85, 'MNT': 80, 'RPL': 75,
+                'COOK': 40, 'CPOOL': 80, 'PEPE': 0
+            },
+            'innovation_score': {
+                'LDO': 85, 'AAVE': 90, 'SKY': 70, 'ARB': 95, 'EIGEN': 100,
+                'PENDLE': 90, 'ETHFI': 80, 'ENA': 85, 'MNT': 70, 'RPL': 75,
+                'COOK': 60, 'CPOOL': 70, 'PEPE': 10
+            },
+            # Adoption: category leadership and growth trends
+            'adoption': {
+                'LDO': 95,   # Dominant in liquid staking
+                'AAVE': 90,  # Leading DeFi protocol
+                'ARB': 85,   # Top L2 by TVL
+                'ENA': 80,   # Fast growing stablecoin
+                'PENDLE': 75, # Growing yield sector
+                'EIGEN': 70, # New but high potential
+                'MNT': 70,   # Strong L2 position
+                'SKY': 65,   # Established but slow growth
+                'ETHFI': 65, # Good restaking position
+                'RPL': 60,   # Smaller liquid staking player
+                'CPOOL': 55, # Niche institutional lending
+                'COOK': 45,  # Small player
+                'PEPE': 40   # Meme with retail adoption
+            },
+            # Risk (higher score = lower risk)
+            'risk': {
+                'LDO': 75,   # Some regulatory risk on staking
+                'AAVE': 80,  # Well established, good security
+                'ARB': 85,   # Strong tech, backed by Offchain Labs
+                'SKY': 70,   # Regulatory scrutiny on RWA
+                'PENDLE': 75, # Complex mechanisms, audit risks
+                'EIGEN': 60, # New, complex, high technical risk
+                'ENA': 65,   # New protocol, derivatives exposure
+                'ETHFI': 65, # Built on EigenLayer, dependency risk
+                'MNT': 70,   # Centralization concerns
+                'RPL': 80,   # Decentralized, battle-tested
+                'CPOOL': 60, # Credit risk, regulatory uncertainty
+                'COOK': 50,  # Small, unproven
+                'PEPE': 30   # Pure speculation, no utility
+            }
+        }
+        
         # S-Tier scoring criteria (0-100 scale)
         self.scoring_criteria = {
             'market_metrics': {
@@ -164,61 +264,61 @@ class STierEvaluator:
             }
         }
 
-    def fetch_enhanced_data(self) -> Dict:
+    @property
+    def client(self):
+        """Shared pooled session + response cache, opened on first use (offline scoring needs no API key)"""
+        return get_client()
+
+    def fetch_enhanced_data(self) -> List[Dict]:
         """Fetch comprehensive market and on-chain data"""
         # Get valid token IDs
         valid_ids = [data['id'] for data in self.tokens.values()]
-        ids_string = ','.join(valid_ids)
-        
-        url = f"{self.base_url}/coins/markets"
-        params = {
-            'vs_currency': 'usd',
-            'ids': ids_string,
-            'order': 'market_cap_desc',
-            'per_page': 100,
-            'page': 1,
-            'sparkline': False,
-            'price_change_percentage': '1h,24h,7d,30d',
-            'precision': 'full'
-        }
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json()
+            universe = self.client.markets_universe(ids=valid_ids, **MARKET_PARAMS)
         except Exception as e:
             print(f"Error fetching data: {e}")
             return []
+        if universe.missing:
+            print(f"Warning: no market data for {', '.join(universe.missing)}")
+        return universe.rows
+
+    def evaluate_universe(self, category: Optional[str] = None,
+                          top_n: Optional[int] = None) -> List[Dict]:
+        """Batch-score every token of a CoinGecko category (or the top-N market), best first"""
+        universe = self.client.markets_universe(category=category, top_n=top_n, **MARKET_PARAMS)
+        if not universe.rows:
+            return []
+        batch = self.score_batch(market_columns(universe.rows))
+        entries = self.universe_entries(universe.rows, batch)
+        return [entries[i] for i in np.argsort(-batch['total_score'], kind='stable')]
+
+    def universe_entries(self, rows: List[Dict], batch: Dict[str, np.ndarray]) -> List[Dict]:
+        """score_batch output -> one JSON-ready entry per market row, in row order"""
+        return [{
+            'id': row['id'],
+            'symbol': (row.get('symbol') or '').upper(),
+            'total_score': round(float(batch['total_score'][i]), 1),
+            'tier': str(batch['tier'][i]),
+            'scores': {name: round(float(batch[name][i]), 1) for name in CATEGORY_NAMES.values()},
+        } for i, row in enumerate(rows)]
 
     def calculate_market_score(self, token_data: Dict) -> float:
         """Calculate market metrics score (0-100)"""
-        mcap = token_data.get('market_cap', 0)
-        volume = token_data.get('total_volume', 0)
-        fdv = token_data.get('fully_diluted_valuation', 0)
+        mcap = token_data.get('market_cap') or 0
+        volume = token_data.get('total_volume') or 0
+        fdv = token_data.get('fully_diluted_valuation') or 0
         
         # Market cap score (logarithmic scale)
-        if mcap >= 5e9: mcap_score = 100
-        elif mcap >= 1e9: mcap_score = 85
-        elif mcap >= 500e6: mcap_score = 70
-        elif mcap >= 100e6: mcap_score = 50
-        elif mcap >= 50e6: mcap_score = 30
-        else: mcap_score = 10
+        mcap_score = band_score(mcap, MCAP_BANDS)
         
         # Volume ratio score (volume/mcap health)
         vol_ratio = volume / mcap if mcap > 0 else 0
-        if vol_ratio >= 0.3: vol_score = 100
-        elif vol_ratio >= 0.15: vol_score = 80
-        elif vol_ratio >= 0.05: vol_score = 60
-        elif vol_ratio >= 0.01: vol_score = 40
-        else: vol_score = 20
+        vol_score = band_score(vol_ratio, VOLUME_RATIO_BANDS)
         
         # FDV premium score (lower premium = higher score)
         fdv_premium = fdv / mcap if mcap > 0 else 1
-        if fdv_premium <= 1.2: fdv_score = 100
-        elif fdv_premium <= 2.0: fdv_score = 75
-        elif fdv_premium <= 3.0: fdv_score = 50
-        elif fdv_premium <= 5.0: fdv_score = 25
-        else: fdv_score = 0
+        fdv_score = band_score(fdv_premium, FDV_PREMIUM_BANDS, at_most=True)
         
         # Weighted average
         factors = self.scoring_criteria['market_metrics']['factors']
@@ -232,36 +332,13 @@ class STierEvaluator:
         
         # Protocol maturity (years since founding)
         founded_year = int(token_info['founded'])
-        years_active = 2024 - founded_year
-        if years_active >= 6: maturity_score = 100
-        elif years_active >= 4: maturity_score = 85
-        elif years_active >= 2: maturity_score = 70
-        elif years_active >= 1: maturity_score = 50
-        else: maturity_score = 30
-        
-        # Team quality (subjective but based on track record)
-        team_scores = {
-            'LDO': 90, 'AAVE': 95, 'SKY': 90, 'ARB': 90, 'EIGEN': 85,
-            'PENDLE': 80, 'ETHFI': 75, 'ENA': 70, 'MNT': 75, 'RPL': 80,
-            'COOK': 60, 'CPOOL': 70, 'PEPE': 20
-        }
-        team_score = team_scores.get(symbol, 50)
+        years_active = REFERENCE_YEAR - founded_year
+        maturity_score = band_score(years_active, MATURITY_BANDS)
         
-        # Backing quality
-        backing_scores = {
-            'LDO': 95, 'AAVE': 90, 'SKY': 85, 'ARB': 95, 'EIGEN': 90,
-            'PENDLE': 75, 'ETHFI': 70, 'ENA': 85, 'MNT': 80, 'RPL': 75,
-            'COOK': 40, 'CPOOL': 80, 'PEPE': 0
-        }
-        backing_score = backing_scores.get(symbol, 50)
-        
-        # Innovation score
-        innovation_scores = {
-            'LDO': 85, 'AAVE': 90, 'SKY': 70, 'ARB': 95, 'EIGEN': 100,
-            'PENDLE': 90, 'ETHFI': 80, 'ENA': 85, 'MNT': 70, 'RPL': 75,
-            'COOK': 60, 'CPOOL': 70, 'PEPE': 10
-        }
-        innovation_score = innovation_scores.get(symbol, 50)
+        # Team quality, backing quality, innovation (hand-rated)
+        team_score = self.qualitative_scores['team_quality'].get(symbol, DEFAULT_SCORE)
+        backing_score = self.qualitative_scores['backing_quality'].get(symbol, DEFAULT_SCORE)
+        innovation_score = self.qualitative_scores['innovation_score'].get(symbol, DEFAULT_SCORE)
         
         # Weighted average
         factors = self.scoring_criteria['fundamentals']['factors']
@@ -273,51 +350,17 @@ class STierEvaluator:
     def calculate_adoption_score(self, symbol: str, token_data: Dict) -> float:
         """Calculate adoption and growth metrics"""
         # Based on category leadership and growth trends
-        adoption_scores = {
-            'LDO': 95,   # Dominant in liquid staking
-            'AAVE': 90,  # Leading DeFi protocol
-            'ARB': 85,   # Top L2 by TVL
-            'ENA': 80,   # Fast growing stablecoin
-            'PENDLE': 75, # Growing yield sector
-            'EIGEN': 70, # New but high potential
-            'MNT': 70,   # Strong L2 position
-            'SKY': 65,   # Established but slow growth
-            'ETHFI': 65, # Good restaking position
-            'RPL': 60,   # Smaller liquid staking player
-            'CPOOL': 55, # Niche institutional lending
-            'COOK': 45,  # Small player
-            'PEPE': 40   # Meme with retail adoption
-        }
-        return adoption_scores.get(symbol, 50)
+        return self.qualitative_scores['adoption'].get(symbol, DEFAULT_SCORE)
 
     def calculate_risk_score(self, symbol: str, token_data: Dict) -> float:
         """Calculate risk assessment (higher score = lower risk)"""
-        # Risk factors scoring
-        risk_scores = {
-            'LDO': 75,   # Some regulatory risk on staking
-            'AAVE': 80,  # Well established, good security
-            'ARB': 85,   # Strong tech, backed by Offchain Labs
-            'SKY': 70,   # Regulatory scrutiny on RWA
-            'PENDLE': 75, # Complex mechanisms, audit risks
-            'EIGEN': 60, # New, complex, high technical risk
-            'ENA': 65,   # New protocol, derivatives exposure
-            'ETHFI': 65, # Built on EigenLayer, dependency risk
-            'MNT': 70,   # Centralization concerns
-            'RPL': 80,   # Decentralized, battle-tested
-            'CPOOL': 60, # Credit risk, regulatory uncertainty
-            'COOK': 50,  # Small, unproven
-            'PEPE': 30   # Pure speculation, no utility
-        }
-        return risk_scores.get(symbol, 50)
+        return self.qualitative_scores['risk'].get(symbol, DEFAULT_SCORE)
 
-    def calculate_s_tier_score(self, symbol: str, market_data: List[Dict]) -> Dict:
-        """Calculate comprehensive S-Tier score"""
-        # Find token data
-        token_data = None
-        for data in market_data:
-            if data['id'] == self.tokens[symbol]['id']:
-                token_data = data
-                break
+    def calculate_s_tier_score(self, symbol: str,
+                               market_data: Union[List[Dict], Dict[str, Dict]]) -> Dict:
+        """Calculate comprehensive S-Tier score (market_data: rows or rows keyed by id)"""
+        by_id = market_data if isinstance(market_data, dict) else {d['id']: d for d in market_data}
+        token_data = by_id.get(self.tokens[symbol]['id'])
         
         if not token_data:
             return {'total_score': 0, 'tier': 'F', 'scores': {}}
@@ -338,17 +381,7 @@ class STierEvaluator:
         )
         
         # Determine tier
-        if total_score >= 85: tier = 'S+'
-        elif total_score >= 80: tier = 'S'
-        elif total_score >= 75: tier = 'S-'
-        elif total_score >= 70: tier = 'A+'
-        elif total_score >= 65: tier = 'A'
-        elif total_score >= 60: tier = 'A-'
-        elif total_score >= 55: tier = 'B+'
-        elif total_score >= 50: tier = 'B'
-        elif total_score >= 45: tier = 'B-'
-        elif total_score >= 40: tier = 'C'
-        else: tier = 'D'
+        tier = band_score(total_score, TIER_BANDS)
         
         return {
             'total_score': round(total_score, 1),
@@ -362,16 +395,190 @@ class STierEvaluator:
             'market_data': token_data
         }
 
+    def leaf_weights(self) -> List[tuple]:
+        """(category, factor, category weight x factor weight) in scoring_criteria order"""
+        return [(category, factor, spec['weight'] * weight)
+                for category, spec in self.scoring_criteria.items()
+                for factor, weight in spec['factors'].items()]
+
+    def leaf_scores(self, table: Dict[str, Sequence]) -> Dict[str, np.ndarray]:
+        """0-100 score per (category, factor) leaf for every row of a columnar table"""
+        ids = np.asarray(table['id'], dtype=object)
+        mcap = np.asarray(table['market_cap'], dtype=float)
+        volume = np.asarray(table['total_volume'], dtype=float)
+        fdv = np.asarray(table['fully_diluted_valuation'], dtype=float)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_ratio = np.where(mcap > 0, volume / mcap, 0)
+            fdv_premium = np.where(mcap > 0, fdv / mcap, 1)
+        
+        # Hand-rated tokens are a handful of rows: fill them in, default the rest
+        symbol_by_id = {info['id']: symbol for symbol, info in self.tokens.items()}
+        rated_rows = [(row, symbol_by_id[i]) for row, i in enumerate(ids) if i in symbol_by_id]
+        
+        def rated(values_by_symbol: Dict[str, float]) -> np.ndarray:
+            out = np.full(len(ids), float(DEFAULT_SCORE))
+            for row, symbol in rated_rows:
+                out[row] = values_by_symbol.get(symbol, DEFAULT_SCORE)
+            return out
+        
+        maturity = rated({symbol: band_score(REFERENCE_YEAR - int(info['founded']), MATURITY_BANDS)
+                          for symbol, info in self.tokens.items()})
+        return {
+            'market_cap': band_scores(mcap, MCAP_BANDS),
+            'volume_ratio': band_scores(vol_ratio, VOLUME_RATIO_BANDS),
+            'fdv_premium': band_scores(fdv_premium, FDV_PREMIUM_BANDS, at_most=True),
+            'protocol_maturity': maturity,
+            'team_quality': rated(self.qualitative_scores['team_quality']),
+            'backing_quality': rated(self.qualitative_scores['backing_quality']),
+            'innovation_score': rated(self.qualitative_scores['innovation_score']),
+            'adoption': rated(self.qualitative_scores['adoption']),
+            'risk': rated(self.qualitative_scores['risk']),
+        }
+
+    def leaf_matrix(self, table: Dict[str, Sequence]) -> np.ndarray:
+        """(tokens x leaves) scores; leaf_matrix(t) @ leaf weights = total score"""
+        scores = self.leaf_scores(table)
+        return np.column_stack([scores[CATEGORY_RATINGS.get(category, factor)]
+                                for category, factor, _ in self.leaf_weights()])
+
+    def score_batch(self, table: Dict[str, Sequence]) -> Dict[str, np.ndarray]:
+        """
+        Score a whole universe at once (columns: id, market_cap, total_volume,
+        fully_diluted_valuation). Same numbers as calculate_s_tier_score,
+        summed in the same order
+        """
+        scores = self.leaf_scores(table)
+        result = {'id': np.asarray(table['id'], dtype=object)}
+        total = 0
+        for category, spec in self.scoring_criteria.items():
+            if category in CATEGORY_RATINGS:
+                category_score = scores[CATEGORY_RATINGS[category]]
+            else:
+                category_score = 0
+                for factor, weight in spec['factors'].items():
+                    category_score = category_score + scores[factor] * weight
+            result[CATEGORY_NAMES[category]] = category_score
+            total = total + category_score * spec['weight']
+        result['total_score'] = total
+        result['tier'] = band_scores(total, TIER_BANDS)
+        return result
+
+    def weight_sensitivity(self, table: Dict[str, Sequence], n_samples: int = 100_000,
+                           concentration: float = 100.0, ci: float = 0.9,
+                           seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Monte-Carlo tier / rank stability under Dirichlet-perturbed weights.
+        Category weights ~ Dir(concentration x weights), factor weights within
+        each category likewise; every draw scores every token through one
+        (draws x leaves) @ (leaves x tokens) product. Tokens with identical
+        leaf rows are scored once, and draws are processed in chunks
+        """
+        leaves = self.leaf_weights()
+        categories = list(self.scoring_criteria)
+        cat_of_leaf = np.array([categories.index(category) for category, _, _ in leaves])
+        starts = np.flatnonzero(np.r_[True, cat_of_leaf[1:] != cat_of_leaf[:-1]])
+        cat_alpha = concentration * np.array([spec['weight'] for spec in self.scoring_criteria.values()])
+        factor_alpha = concentration * np.array([self.scoring_criteria[category]['factors'][factor]
+                                                 for category, factor, _ in leaves])
+        
+        unique, inverse = np.unique(self.leaf_matrix(table), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        multiplicity = np.bincount(inverse, minlength=len(unique))
+        n_tokens, n_unique, n_tiers = len(inverse), len(unique), len(TIER_BANDS[1])
+        edges = np.asarray(TIER_BANDS[0])
+        
+        rng = np.random.default_rng(seed)
+        tier_counts = np.zeros(n_unique * n_tiers, dtype=np.int64)
+        rank_counts = np.zeros(n_unique * n_tokens, dtype=np.int64)
+        chunk = max(1, SENSITIVITY_CHUNK // max(n_unique, len(leaves)))
+        for lo in range(0, n_samples, chunk):
+            size = min(chunk, n_samples - lo)
+            # Dirichlet draws as normalised gammas, all categories at once
+            cat_w = rng.standard_gamma(cat_alpha, size=(size, len(categories)))
+            cat_w /= cat_w.sum(axis=1, keepdims=True)
+            factor_w = rng.standard_gamma(factor_alpha, size=(size, len(leaves)))
+            factor_w /= np.add.reduceat(factor_w, starts, axis=1)[:, cat_of_leaf]
+            totals = (factor_w * cat_w[:, cat_of_leaf]) @ unique.T        # (draws, unique rows)
+            
+            tiers = np.searchsorted(edges, totals, side='right')
+            tier_counts += np.bincount((np.arange(n_unique) * n_tiers + tiers).ravel(),
+                                       minlength=tier_counts.size)
+            # competition rank: 1 + number of tokens scoring strictly higher
+            order = np.argsort(-totals, axis=1)
+            above = np.cumsum(multiplicity[order], axis=1) - multiplicity[order]
+            ranks = np.empty_like(order)
+            np.put_along_axis(ranks, order, above, axis=1)
+            rank_counts += np.bincount((np.arange(n_unique) * n_tokens + ranks).ravel(),
+                                       minlength=rank_counts.size)
+        
+        tier_probs = tier_counts.reshape(n_unique, n_tiers) / n_samples
+        rank_cdf = np.cumsum(rank_counts.reshape(n_unique, n_tokens), axis=1) / n_samples
+        tail = (1 - ci) / 2
+        
+        def rank_quantile(q: float) -> np.ndarray:
+            return (rank_cdf < q).sum(axis=1)[inverse] + 1
+        
+        return {
+            'id': np.asarray(table['id'], dtype=object),
+            'tiers': np.asarray(TIER_BANDS[1]),            # column order of tier_probs
+            'tier_probs': tier_probs[inverse],
+            'rank_low': rank_quantile(tail),
+            'rank_median': rank_quantile(0.5),
+            'rank_high': rank_quantile(1 - tail),
+        }
+
+    def sensitivity_report(self, rows: List[Dict], n_samples: int = 100_000,
+                           concentration: float = 100.0, seed: Optional[int] = None) -> List[Dict]:
+        """weight_sensitivity for /coins/markets rows as JSON-ready entries, best median rank first"""
+        table = market_columns(rows)
+        entries = self.universe_entries(rows, self.score_batch(table))
+        sens = self.weight_sensitivity(table, n_samples, concentration, seed=seed)
+        for i, entry in enumerate(entries):
+            probs = dict(zip(sens['tiers'].tolist(), sens['tier_probs'][i].round(4).tolist()))
+            entry['tier_probability'] = probs[entry['tier']]
+            entry['tier_probs'] = {tier: p for tier, p in reversed(probs.items()) if p > 0}
+            entry['rank_median'] = int(sens['rank_median'][i])
+            entry['rank_ci'] = [int(sens['rank_low'][i]), int(sens['rank_high'][i])]
+        return sorted(entries, key=lambda e: (e['rank_median'], -e['total_score']))
+
     def generate_s_tier_analysis(self) -> str:
         """Generate comprehensive S-Tier analysis"""
         print("Fetching enhanced market data...")
         market_data = self.fetch_enhanced_data()
         
-        # Calculate scores for all tokens
+        # Calculate scores for all tokens (one id index instead of a scan per token)
+        by_id = {data['id']: data for data in market_data}
         results = {}
         for symbol in self.tokens.keys():
-            results[symbol] = self.calculate_s_tier_score(symbol, market_data)
+            results[symbol] = self.calculate_s_tier_score(symbol, by_id)
+        
+        sections = {symbol: self.render_token_section(symbol, data)
+                    for symbol, data in results.items() if data['scores']}
+        return self.render_report(results, sections)
+
+    def render_token_section(self, symbol: str, data: Dict) -> List[str]:
+        """Report lines for one scored token (cached by watch mode between cycles)"""
+        token_info = self.tokens[symbol]
+        market_data = data.get('market_data', {})
+        
+        price = market_data.get('current_price', 0)
+        mcap = market_data.get('market_cap', 0)
         
+        price_str = f"${price:.2f}" if price >= 1 else f"${price:.8f}"
+        mcap_str = f"${mcap/1e9:.2f}B" if mcap >= 1e9 else f"${mcap/1e6:.2f}M"
+        
+        return [
+            f"\n{symbol} - {token_info['category']} | Score: {data['total_score']}",
+            f"  Price: {price_str} | Market Cap: {mcap_str}",
+            f"  Market: {data['scores']['market']} | Fundamentals: {data['scores']['fundamentals']}",
+            f"  Adoption: {data['scores']['adoption']} | Risk: {data['scores']['risk']}",
+            f"  Description: {token_info['description']}",
+            f"  Backing: {token_info['backing']}",
+        ]
+
+    def render_report(self, results: Dict[str, Dict], sections: Dict[str, List[str]]) -> str:
+        """Assemble the text report from scores and pre-rendered token sections"""
         # Sort by total score
         sorted_results = sorted(results.items(), key=lambda x: x[1]['total_score'], reverse=True)
         
@@ -399,21 +606,7 @@ class STierEvaluator:
                 output.append("-" * 20)
                 
                 for symbol, data in tiers[tier]:
-                    token_info = self.tokens[symbol]
-                    market_data = data['market_data']
-                    
-                    price = market_data.get('current_price', 0)
-                    mcap = market_data.get('market_cap', 0)
-                    
-                    price_str = f"${price:.2f}" if price >= 1 else f"${price:.8f}"
-                    mcap_str = f"${mcap/1e9:.2f}B" if mcap >= 1e9 else f"${mcap/1e6:.2f}M"
-                    
-                    output.append(f"\n{symbol} - {token_info['category']} | Score: {data['total_score']}")
-                    output.append(f"  Price: {price_str} | Market Cap: {mcap_str}")
-                    output.append(f"  Market: {data['scores']['market']} | Fundamentals: {data['scores']['fundamentals']}")
-                    output.append(f"  Adoption: {data['scores']['adoption']} | Risk: {data['scores']['risk']}")
-                    output.append(f"  Description: {token_info['description']}")
-                    output.append(f"  Backing: {token_info['backing']}")
+                    output.extend(sections[symbol])
         
         # Summary statistics
         output.append(f"\n\nSUMMARY STATISTICS")
@@ -427,8 +620,279 @@ class STierEvaluator:
         
         return "\n".join(output)
 
+class STierWatcher:
+    """
+    Watch mode: polls market data every interval, keeps the last scored inputs
+    and scores per token and re-scores only tokens whose market cap, volume or
+    FDV moved by more than epsilon (relative). Tier moves are appended to an
+    events log. Universe reports are kept as a full snapshot plus a per-cycle
+    delta log (snapshot rebuilt every snapshot_every cycles and on exit), the
+    hand-rated text report is reassembled from cached per-token sections
+    """
+
+    def __init__(self, evaluator: STierEvaluator, category: Optional[str] = None,
+                 top_n: Optional[int] = None, epsilon: float = 0.01,
+                 report_path: Optional[str] = None, events_path: str = 's_tier_events.jsonl',
+                 snapshot_every: int = 20):
+        self.evaluator = evaluator
+        self.category = category
+        self.top_n = top_n
+        self.universe = category is not None or top_n is not None
+        self.epsilon = epsilon
+        self.report_path = report_path or ('s_tier_universe.json' if self.universe
+                                           else 's_tier_analysis.txt')
+        self.delta_path = os.path.splitext(self.report_path)[0] + '.delta.jsonl'
+        self.events_path = events_path
+        self.snapshot_every = snapshot_every
+        # Inputs live in arrays aligned to a sorted id index, looked up with one searchsorted
+        self.ids = np.array([], dtype=str)
+        self.inputs = np.empty((0, len(WATCH_FIELDS)))  # (mcap, volume, fdv) when last scored
+        self.results: Dict[str, Dict] = {}          # id -> last score entry
+        self.serialized: Dict[str, str] = {}        # id -> entry as it appears in the snapshot
+        self.sections: Dict[str, List[str]] = {}    # id -> rendered report lines (token mode)
+        self.symbol_by_id = {info['id']: symbol for symbol, info in evaluator.tokens.items()}
+        self.cycles = 0
+        self.dirty = False                          # deltas not yet folded into a snapshot
+
+    def fetch(self) -> List[Dict]:
+        if self.universe:
+            return self.evaluator.client.markets_universe(
+                category=self.category, top_n=self.top_n, **MARKET_PARAMS).rows
+        return self.evaluator.fetch_enhanced_data()
+
+    def slots(self, ids: np.ndarray) -> np.ndarray:
+        """Positions of ids in the id index, growing it (and the input arrays) for unseen ids"""
+        ids = ids.astype(str)
+        pos = np.searchsorted(self.ids, ids)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == ids[found]
+        if not found.all():
+            merged = np.union1d(self.ids, ids[~found])
+            inputs = np.full((len(merged), len(WATCH_FIELDS)), np.nan)
+            inputs[np.searchsorted(merged, self.ids)] = self.inputs
+            self.ids, self.inputs = merged, inputs
+            pos = np.searchsorted(self.ids, ids)
+        return pos
+
+    def forget(self, ids: List[str]) -> None:
+        """Clear stored inputs so these ids are re-scored if they come back"""
+        ids = np.asarray(ids, dtype=str)
+        pos = np.searchsorted(self.ids, ids)
+        known = pos < len(self.ids)
+        known[known] = self.ids[pos[known]] == ids[known]
+        self.inputs[pos[known]] = np.nan
+
+    def changed_rows(self, columns: Dict[str, np.ndarray], slots: np.ndarray) -> np.ndarray:
+        """Indices of rows never scored or with an input moved past epsilon"""
+        new = np.column_stack([columns[field] for field in WATCH_FIELDS])
+        old = self.inputs[slots]
+        moved = np.abs(new - old) > self.epsilon * np.abs(old)
+        return np.flatnonzero(moved.any(axis=1) | np.isnan(old).any(axis=1))
+
+    def rescore(self, rows: List[Dict], columns: Dict[str, np.ndarray],
+                idx: np.ndarray) -> Dict[str, Dict]:
+        """Fresh score entries for rows[idx] only"""
+        if self.universe:
+            subset = {key: values[idx] for key, values in columns.items()}
+            entries = self.evaluator.universe_entries([rows[i] for i in idx],
+                                                      self.evaluator.score_batch(subset))
+            return {entry['id']: entry for entry in entries}
+        fresh = {}
+        for i in idx:
+            symbol = self.symbol_by_id[rows[i]['id']]
+            fresh[rows[i]['id']] = self.evaluator.calculate_s_tier_score(symbol, {rows[i]['id']: rows[i]})
+            self.sections[rows[i]['id']] = self.evaluator.render_token_section(symbol, fresh[rows[i]['id']])
+        return fresh
+
+    def tier_events(self, fresh: Dict[str, Dict], dropped: List[str]) -> List[Dict]:
+        """Upgrade / downgrade / new / dropped events against the previous scores"""
+        now = datetime.now().isoformat(timespec='seconds')
+        events = []
+        for token_id, entry in fresh.items():
+            old = self.results.get(token_id)
+            if old is None and not self.cycles:
+                continue  # the first cycle is the baseline, not a stream of "new" events
+            if old is not None and old['tier'] == entry['tier']:
+                continue
+            if old is None:
+                kind = 'new'
+            else:
+                kind = 'upgrade' if TIER_RANK[entry['tier']] > TIER_RANK[old['tier']] else 'downgrade'
+            events.append({'time': now, 'id': token_id, 'symbol': self.symbol(token_id, entry),
+                           'event': kind, 'from': old and old['tier'], 'to': entry['tier'],
+                           'score_from': old and old['total_score'],
+                           'score_to': entry['total_score']})
+        for token_id in dropped:
+            old = self.results[token_id]
+            events.append({'time': now, 'id': token_id, 'symbol': self.symbol(token_id, old),
+                           'event': 'dropped', 'from': old['tier'], 'to': None,
+                           'score_from': old['total_score'], 'score_to': None})
+        return events
+
+    def symbol(self, token_id: str, entry: Dict) -> str:
+        return entry.get('symbol') or self.symbol_by_id.get(token_id, token_id)
+
+    def write_report(self) -> None:
+        """Full report: universe snapshot from the cached serialized entries, or the text report"""
+        if self.universe:
+            ranked = sorted(self.results, key=lambda i: (-self.results[i]['total_score'], i))
+            text = ('[\n' + ',\n'.join(self.serialized[i] for i in ranked) + '\n]') if ranked else '[]'
+        else:
+            results = {self.symbol_by_id[i]: entry for i, entry in self.results.items()}
+            sections = {self.symbol_by_id[i]: lines for i, lines in self.sections.items()}
+            text = self.evaluator.render_report(results, sections)
+        tmp = self.report_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, self.report_path)
+        if self.universe:
+            open(self.delta_path, 'w').close()  # the snapshot now includes every delta
+        self.dirty = False
+
+    def write_delta(self, fresh: Dict[str, Dict], dropped: List[str]) -> None:
+        """Append this cycle's re-scored entries and dropped ids (snapshot + deltas = current state)"""
+        delta = {'cycle': self.cycles + 1, 'time': datetime.now().isoformat(timespec='seconds'),
+                 'updated': list(fresh.values()), 'dropped': dropped}
+        with open(self.delta_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(delta) + '\n')
+        self.dirty = True
+
+    def cycle(self) -> Dict:
+        """One poll: fetch, re-score what moved, log tier events, refresh the report"""
+        rows = self.fetch()
+        if not rows:
+            return {'tokens': 0, 'rescored': 0, 'events': []}  # failed poll: keep last state
+        columns = market_columns(rows)
+        slots = self.slots(columns['id'])
+        idx = self.changed_rows(columns, slots)
+        fresh = self.rescore(rows, columns, idx)
+        
+        if self.universe:
+            present = np.zeros(len(self.ids), dtype=bool)
+            present[slots] = True
+            dropped = self.ids[~present & ~np.isnan(self.inputs[:, 0])].tolist()
+        else:
+            # hand-rated tokens stay in the report, scored F like a one-shot run would
+            dropped = []
+            present = set(columns['id'])
+            for symbol, info in self.evaluator.tokens.items():
+                if info['id'] not in present and info['id'] not in fresh:
+                    if self.results.get(info['id'], {}).get('tier') != 'F':
+                        fresh[info['id']] = self.evaluator.calculate_s_tier_score(symbol, {})
+                        self.sections.pop(info['id'], None)
+        
+        events = self.tier_events(fresh, dropped)
+        self.inputs[slots[idx]] = np.column_stack([columns[f][idx] for f in WATCH_FIELDS])
+        self.forget(dropped if self.universe else [i for i in fresh if i not in present])
+        for token_id in dropped:
+            self.results.pop(token_id)
+            self.serialized.pop(token_id, None)
+        self.results.update(fresh)
+        
+        if self.universe:
+            for token_id, entry in fresh.items():
+                self.serialized[token_id] = '  ' + json.dumps(entry, indent=2).replace('\n', '\n  ')
+            snapshot_due = not self.cycles or (self.snapshot_every and
+                                               (self.cycles + 1) % self.snapshot_every == 0)
+            if snapshot_due and (fresh or dropped or self.dirty):
+                self.write_report()
+            elif fresh or dropped:
+                self.write_delta(fresh, dropped)
+        elif fresh:
+            self.write_report()
+        if events:
+            with open(self.events_path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(event) + '\n' for event in events)
+        self.cycles += 1
+        return {'tokens': len(self.results), 'rescored': len(fresh), 'events': events}
+
+    def run(self, interval: float, cycles: Optional[int] = None) -> None:
+        """Poll every `interval` seconds (forever unless `cycles` is given)"""
+        try:
+            while cycles is None or self.cycles < cycles:
+                started = time.monotonic()
+                try:
+                    stats = self.cycle()
+                except Exception as e:
+                    print(f"Error in watch cycle: {e}")
+                    stats = {'tokens': 0, 'rescored': 0, 'events': []}
+                    self.cycles += 1
+                print(f"[{datetime.now():%H:%M:%S}] cycle {self.cycles}: {stats['rescored']}/"
+                      f"{stats['tokens']} tokens re-scored, {len(stats['events'])} tier changes")
+                for event in stats['events']:
+                    print(f"  {event['event'].upper():<9} {event['symbol']:<10} "
+                          f"{event['from'] or '-'} -> {event['to'] or '-'} "
+                          f"({event['score_from']} -> {event['score_to']})")
+                if cycles is None or self.cycles < cycles:
+                    time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        finally:
+            if self.dirty:
+                self.write_report()  # fold outstanding deltas into a full snapshot on exit
+
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--universe', metavar='CATEGORY', nargs='?', const='ethereum-ecosystem',
+                        help='batch-score a whole CoinGecko category (default ethereum-ecosystem)')
+    parser.add_argument('--top', type=int, help='with --universe: only the top N by market cap')
+    parser.add_argument('--watch', metavar='SECONDS', type=float, nargs='?', const=300,
+                        help='poll every SECONDS (default 300) and re-score only tokens that moved')
+    parser.add_argument('--epsilon', type=float, default=0.01,
+                        help='with --watch: relative mcap/volume/FDV move that triggers a re-score')
+    parser.add_argument('--cycles', type=int, help='with --watch: stop after this many polls')
+    parser.add_argument('--snapshot-every', type=int, default=20,
+                        help='with --watch --universe: rewrite the full ranking every N polls '
+                             '(deltas are appended in between)')
+    parser.add_argument('--sensitivity', metavar='DRAWS', type=int, nargs='?', const=100_000,
+                        help='tier probabilities and rank intervals under DRAWS (default 100000) '
+                             'Dirichlet-perturbed weight sets')
+    parser.add_argument('--concentration', type=float, default=100.0,
+                        help='with --sensitivity: Dirichlet concentration (higher = tighter around the weights)')
+    parser.add_argument('--seed', type=int, help='with --sensitivity: random seed')
+    args = parser.parse_args()
+    
     evaluator = STierEvaluator()
+    if args.sensitivity:
+        if args.universe or args.top:
+            rows = evaluator.client.markets_universe(category=args.universe, top_n=args.top,
+                                                     **MARKET_PARAMS).rows
+        else:
+            rows = evaluator.fetch_enhanced_data()
+        if not rows:
+            return
+        report = evaluator.sensitivity_report(rows, args.sensitivity, args.concentration, args.seed)
+        print(f"WEIGHT SENSITIVITY - {len(report)} tokens, {args.sensitivity} draws "
+              f"(concentration {args.concentration:g}, 90% rank interval)")
+        for row in report[:50]:
+            print(f"  {row['tier']:<3} {row['total_score']:>5}  {row['symbol']:<10} "
+                  f"P(tier) {row['tier_probability']:>6.1%}  rank {row['rank_median']} "
+                  f"[{row['rank_ci'][0]}-{row['rank_ci'][1]}]")
+        with open('s_tier_sensitivity.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSensitivity report saved to: s_tier_sensitivity.json")
+        return
+    if args.watch is not None:
+        watcher = STierWatcher(evaluator, category=args.universe, top_n=args.top,
+                               epsilon=args.epsilon, snapshot_every=args.snapshot_every)
+        print(f"Watching {args.universe or 'hand-rated tokens'} every {args.watch:g}s "
+              f"(epsilon {args.epsilon:g}); report: {watcher.report_path}"
+              f"{', deltas: ' + watcher.delta_path if watcher.universe else ''}, "
+              f"events: {watcher.events_path}")
+        try:
+            watcher.run(args.watch, args.cycles)
+        except KeyboardInterrupt:
+            print("\nStopped watching")
+        return
+    if args.universe:
+        ranked = evaluator.evaluate_universe(category=args.universe, top_n=args.top)
+        print(f"{args.universe.upper()} - {len(ranked)} tokens scored")
+        for row in ranked[:50]:
+            print(f"  {row['tier']:<3} {row['total_score']:>5}  {row['symbol']:<10} {row['id']}")
+        with open('s_tier_universe.json', 'w', encoding='utf-8') as f:
+            json.dump(ranked, f, indent=2)
+        print(f"\nFull ranking saved to: s_tier_universe.json")
+        return
+    
     analysis = evaluator.generate_s_tier_analysis()
     print(analysis)
     
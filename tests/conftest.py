@@ -0,0 +1,28 @@
+"""
+Makes the toolkit modules importable in tests: the FILE: sections of
+altcoin-lead-lag-toolkit.py are unpacked into a temp dir on sys.path, and
+the repo root (s_tier_evaluator, coingecko_client, …) is added as well.
+"""
+import os, re, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLE = os.path.join(ROOT, "altcoin-lead-lag-toolkit.py")
+SECTION = re.compile(r"^# =+\n# FILE: (\S+)[^\n]*\n# =+\n", re.M)
+
+
+def unpack_bundle(out: str) -> None:
+    with open(BUNDLE, encoding="utf-8") as f:
+        parts = SECTION.split(f.read())
+    for name, body in zip(parts[1::2], parts[2::2]):
+        if not name.endswith(".py"):
+            continue
+        body = re.split(r"^# =+\n# Setup Instructions", body, flags=re.M)[0]
+        path = os.path.join(out, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+
+
+_TOOLKIT = tempfile.mkdtemp(prefix="toolkit-")
+unpack_bundle(_TOOLKIT)
+sys.path[:0] = [_TOOLKIT, ROOT]
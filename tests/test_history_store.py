@@ -0,0 +1,51 @@
+import datetime as dt
+
+import pandas as pd
+
+from cache_backend import ParquetCache
+from history_store import HistoryStore
+
+
+def daily(a: dt.date, b: dt.date, value: float = 1.0) -> pd.Series:
+    return pd.Series(value, index=pd.date_range(a, b, freq="D"))
+
+
+def test_head_and_tail_gaps_are_padded_and_merged(tmp_path):
+    store = HistoryStore(ParquetCache(str(tmp_path)))
+    calls = []
+
+    def fetch(a, b):
+        calls.append((a, b))
+        return daily(a, b, float(len(calls)))
+
+    d = dt.date
+    store.get("btc", d(2022, 1, 1), d(2022, 12, 31), fetch)
+    assert calls == [(d(2022, 1, 1), d(2022, 12, 31))]
+    assert store.span("btc") == (d(2022, 1, 1), d(2022, 12, 31))
+
+    # inside the stored span: no fetch
+    store.get("btc", d(2022, 3, 1), d(2022, 6, 30), fetch)
+    assert len(calls) == 1
+
+    # a few days either side: each gap is padded to MIN_FETCH_DAYS so it stays daily
+    assert store.missing("btc", d(2021, 12, 25), d(2023, 1, 5)) == [
+        (d(2021, 12, 25), d(2022, 3, 26)),
+        (d(2022, 10, 6), d(2023, 1, 5)),
+    ]
+    out = store.get("btc", d(2021, 12, 25), d(2023, 1, 5), fetch)
+    assert calls[1:] == [(d(2021, 12, 25), d(2022, 3, 26)), (d(2022, 10, 6), d(2023, 1, 5))]
+    assert out.index.is_unique and out.index.is_monotonic_increasing
+    assert len(out) == (d(2023, 1, 5) - d(2021, 12, 25)).days + 1
+    # later pulls win on overlap
+    assert out[pd.Timestamp("2022-12-31")] == 3.0
+    assert out[pd.Timestamp("2022-06-30")] == 1.0
+    assert store.span("btc") == (d(2021, 12, 25), d(2023, 1, 5))
+
+
+def test_tail_span_stops_before_today(tmp_path):
+    store = HistoryStore(ParquetCache(str(tmp_path)))
+    today = dt.datetime.now(dt.timezone.utc).date()
+    store.get("eth", today - dt.timedelta(days=200), today, lambda a, b: daily(a, b))
+    assert store.span("eth")[1] == today - dt.timedelta(days=1)
+    # so the still‑moving last day is always refetched
+    assert store.missing("eth", today - dt.timedelta(days=200), today) != []
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.stattools import grangercausalitytests
+
+from lead_lag_scan import granger_batch
+
+MAX_LAG = 4
+
+
+def reference(y: np.ndarray, x: np.ndarray, p: int):
+    """statsmodels ssr_ftest of x → y at lag p (rows with a NaN dropped first)."""
+    data = pd.DataFrame({"y": y, "x": x}).dropna().to_numpy()
+    f, pval, df_denom, _ = grangercausalitytests(data, maxlag=[p])[p][0]["ssr_ftest"]
+    return f, pval, df_denom
+
+
+@pytest.fixture
+def panel():
+    rng = np.random.default_rng(7)
+    T, B = 300, 5
+    x = rng.normal(size=T)
+    Y = 0.3 * np.roll(x, 2)[:, None] + rng.normal(size=(T, B))
+    Y[:40, 3] = np.nan                      # late listing
+    Y[:, 4] = np.nan
+    Y[-5:, 4] = 1.0                         # too few rows → singular, reported as NaN
+    return Y, x
+
+
+def test_granger_batch_matches_statsmodels(panel):
+    Y, x = panel
+    out = granger_batch(Y, x, MAX_LAG)
+    for b in range(4):
+        for p in range(1, MAX_LAG + 1):
+            f, pval, df_denom = reference(Y[:, b], x, p)
+            assert out["f_stat"][b, p - 1] == pytest.approx(f, rel=1e-9)
+            assert out["p_value"][b, p - 1] == pytest.approx(pval, rel=1e-7, abs=1e-12)
+            assert out["n_obs"][b, p - 1] - 2 * p - 1 == df_denom
+
+
+def test_singular_coin_does_not_disturb_the_rest(panel):
+    Y, x = panel
+    out = granger_batch(Y, x, MAX_LAG)
+    alone = granger_batch(Y[:, :4], x, MAX_LAG)
+    assert np.isnan(out["f_stat"][4]).all()
+    np.testing.assert_array_equal(out["f_stat"][:4], alone["f_stat"])
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from rolling_ols import RunningOLS, rolling_ols
+
+WINDOW = 40
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(3)
+    T = 150
+    X = pd.DataFrame(rng.normal(size=(T, 2)), columns=["eth", "dom"],
+                     index=pd.date_range("2023-01-01", periods=T, freq="D"))
+    y = pd.Series(0.1 + 0.8 * X["eth"] - 0.3 * X["dom"] + rng.normal(scale=0.5, size=T),
+                  index=X.index)
+    y.iloc[[10, 11, 60]] = np.nan
+    X.iloc[95, 1] = np.nan
+    return y, X
+
+
+def reference(y: pd.Series, X: pd.DataFrame, end: int, window):
+    """statsmodels OLS on the trailing window ending at row *end*, NaN rows dropped."""
+    lo = 0 if window is None else max(0, end + 1 - window)
+    frame = pd.concat([y, X], axis=1).iloc[lo:end + 1].dropna()
+    return sm.OLS(frame.iloc[:, 0], sm.add_constant(frame.iloc[:, 1:])).fit()
+
+
+@pytest.mark.parametrize("window", [WINDOW, None])
+def test_rolling_ols_matches_statsmodels(data, window):
+    y, X = data
+    out = rolling_ols(y, X, window)
+    for end in range(20, len(y), 7):
+        fit = reference(y, X, end, window)
+        row = out.iloc[end]
+        assert row["n_obs"] == fit.nobs
+        np.testing.assert_allclose(row[["coef_const", "coef_eth", "coef_dom"]], fit.params, rtol=1e-8)
+        np.testing.assert_allclose(row[["t_const", "t_eth", "t_dom"]], fit.tvalues, rtol=1e-8)
+        assert row["r2"] == pytest.approx(fit.rsquared, rel=1e-8)
+
+
+def test_running_ols_matches_batch(data):
+    y, X = data
+    batch = rolling_ols(y, X, WINDOW)
+    running = RunningOLS(X.shape[1] + 1, WINDOW)          # + constant
+    names = ["const"] + list(X.columns)
+    for t in range(len(y)):
+        running.update(X.iloc[t].to_numpy(), y.iloc[t])
+        got = running.result(names)[batch.columns]
+        np.testing.assert_allclose(got.to_numpy(dtype=float), batch.iloc[t].to_numpy(dtype=float),
+                                   rtol=1e-8, atol=1e-10)
@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from s_tier_evaluator import (CATEGORY_NAMES, FDV_PREMIUM_BANDS, MCAP_BANDS,
+                              VOLUME_RATIO_BANDS, STierEvaluator, market_columns)
+
+
+@pytest.fixture
+def evaluator():
+    return STierEvaluator()
+
+
+def market_rows(evaluator, mcap, vol_ratio, fdv_premium):
+    """One /coins/markets row per hand-rated token with the given ratios"""
+    return [{'id': info['id'], 'market_cap': mcap, 'total_volume': mcap * vol_ratio,
+             'fully_diluted_valuation': mcap * fdv_premium}
+            for info in evaluator.tokens.values()]
+
+
+# band edges themselves plus a point either side, so both sides of every threshold are hit
+CASES = list(itertools.product(
+    [0.0, MCAP_BANDS[0][0], MCAP_BANDS[0][-1] * 1.5],
+    [0.0, VOLUME_RATIO_BANDS[0][1], 0.2],
+    [1.0, FDV_PREMIUM_BANDS[0][0], FDV_PREMIUM_BANDS[0][2] + 0.5],
+))
+
+
+@pytest.mark.parametrize('mcap,vol_ratio,fdv_premium', CASES)
+def test_score_batch_matches_per_token_scores(evaluator, mcap, vol_ratio, fdv_premium):
+    rows = market_rows(evaluator, mcap, vol_ratio, fdv_premium)
+    batch = evaluator.score_batch(market_columns(rows))
+    for i, symbol in enumerate(evaluator.tokens):
+        single = evaluator.calculate_s_tier_score(symbol, rows)
+        assert round(float(batch['total_score'][i]), 1) == single['total_score']
+        assert batch['tier'][i] == single['tier']
+        for name in CATEGORY_NAMES.values():
+            assert round(float(batch[name][i]), 1) == single['scores'][name]
+
+
+def test_score_batch_defaults_unrated_tokens(evaluator):
+    table = market_columns([{'id': 'unrated-coin', 'market_cap': 2e9, 'total_volume': 1e8,
+                             'fully_diluted_valuation': None}])
+    batch = evaluator.score_batch(table)
+    assert np.isfinite(batch['total_score']).all()
+    assert batch['fundamentals'][0] == 50
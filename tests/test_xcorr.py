@@ -0,0 +1,54 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from xcorr import ccf, rolling_xcorr
+
+MAX_LAG = 5
+
+
+@pytest.fixture
+def pairs():
+    rng = np.random.default_rng(11)
+    T, P = 250, 4
+    x = rng.normal(size=(T, P))
+    y = 0.5 * np.roll(x, 3, axis=0) + rng.normal(size=(T, P))
+    x[:30, 1] = np.nan                      # late listing
+    y[100:110, 2] = np.nan                  # outage
+    return x, y
+
+
+def test_ccf_matches_pandas(pairs):
+    x, y = pairs
+    r, n = ccf(x, y, MAX_LAG, min_obs=30)
+    for p in range(x.shape[1]):
+        lead, follow = pd.Series(x[:, p]), pd.Series(y[:, p])
+        for i, k in enumerate(range(-MAX_LAG, MAX_LAG + 1)):
+            shifted = lead.shift(k)
+            assert r[i, p] == pytest.approx(follow.corr(shifted), abs=1e-8)
+            assert n[i, p] == (shifted.notna() & follow.notna()).sum()
+
+
+@pytest.mark.parametrize("window", [20, "expanding"])
+def test_rolling_xcorr_matches_pandas(pairs, window):
+    x, y = pairs
+    lags = [0, 3]
+    cube = rolling_xcorr(x, y, lags, [window], min_obs=10)
+    for p in range(x.shape[1]):
+        lead, follow = pd.Series(x[:, p]), pd.Series(y[:, p])
+        for j, k in enumerate(lags):
+            roll = follow.expanding(10) if window == "expanding" else follow.rolling(window, 10)
+            expected = roll.corr(lead.shift(k)).to_numpy()
+            np.testing.assert_allclose(cube[0, j, :, p], expected, atol=1e-5)
+
+
+def test_all_nan_column_is_quiet(pairs):
+    x, y = pairs
+    x[:, 3] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        r, _ = ccf(x, y, MAX_LAG)
+        cube = rolling_xcorr(x, y, [0, 1], [20], min_obs=10)
+    assert np.isnan(r[:, 3]).all() and np.isnan(cube[..., 3]).all()